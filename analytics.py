@@ -0,0 +1,159 @@
+# analytics.py
+# Vectorized metrics for the wholesaler analytics page.
+#
+# Everything is computed from the analytics_products daily rollup (see
+# rollup.py), never from raw orders: one query loads the period's
+# (day, product) rows into NumPy columns, and the daily series, rolling
+# means, week-over-week growth, percentiles and category/product breakdowns
+# are array operations over them. However many orders a wholesaler has, the
+# period is at most days x products rows.
+
+from datetime import timedelta
+
+import numpy as np
+
+ROLLING_WINDOW = 7
+PERCENTILES = (25, 50, 75, 90)
+TOP_PRODUCTS = 5
+
+# Rollup rows have product_id 0 for orders without one, and keep rows of
+# products that were deleted since
+UNKNOWN_PRODUCT = 'Removed product'
+UNKNOWN_CATEGORY = 'other'
+
+PRODUCT_DAYS_SQL = '''
+    SELECT date, product_id, orders, quantity, revenue
+    FROM analytics_products
+    WHERE wholesaler_id = ? AND date >= ? AND date <= ?
+'''
+
+CATALOG_SQL = 'SELECT id, name, category FROM products WHERE wholesaler_id = ?'
+
+
+def load_product_days(cursor, wholesaler_id, start, days):
+    """The rollup rows of [start, start + days) as columns: day (index from start), product_id, orders, quantity, revenue."""
+    end = start + timedelta(days=days - 1)
+    cursor.execute(PRODUCT_DAYS_SQL, (wholesaler_id, start.isoformat(), end.isoformat()))
+    rows = cursor.fetchall()
+    if not rows:
+        return {
+            'day': np.zeros(0, dtype=np.int64),
+            'product_id': np.zeros(0, dtype=np.int64),
+            'orders': np.zeros(0, dtype=np.int64),
+            'quantity': np.zeros(0, dtype=np.int64),
+            'revenue': np.zeros(0),
+        }
+    dates, product_ids, orders, quantity, revenue = zip(*rows)
+    day = (np.array([str(date) for date in dates], dtype='datetime64[D]') - np.datetime64(start.isoformat(), 'D'))
+    return {
+        'day': day.astype(np.int64),
+        'product_id': np.array(product_ids, dtype=np.int64),
+        'orders': np.array(orders, dtype=np.int64),
+        'quantity': np.array(quantity, dtype=np.int64),
+        'revenue': np.array(revenue, dtype=float),
+    }
+
+
+def daily_totals(columns, field, days):
+    """Dense per-day sums of a column; days without orders are zero."""
+    return np.bincount(columns['day'], weights=columns[field], minlength=days)[:days]
+
+
+def rolling_mean(values, window=ROLLING_WINDOW):
+    """Trailing mean over `window` values (fewer at the start of the series)."""
+    sums = np.cumsum(values, dtype=float)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums / np.minimum(np.arange(1, len(values) + 1), window)
+
+
+def period_growth(values, period=ROLLING_WINDOW):
+    """Totals of consecutive periods ending with the last value, and each one's change in percent.
+
+    A leading partial period is dropped; growth is NaN where the previous
+    period was zero.
+    """
+    periods = len(values) // period
+    totals = np.asarray(values[len(values) - periods * period:], dtype=float).reshape(periods, period).sum(axis=1)
+    previous = np.concatenate(([np.nan], totals[:-1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(previous > 0, (totals - previous) * 100.0 / previous, np.nan)
+    return totals, growth
+
+
+def percentiles(values, qs=PERCENTILES):
+    if len(values) == 0:
+        return {q: 0.0 for q in qs}
+    return dict(zip(qs, np.percentile(values, qs).tolist()))
+
+
+def _catalog(cursor, wholesaler_id):
+    """The wholesaler's products: sorted ids, names, category codes and category names.
+
+    Names and codes carry one extra trailing entry for products not (or no
+    longer) in the catalog.
+    """
+    cursor.execute(CATALOG_SQL, (wholesaler_id,))
+    rows = sorted(cursor.fetchall())
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    names = [row[1] for row in rows] + [UNKNOWN_PRODUCT]
+    categories, codes = np.unique(np.array([row[2] or UNKNOWN_CATEGORY for row in rows] + [UNKNOWN_CATEGORY]),
+                                  return_inverse=True)
+    return ids, names, codes, categories.tolist()
+
+
+def _positions(sorted_ids, ids):
+    """Index of each id in sorted_ids, or len(sorted_ids) where it is missing."""
+    if len(sorted_ids) == 0:
+        return np.zeros(len(ids), dtype=np.int64)
+    position = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[position] == ids, position, len(sorted_ids))
+
+
+def wholesaler_insights(cursor, wholesaler_id, today, days=30):
+    """Trends and breakdowns for the `days` days ending today, ready for analytics.html."""
+    start = today - timedelta(days=days - 1)
+    columns = load_product_days(cursor, wholesaler_id, start, days)
+
+    revenue = daily_totals(columns, 'revenue', days)
+    weekly_revenue, weekly_growth = period_growth(revenue)
+    weeks = len(weekly_revenue)
+    week_starts = [today - timedelta(days=ROLLING_WINDOW * (weeks - i) - 1) for i in range(weeks)]
+
+    # Per product: one bin per distinct product id in the period
+    product_ids, product_index = np.unique(columns['product_id'], return_inverse=True)
+    product_revenue = np.bincount(product_index, weights=columns['revenue'], minlength=len(product_ids))
+    product_orders = np.bincount(product_index, weights=columns['orders'], minlength=len(product_ids))
+    product_quantity = np.bincount(product_index, weights=columns['quantity'], minlength=len(product_ids))
+
+    # Map those products onto the catalog's categories in one searchsorted
+    catalog_ids, catalog_names, catalog_codes, categories = _catalog(cursor, wholesaler_id)
+    position = _positions(catalog_ids, product_ids)
+    category_revenue = np.bincount(catalog_codes[position], weights=product_revenue, minlength=len(categories))
+
+    total_revenue = product_revenue.sum()
+    shares = category_revenue * 100.0 / total_revenue if total_revenue else np.zeros(len(categories))
+    category_order = np.argsort(-category_revenue, kind='stable')
+    top = np.lexsort((-product_orders, -product_revenue))[:TOP_PRODUCTS]
+
+    return {
+        'labels': [(start + timedelta(days=i)).isoformat() for i in range(days)],
+        'daily_revenue': revenue.tolist(),
+        'rolling_revenue': rolling_mean(revenue).round(2).tolist(),
+        'daily_orders': daily_totals(columns, 'orders', days).astype(int).tolist(),
+        'weeks': [
+            {'start': week_starts[i].isoformat(), 'revenue': float(weekly_revenue[i]),
+             'growth': None if np.isnan(weekly_growth[i]) else float(weekly_growth[i])}
+            for i in range(weeks)
+        ],
+        'daily_revenue_percentiles': percentiles(revenue),
+        'categories': [
+            {'name': categories[code], 'revenue': float(category_revenue[code]), 'share': float(shares[code])}
+            for code in category_order if category_revenue[code] > 0
+        ],
+        'top_products': [
+            {'name': catalog_names[position[i]],
+             'orders': int(product_orders[i]), 'quantity': int(product_quantity[i]),
+             'revenue': float(product_revenue[i])}
+            for i in top
+        ],
+    }
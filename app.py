@@ -1,12 +1,31 @@
 from flask import Flask, render_template, redirect, url_for, request, flash, session, send_file, jsonify
-import sqlite3
 import os
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import uuid
 import json
 import requests
 
+import analytics
+import cache
+import cart
+import checkout
+import counters
+import db
+import dispatch
+import forecast
+import groupbuy
+import inventory
+import models
+import pagination
+import rollup
+from db import get_db
+import schema
+import scores
+import search
+import storefront
+import suggest
+
 # Load environment variables from .env file
 try:
     from dotenv import load_dotenv
@@ -25,6 +44,15 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', 'AIzaSyDyYEw7SLwswMtutVhtUy0zI2bvaf
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Pooled, request-scoped database connections (see db.py)
+db.init_app(app)
+app.add_template_global(pagination.page_url)
+
+# View/like counts are buffered and written in the background (see counters.py)
+@app.before_request
+def start_counter_flush():
+    counters.product_counters.start(db.get_pool())
+
 # Make API key available to templates (optional - for client-side usage)
 @app.context_processor
 def inject_api_key():
@@ -40,119 +68,16 @@ def allowed_file(filename):
 
 # Database setup
 def init_db():
-    conn = sqlite3.connect('vendor_clubs.db')
-    cursor = conn.cursor()
-    
-    # Vendors table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS vendors (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT NOT NULL,
-            phone TEXT,
-            password TEXT,
-            location TEXT,
-            is_approved BOOLEAN DEFAULT FALSE,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Wholesalers table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS wholesalers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            phone TEXT NOT NULL UNIQUE,
-            password TEXT NOT NULL,
-            shop_name TEXT NOT NULL,
-            id_doc_path TEXT,
-            license_doc_path TEXT,
-            sourcing_info TEXT,
-            location TEXT,
-            is_approved BOOLEAN DEFAULT FALSE,
-            trust_score REAL DEFAULT 4.7,
-            response_rate REAL DEFAULT 95.0,
-            delivery_rate REAL DEFAULT 92.0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Products table (now with description)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            wholesaler_id INTEGER,
-            name TEXT NOT NULL,
-            category TEXT,
-            description TEXT,
-            price REAL NOT NULL,
-            stock INTEGER NOT NULL,
-            group_buy_eligible BOOLEAN DEFAULT TRUE,
-            image_path TEXT,
-            views INTEGER DEFAULT 0,
-            likes INTEGER DEFAULT 0,
-            status TEXT DEFAULT 'In Stock',
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (wholesaler_id) REFERENCES wholesalers (id)
-        )
-    ''')
-    
-    # Migration: add description column if not exists
-    try:
-        cursor.execute("ALTER TABLE products ADD COLUMN description TEXT")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    # Orders table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            wholesaler_id INTEGER,
-            vendor_id INTEGER,
-            product_id INTEGER,
-            quantity INTEGER,
-            total_amount REAL,
-            status TEXT DEFAULT 'pending',
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (wholesaler_id) REFERENCES wholesalers (id),
-            FOREIGN KEY (vendor_id) REFERENCES vendors (id),
-            FOREIGN KEY (product_id) REFERENCES products (id)
-        )
-    ''')
+    conn = get_db()
     
-    # Reviews table with reply column
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reviews (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            wholesaler_id INTEGER,
-            vendor_id INTEGER,
-            rating INTEGER,
-            comment TEXT,
-            reply TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (wholesaler_id) REFERENCES wholesalers (id),
-            FOREIGN KEY (vendor_id) REFERENCES vendors (id)
-        )
-    ''')
-    
-    # Analytics table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS analytics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            wholesaler_id INTEGER,
-            date DATE,
-            total_orders INTEGER DEFAULT 0,
-            total_revenue REAL DEFAULT 0,
-            active_customers INTEGER DEFAULT 0,
-            FOREIGN KEY (wholesaler_id) REFERENCES wholesalers (id)
-        )
-    ''')
+    # Bring the schema up to date (see schema.py / migrations/). An up-to-date
+    # database only costs one SELECT on schema_version here.
+    if not schema.is_current(conn):
+        if os.getenv('DB_AUTO_MIGRATE', '1') != '1':
+            raise RuntimeError('Database schema is out of date, run "python migrate.py" first')
+        schema.migrate(conn, progress=print)
     
-    # Check if reply column exists in reviews table, if not add it
-    cursor.execute("PRAGMA table_info(reviews)")
-    columns = [column[1] for column in cursor.fetchall()]
-    if 'reply' not in columns:
-        cursor.execute('ALTER TABLE reviews ADD COLUMN reply TEXT')
+    cursor = conn.cursor()
     
     # Insert sample data if empty
     cursor.execute('SELECT COUNT(*) FROM vendors')
@@ -169,11 +94,12 @@ def init_db():
         
         # Sample wholesaler
         cursor.execute('''
-            INSERT INTO wholesalers (name, phone, password, shop_name, sourcing_info, location, is_approved, trust_score, response_rate, delivery_rate)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', ('Mumbai Fresh Mart', '9999999999', 'password123', 'Fresh Mart Wholesale', 'Quality products from local farms', 'Ghatkopar', 1, 4.7, 95.0, 92.0))
+            INSERT INTO wholesalers (name, phone, password, shop_name, sourcing_info, location, is_approved)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            RETURNING id
+        ''', ('Mumbai Fresh Mart', '9999999999', 'password123', 'Fresh Mart Wholesale', 'Quality products from local farms', 'Ghatkopar', 1))
         
-        wholesaler_id = cursor.lastrowid
+        wholesaler_id = cursor.fetchone()[0]
         
         # Sample products
         products_data = [
@@ -206,66 +132,52 @@ def init_db():
             (wholesaler_id, 4, 4, 'Quality products, but delivery could be faster.', 'We are working on improving delivery times.'),
         ]
         cursor.executemany('INSERT INTO reviews (wholesaler_id, vendor_id, rating, comment, reply) VALUES (?, ?, ?, ?, ?)', reviews_data)
-        
-        # Sample analytics data
-        today = datetime.now()
-        analytics_data = []
-        for i in range(30):
-            date = (today - timedelta(days=i)).strftime('%Y-%m-%d')
-            orders = 15 + (i % 10)
-            revenue = float(orders * 850.0)  # Ensure float
-            customers = 8 + (i % 5)
-            analytics_data.append((wholesaler_id, date, orders, revenue, customers))
-        
-        cursor.executemany('INSERT INTO analytics (wholesaler_id, date, total_orders, total_revenue, active_customers) VALUES (?, ?, ?, ?, ?)', analytics_data)
     
     conn.commit()
-    conn.close()
-    
-    # Update database schema to add any missing columns
-    update_database_schema()
 
 def get_dashboard_stats(wholesaler_id):
-    conn = sqlite3.connect('vendor_clubs.db')
+    # Served from a short-TTL per-wholesaler cache; order/product writes
+    # below call invalidate_dashboard_stats()
+    return cache.dashboard_stats.get_or_load(wholesaler_id, lambda: load_dashboard_stats(wholesaler_id))
+
+def invalidate_dashboard_stats(wholesaler_id):
+    cache.dashboard_stats.invalidate(wholesaler_id)
+
+def load_dashboard_stats(wholesaler_id):
+    conn = get_db()
     cursor = conn.cursor()
     
-    # Get total products
-    cursor.execute('SELECT COUNT(*) FROM products WHERE wholesaler_id = ?', (wholesaler_id,))
-    total_products = cursor.fetchone()[0]
-    
-    # Get pending orders
-    cursor.execute('SELECT COUNT(*) FROM orders WHERE wholesaler_id = ? AND status = "pending"', (wholesaler_id,))
-    pending_orders = cursor.fetchone()[0]
-    
-    # Get this month's revenue from completed orders
-    current_month = datetime.now().strftime('%Y-%m')
-    cursor.execute('''
-        SELECT COALESCE(SUM(total_amount), 0) FROM orders 
-        WHERE wholesaler_id = ? AND created_at LIKE ? AND status = "completed"
-    ''', (wholesaler_id, f'{current_month}%'))
-    month_revenue = cursor.fetchone()[0] or 0
+    # This month as a half-open created_at range so idx_orders_wholesaler_created is used;
+    # created_at is stored in UTC, so the month boundary is UTC too
+    today = datetime.now(timezone.utc)
+    month_start = today.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    month_range = (month_start.strftime('%Y-%m-%d'), next_month.strftime('%Y-%m-%d'))
     
-    # Get active customers (vendors who ordered this month)
+    # Everything the dashboard cards need in one round trip
     cursor.execute('''
-        SELECT COUNT(DISTINCT vendor_id) FROM orders 
-        WHERE wholesaler_id = ? AND created_at >= date('now', 'start of month')
-    ''', (wholesaler_id,))
-    active_customers = cursor.fetchone()[0]
-    
-    # Get wholesaler performance data
-    cursor.execute('SELECT trust_score, response_rate, delivery_rate FROM wholesalers WHERE id = ?', (wholesaler_id,))
-    performance = cursor.fetchone()
-    
-    conn.close()
+        SELECT
+            (SELECT COUNT(*) FROM products WHERE wholesaler_id = w.id),
+            (SELECT COUNT(*) FROM orders WHERE wholesaler_id = w.id AND status = 'pending'),
+            (SELECT COALESCE(SUM(total_amount), 0) FROM orders
+             WHERE wholesaler_id = w.id AND created_at >= ? AND created_at < ? AND status = 'completed'),
+            (SELECT COUNT(DISTINCT vendor_id) FROM orders
+             WHERE wholesaler_id = w.id AND created_at >= ? AND created_at < ?),
+            w.trust_score, w.response_rate, w.delivery_rate
+        FROM wholesalers w
+        WHERE w.id = ?
+    ''', month_range + month_range + (wholesaler_id,))
+    row = cursor.fetchone() or (0, 0, 0, 0, None, None, None)
+    total_products, pending_orders, month_revenue, active_customers, trust_score, response_rate, delivery_rate = row
     
     return {
         'total_products': total_products,
         'pending_orders': pending_orders,
-        'month_revenue': float(month_revenue),  # Ensure float
+        'month_revenue': float(month_revenue or 0),  # Ensure float
         'active_customers': active_customers,
-        'trust_score': performance[0] if performance else 4.7,
-        'response_rate': performance[1] if performance else 95.0,
-        'delivery_rate': performance[2] if performance else 92.0
+        'trust_score': trust_score if trust_score is not None else 4.7,
+        'response_rate': response_rate if response_rate is not None else 95.0,
+        'delivery_rate': delivery_rate if delivery_rate is not None else 92.0
     }
 
 # Routes
@@ -285,14 +197,13 @@ def register_wholesaler():
         location = request.form['location']
         
         # Check if phone number already exists
-        conn = sqlite3.connect('vendor_clubs.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT id FROM wholesalers WHERE phone = ?', (phone,))
         existing = cursor.fetchone()
         
         if existing:
             flash('Phone number already registered. Please use a different number.', 'error')
-            conn.close()
             return render_template('register_wholesaler.html')
         
         # Handle file uploads
@@ -319,7 +230,6 @@ def register_wholesaler():
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         ''', (name, phone, password, shop_name, id_doc_path, license_doc_path, sourcing_info, location))
         conn.commit()
-        conn.close()
         
         flash('Thank you for registering! Your application is pending approval.', 'success')
         return redirect(url_for('register_wholesaler'))
@@ -351,24 +261,34 @@ def admin_wholesalers():
     if not session.get('is_admin'):
         return redirect(url_for('admin_login'))
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM wholesalers WHERE is_approved = 0')
-    pending_wholesalers = cursor.fetchall()
-    conn.close()
+    cursor.execute('''
+        SELECT id, name, phone, shop_name, id_doc_path, license_doc_path, sourcing_info, location, created_at
+        FROM wholesalers WHERE is_approved = 0
+    ''')
+    pending_wholesalers = models.fetch_all(cursor, models.WholesalerApplication)
     
     return render_template('admin_wholesalers.html', wholesalers=pending_wholesalers)
 
+@app.route('/admin/metrics/counters')
+def admin_counter_metrics():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    # This worker's view/like buffer; each worker flushes its own
+    return jsonify(counters.product_counters.stats())
+
 @app.route('/admin/approve/<int:wholesaler_id>')
 def approve_wholesaler(wholesaler_id):
     if not session.get('is_admin'):
         return redirect(url_for('admin_login'))
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('UPDATE wholesalers SET is_approved = 1 WHERE id = ?', (wholesaler_id,))
     conn.commit()
-    conn.close()
+    storefront.wholesaler_changed()
     
     flash('Wholesaler approved successfully!', 'success')
     return redirect(url_for('admin_wholesalers'))
@@ -378,11 +298,22 @@ def reject_wholesaler(wholesaler_id):
     if not session.get('is_admin'):
         return redirect(url_for('admin_login'))
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('DELETE FROM wholesalers WHERE id = ?', (wholesaler_id,))
-    conn.commit()
-    conn.close()
+    cursor.execute('SELECT 1 FROM wholesalers WHERE id = ? AND is_approved = 0', (wholesaler_id,))
+    if cursor.fetchone() is None:
+        flash('Only pending applications can be rejected.', 'error')
+        return redirect(url_for('admin_wholesalers'))
+    try:
+        # The scores row the signup created goes first, in the same transaction
+        scores.wholesaler_removing(conn, wholesaler_id)
+        cursor.execute('DELETE FROM wholesalers WHERE id = ? AND is_approved = 0', (wholesaler_id,))
+        conn.commit()
+    except db.IntegrityError:
+        conn.rollback()
+        flash('This application is still referenced and cannot be removed.', 'error')
+        return redirect(url_for('admin_wholesalers'))
+    storefront.wholesaler_changed()
     
     flash('Wholesaler application rejected and removed.', 'success')
     return redirect(url_for('admin_wholesalers'))
@@ -394,17 +325,16 @@ def wholesaler_login():
         phone = request.form['phone']
         password = request.form['password']
         
-        conn = sqlite3.connect('vendor_clubs.db')
+        conn = get_db()
         cursor = conn.cursor()
-        cursor.execute('SELECT id, name, is_approved, password FROM wholesalers WHERE phone = ?', (phone,))
-        wholesaler = cursor.fetchone()
-        conn.close()
+        cursor.execute('SELECT id, name, password, is_approved FROM wholesalers WHERE phone = ?', (phone,))
+        wholesaler = models.fetch_one(cursor, models.Credentials)
         
         if wholesaler:
-            if wholesaler[3] == password:  # Check password
-                if wholesaler[2]:  # is_approved
-                    session['wholesaler_id'] = wholesaler[0]
-                    session['wholesaler_name'] = wholesaler[1]
+            if wholesaler.password == password:  # Check password
+                if wholesaler.is_approved:
+                    session['wholesaler_id'] = wholesaler.id
+                    session['wholesaler_name'] = wholesaler.name
                     return redirect(url_for('wholesaler_dashboard'))
                 else:
                     flash('Your application is still pending approval.', 'warning')
@@ -424,10 +354,13 @@ def wholesaler_dashboard():
     stats = get_dashboard_stats(wholesaler_id)
     
     # Get recent products
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM products WHERE wholesaler_id = ? ORDER BY created_at DESC LIMIT 4', (wholesaler_id,))
-    recent_products = cursor.fetchall()
+    cursor.execute('''
+        SELECT id, name, category, price, stock, image_path, views, likes, status, created_at
+        FROM products WHERE wholesaler_id = ? ORDER BY created_at DESC LIMIT 4
+    ''', (wholesaler_id,))
+    recent_products = models.fetch_all(cursor, models.InventoryProduct)
     
     # Get recent reviews with vendor names and replies
     cursor.execute('''
@@ -437,14 +370,26 @@ def wholesaler_dashboard():
         WHERE r.wholesaler_id = ? 
         ORDER BY r.created_at DESC LIMIT 3
     ''', (wholesaler_id,))
-    recent_reviews = cursor.fetchall()
+    recent_reviews = models.fetch_all(cursor, models.Review)
     
-    conn.close()
+    # Products already low, or whose stock won't cover next week's forecast
+    # demand (forecast_demand.py), biggest shortfall first
+    cursor.execute('''
+        SELECT p.id, p.name, p.stock, p.status, f.quantity, f.method
+        FROM products p
+        LEFT JOIN forecasts f ON f.product_id = p.id
+        WHERE p.wholesaler_id = ? AND (p.status <> 'In Stock' OR p.stock < f.quantity)
+        ORDER BY p.stock - COALESCE(f.quantity, 0), p.stock
+        LIMIT 5
+    ''', (wholesaler_id,))
+    restock_alerts = models.fetch_all(cursor, models.RestockAlert)
     
     return render_template('wholesaler_dashboard.html', 
                          stats=stats, 
                          recent_products=recent_products, 
-                         recent_reviews=recent_reviews)
+                         recent_reviews=recent_reviews,
+                         restock_alerts=restock_alerts,
+                         forecast_days=forecast.HORIZON_DAYS)
 
 @app.route('/wholesaler/profile')
 def wholesaler_profile():
@@ -453,11 +398,14 @@ def wholesaler_profile():
     
     wholesaler_id = session['wholesaler_id']
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM wholesalers WHERE id = ?', (wholesaler_id,))
-    wholesaler = cursor.fetchone()
-    conn.close()
+    cursor.execute('''
+        SELECT id, name, phone, shop_name, id_doc_path, license_doc_path, sourcing_info, location,
+               trust_score, response_rate, delivery_rate, created_at, profile_photo
+        FROM wholesalers WHERE id = ?
+    ''', (wholesaler_id,))
+    wholesaler = models.fetch_one(cursor, models.WholesalerProfile)
     
     if not wholesaler:
         flash('Wholesaler not found.', 'error')
@@ -471,13 +419,37 @@ def wholesaler_products():
         return redirect(url_for('wholesaler_login'))
     
     wholesaler_id = session['wholesaler_id']
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM products WHERE wholesaler_id = ? ORDER BY created_at DESC', (wholesaler_id,))
-    products = cursor.fetchall()
-    conn.close()
-    
-    return render_template('products_manage.html', products=products)
+    # Newest first, one keyset page at a time (see pagination.py)
+    page = pagination.fetch_page(cursor, '''
+        SELECT id, name, category, price, stock, image_path, views, likes, status, created_at
+        FROM products
+        WHERE wholesaler_id = ? AND (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    ''', '''
+        SELECT id, name, category, price, stock, image_path, views, likes, status, created_at
+        FROM products
+        WHERE wholesaler_id = ? AND (created_at, id) > (?, ?)
+        ORDER BY created_at, id
+        LIMIT ?
+    ''', (wholesaler_id,), models.InventoryProduct, key=lambda product: (product.created_at, product.id),
+        first=pagination.FIRST_DESCENDING_TIME, limit=pagination.page_size())
+
+    if pagination.wants_json():
+        return jsonify(page.as_json())
+    cursor.execute('SELECT low_stock_threshold FROM wholesalers WHERE id = ?', (wholesaler_id,))
+    low_stock_threshold = cursor.fetchone()[0]
+    return render_template('products_manage.html', products=page.items, page=page,
+                           low_stock_threshold=low_stock_threshold)
+
+def summarize_order_statuses(rows):
+    """{status: {'count', 'revenue'}} from (status, count, revenue) rows, for the summary cards."""
+    totals = {status: {'count': 0, 'revenue': 0} for status in ('pending', 'processing', 'completed')}
+    for status, count, revenue in rows:
+        totals[status] = {'count': count, 'revenue': revenue}
+    return totals
 
 @app.route('/wholesaler/orders')
 def wholesaler_orders():
@@ -485,20 +457,66 @@ def wholesaler_orders():
         return redirect(url_for('wholesaler_login'))
     
     wholesaler_id = session['wholesaler_id']
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT o.*, v.name as vendor_name, p.name as product_name 
+    # Newest first, one keyset page at a time (see pagination.py)
+    page = pagination.fetch_page(cursor, '''
+        SELECT o.id, o.quantity, o.total_amount, o.status, o.created_at,
+               COALESCE(v.name, 'Group buy: ' || g.location) as vendor_name, p.name as product_name 
         FROM orders o 
-        JOIN vendors v ON o.vendor_id = v.id 
+        LEFT JOIN vendors v ON o.vendor_id = v.id 
+        LEFT JOIN group_buys g ON o.group_buy_id = g.id 
         JOIN products p ON o.product_id = p.id 
-        WHERE o.wholesaler_id = ? 
-        ORDER BY o.created_at DESC
+        WHERE o.wholesaler_id = ? AND (o.created_at, o.id) < (?, ?)
+        ORDER BY o.created_at DESC, o.id DESC
+        LIMIT ?
+    ''', '''
+        SELECT o.id, o.quantity, o.total_amount, o.status, o.created_at,
+               COALESCE(v.name, 'Group buy: ' || g.location) as vendor_name, p.name as product_name 
+        FROM orders o 
+        LEFT JOIN vendors v ON o.vendor_id = v.id 
+        LEFT JOIN group_buys g ON o.group_buy_id = g.id 
+        JOIN products p ON o.product_id = p.id 
+        WHERE o.wholesaler_id = ? AND (o.created_at, o.id) > (?, ?)
+        ORDER BY o.created_at, o.id
+        LIMIT ?
+    ''', (wholesaler_id,), models.OrderLine, key=lambda order: (order.created_at, order.id),
+        first=pagination.FIRST_DESCENDING_TIME, limit=pagination.page_size(50))
+
+    if pagination.wants_json():
+        return jsonify(page.as_json())
+
+    # Summary cards cover every order, not just this page
+    cursor.execute('''
+        SELECT status, COUNT(*), COALESCE(SUM(total_amount), 0)
+        FROM orders
+        WHERE wholesaler_id = ?
+        GROUP BY status
     ''', (wholesaler_id,))
-    orders = cursor.fetchall()
-    conn.close()
+    order_totals = summarize_order_statuses(cursor.fetchall())
+
+    return render_template('orders_manage.html', orders=page.items, page=page, order_totals=order_totals,
+                           party_label='Vendor')
+
+@app.route('/wholesaler/delivery-runs')
+def delivery_runs():
+    if 'wholesaler_id' not in session:
+        return redirect(url_for('wholesaler_login'))
+    
+    wholesaler_id = session['wholesaler_id']
+    capacity = max(request.args.get('capacity', dispatch.VEHICLE_CAPACITY, type=int), 1)
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT location FROM wholesalers WHERE id = ?', (wholesaler_id,))
+    row = cursor.fetchone()
+    # Open orders grouped into capacity-limited runs from the wholesaler's locality (see dispatch.py)
+    runs = dispatch.plan(cursor, wholesaler_id, row[0] if row else None, capacity)
     
-    return render_template('orders_manage.html', orders=orders)
+    if pagination.wants_json():
+        return jsonify(runs)
+    return render_template('delivery_runs.html', plan=runs, depot=row[0] if row else None)
+
+ANALYTICS_PERIOD_DAYS = 30
 
 @app.route('/wholesaler/analytics')
 def wholesaler_analytics():
@@ -506,21 +524,50 @@ def wholesaler_analytics():
         return redirect(url_for('wholesaler_login'))
     
     wholesaler_id = session['wholesaler_id']
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
     
-    # Get analytics data for charts
+    # Daily rollup rows kept current by the order triggers (see rollup.py);
+    # this period and the one before it, for the change figures
+    today = datetime.now(timezone.utc).date()
+    period_start = today - timedelta(days=ANALYTICS_PERIOD_DAYS - 1)
+    previous_start = period_start - timedelta(days=ANALYTICS_PERIOD_DAYS)
     cursor.execute('''
-        SELECT date, total_orders, total_revenue, active_customers 
-        FROM analytics 
-        WHERE wholesaler_id = ? 
-        ORDER BY date DESC LIMIT 30
-    ''', (wholesaler_id,))
-    analytics_data = cursor.fetchall()
-    
-    conn.close()
+        SELECT date, total_orders, total_revenue, active_customers
+        FROM analytics
+        WHERE wholesaler_id = ? AND date >= ?
+        ORDER BY date
+    ''', (wholesaler_id, previous_start.isoformat()))
+    rows = [(str(row[0]), row[1], row[2], row[3]) for row in cursor.fetchall()]
+    analytics_data = [row for row in rows if row[0] >= period_start.isoformat()]
+    previous_rows = [row for row in rows if row[0] < period_start.isoformat()]
+    
+    # Distinct vendors over each period, from the per-day customer rows
+    customers = {}
+    for key, since, until in (('current', period_start, today), ('previous', previous_start, period_start - timedelta(days=1))):
+        cursor.execute('''
+            SELECT COUNT(DISTINCT vendor_id) FROM analytics_customers
+            WHERE wholesaler_id = ? AND date >= ? AND date <= ?
+        ''', (wholesaler_id, since.isoformat(), until.isoformat()))
+        customers[key] = cursor.fetchone()[0]
+    
+    current, previous = rollup.summarize(analytics_data), rollup.summarize(previous_rows)
+    summary = {
+        'orders': current['orders'],
+        'revenue': current['revenue'],
+        'average_order_value': current['average_order_value'],
+        'customers': customers['current'],
+        'orders_change': rollup.percent_change(current['orders'], previous['orders']),
+        'revenue_change': rollup.percent_change(current['revenue'], previous['revenue']),
+        'average_order_value_change': rollup.percent_change(current['average_order_value'],
+                                                            previous['average_order_value']),
+        'customers_change': rollup.percent_change(customers['current'], customers['previous']),
+    }
+    # Rolling means, weekly growth and product/category breakdowns (analytics.py)
+    insights = analytics.wholesaler_insights(cursor, wholesaler_id, today, days=ANALYTICS_PERIOD_DAYS)
     
-    return render_template('analytics.html', analytics_data=analytics_data)
+    return render_template('analytics.html', analytics_data=analytics_data, summary=summary, insights=insights,
+                           period_days=ANALYTICS_PERIOD_DAYS)
 
 @app.route('/wholesaler/add-product', methods=['GET', 'POST'])
 def add_product():
@@ -534,14 +581,6 @@ def add_product():
         price = float(request.form['price'])
         stock = int(request.form['stock'])
 
-        # Determine stock status
-        if stock == 0:
-            status = 'Out of Stock'
-        elif stock < 50:
-            status = 'Low Stock'
-        else:
-            status = 'In Stock'
-
         # Handle product image upload
         image_path = None
         if 'product_image' in request.files:
@@ -554,14 +593,20 @@ def add_product():
                 image_path = relative_path
 
         # Save product to database
-        conn = sqlite3.connect('vendor_clubs.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO products (wholesaler_id, name, category, price, stock, image_path, status)
+            INSERT INTO products (wholesaler_id, name, category, price, stock, image_path, group_buy_eligible)
             VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (session['wholesaler_id'], name, category, price, stock, image_path, status))
+            RETURNING id
+        ''', (session['wholesaler_id'], name, category, price, stock, image_path,
+              int('group_buy_eligible' in request.form)))
+        product_id = cursor.fetchone()[0]
         conn.commit()
-        conn.close()
+        invalidate_dashboard_stats(session['wholesaler_id'])
+        storefront.product_added(session['wholesaler_id'], category)
+        search.product_saved(product_id)
+        suggest.product_saved(product_id)
 
         flash('Product added successfully!', 'success')
         return redirect(url_for('wholesaler_dashboard'))  # Redirect to dashboard
@@ -573,7 +618,7 @@ def edit_product(product_id):
     if 'wholesaler_id' not in session:
         return redirect(url_for('wholesaler_login'))
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     if request.method == 'POST':
@@ -582,14 +627,7 @@ def edit_product(product_id):
         subcategory = request.form.get('subcategory', '')  # Specific item (not stored in DB, but available if needed)
         price = float(request.form['price'])
         stock = int(request.form['stock'])
-
-        # Determine stock status
-        if stock == 0:
-            status = 'Out of Stock'
-        elif stock < 50:
-            status = 'Low Stock'
-        else:
-            status = 'In Stock'
+        version = request.form.get('version', type=int)  # as loaded into the form
 
         # Handle image upload if new image provided
         cursor.execute('SELECT image_path FROM products WHERE id = ? AND wholesaler_id = ?', 
@@ -606,23 +644,30 @@ def edit_product(product_id):
                 image_file.save(full_path)
                 image_path = relative_path
 
-        # Update product
+        # Update product, unless an order or another edit changed it since the form was loaded
         cursor.execute('''
             UPDATE products 
-            SET name = ?, category = ?, price = ?, stock = ?, status = ?, image_path = ?
-            WHERE id = ? AND wholesaler_id = ?
-        ''', (name, category, price, stock, status, image_path, product_id, session['wholesaler_id']))
+            SET name = ?, category = ?, price = ?, stock = ?, image_path = ?, version = version + 1
+            WHERE id = ? AND wholesaler_id = ? AND version = COALESCE(?, version)
+        ''', (name, category, price, stock, image_path, product_id, session['wholesaler_id'], version))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            flash('This product changed while you were editing it (for example, an order reduced its stock). '
+                  'Please review the current values and save again.', 'error')
+            return redirect(url_for('edit_product', product_id=product_id))
         conn.commit()
-        conn.close()
+        storefront.product_changed(session['wholesaler_id'], category_changed=True)
+        search.product_saved(product_id)
+        suggest.product_saved(product_id)
+        cart.product_changed()
 
         flash('Product updated successfully!', 'success')
         return redirect(url_for('wholesaler_products'))
     
     # GET request - show edit form
-    cursor.execute('SELECT * FROM products WHERE id = ? AND wholesaler_id = ?', 
+    cursor.execute('SELECT id, name, category, price, stock, image_path, version FROM products WHERE id = ? AND wholesaler_id = ?', 
                   (product_id, session['wholesaler_id']))
-    product = cursor.fetchone()
-    conn.close()
+    product = models.fetch_one(cursor, models.ProductForm)
     
     if not product:
         flash('Product not found.', 'error')
@@ -639,23 +684,74 @@ def update_stock():
     data = request.get_json()
     product_id = data.get('product_id')
     new_stock = data.get('stock')
+    version = data.get('version')  # optional; rejects the write if the product changed since
     
-    # Determine new status
-    if new_stock == 0:
-        status = 'Out of Stock'
-    elif new_stock < 50:
-        status = 'Low Stock'
-    else:
-        status = 'In Stock'
-    
-    conn = sqlite3.connect('vendor_clubs.db')
+    # status is derived from stock by a trigger (migration 0009)
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('UPDATE products SET stock = ?, status = ? WHERE id = ? AND wholesaler_id = ?', 
-                   (new_stock, status, product_id, session['wholesaler_id']))
+    cursor.execute('''
+        UPDATE products SET stock = ?, version = version + 1
+        WHERE id = ? AND wholesaler_id = ? AND version = COALESCE(?, version)
+    ''', (new_stock, product_id, session['wholesaler_id'], version))
+    if cursor.rowcount == 0:
+        conn.rollback()
+        if version is None:
+            return jsonify({'error': 'Product not found'}), 404
+        return jsonify({'error': 'Product changed since it was loaded; reload and try again'}), 409
+    cursor.execute('SELECT status, version FROM products WHERE id = ?', (product_id,))
+    status, version = cursor.fetchone()
     conn.commit()
-    conn.close()
     
-    return jsonify({'success': True, 'status': status})
+    return jsonify({'success': True, 'status': status, 'version': version})
+
+@app.route('/api/low-stock-threshold', methods=['POST'])
+def update_low_stock_threshold():
+    if 'wholesaler_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json()
+    try:
+        threshold = int(data['threshold'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'threshold must be a whole number'}), 400
+    if threshold < 1:
+        return jsonify({'error': 'threshold must be at least 1'}), 400
+    
+    # A trigger re-derives the status of all this wholesaler's products
+    conn = get_db()
+    conn.execute('UPDATE wholesalers SET low_stock_threshold = ? WHERE id = ?', (threshold, session['wholesaler_id']))
+    conn.commit()
+    invalidate_dashboard_stats(session['wholesaler_id'])
+    
+    return jsonify({'success': True, 'threshold': threshold})
+
+@app.route('/api/bulk-update-stock', methods=['POST'])
+def bulk_update_stock():
+    if 'wholesaler_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    # JSON {"changes": [{"product_id", "stock", "price"}, ...]} or a CSV file upload
+    try:
+        upload = request.files.get('file')
+        if upload:
+            changes = inventory.parse_csv(upload.read().decode('utf-8-sig'))
+        else:
+            data = request.get_json(silent=True) or {}
+            changes = inventory.parse_changes(data.get('changes') or [])
+    except UnicodeDecodeError:
+        return jsonify({'error': 'CSV must be UTF-8 encoded'}), 400
+    except inventory.BulkUpdateError as e:
+        return jsonify({'error': str(e), 'errors': e.errors}), 400
+    
+    wholesaler_id = session['wholesaler_id']
+    statuses, skipped = inventory.bulk_update(get_db(), wholesaler_id, changes)
+    if any(price is not None for _, _, price in changes):
+        storefront.product_changed(wholesaler_id)
+        cart.product_changed()
+    invalidate_dashboard_stats(wholesaler_id)
+    
+    return jsonify({'success': True, 'updated': len(statuses), 'skipped': skipped,
+                    'statuses': {str(product_id): status for product_id, status in statuses.items()}})
 
 @app.route('/api/update-order-status', methods=['POST'])
 def update_order_status():
@@ -666,12 +762,14 @@ def update_order_status():
     order_id = data.get('order_id')
     new_status = data.get('status')
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('UPDATE orders SET status = ? WHERE id = ? AND wholesaler_id = ?', 
                    (new_status, order_id, session['wholesaler_id']))
     conn.commit()
-    conn.close()
+    invalidate_dashboard_stats(session['wholesaler_id'])
+    # Completing or cancelling moves delivery_rate and trust_score (scores.py)
+    storefront.wholesaler_changed()
     
     return jsonify({'success': True})
 
@@ -683,24 +781,45 @@ def delete_product():
     data = request.get_json()
     product_id = data.get('product_id')
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # Get image path to delete file
     cursor.execute('SELECT image_path FROM products WHERE id = ? AND wholesaler_id = ?', 
                   (product_id, session['wholesaler_id']))
     result = cursor.fetchone()
+    if result is None:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    # Orders (and the group buys pooled into them) keep their product
+    cursor.execute('SELECT 1 FROM orders WHERE product_id = ? LIMIT 1', (product_id,))
+    if cursor.fetchone():
+        return jsonify({'error': 'This product has orders and cannot be deleted; '
+                                 'set its stock to 0 to stop selling it'}), 409
+    
+    # Delete product, after the rows that reference it
+    try:
+        cart.product_removing(conn, product_id)
+        forecast.product_removing(conn, product_id)
+        groupbuy.product_removing(conn, product_id)
+        counters.product_removing(conn, product_id)
+        cursor.execute('DELETE FROM products WHERE id = ? AND wholesaler_id = ?', 
+                       (product_id, session['wholesaler_id']))
+        conn.commit()
+    except db.IntegrityError:
+        # Ordered in the meantime, or referenced from somewhere new
+        conn.rollback()
+        return jsonify({'error': 'This product is still referenced and cannot be deleted'}), 409
     
-    if result and result[0]:
+    if result[0]:
         image_path = os.path.join('static', result[0])
         if os.path.exists(image_path):
             os.remove(image_path)
-    
-    # Delete product
-    cursor.execute('DELETE FROM products WHERE id = ? AND wholesaler_id = ?', 
-                   (product_id, session['wholesaler_id']))
-    conn.commit()
-    conn.close()
+    invalidate_dashboard_stats(session['wholesaler_id'])
+    storefront.product_removed(session['wholesaler_id'])
+    search.product_removed(product_id)
+    suggest.product_removed(product_id)
+    cart.product_removed(product_id)
     
     return jsonify({'success': True})
 
@@ -713,32 +832,17 @@ def reply_review():
     review_id = data.get('review_id')
     reply_text = data.get('reply')
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('UPDATE reviews SET reply = ? WHERE id = ? AND wholesaler_id = ?', 
+    # replied_at keeps the first reply's time; the reply latency feeds response_rate (scores.py)
+    cursor.execute('UPDATE reviews SET reply = ?, replied_at = COALESCE(replied_at, CURRENT_TIMESTAMP) WHERE id = ? AND wholesaler_id = ?', 
                    (reply_text, review_id, session['wholesaler_id']))
     conn.commit()
-    conn.close()
+    invalidate_dashboard_stats(session['wholesaler_id'])
+    storefront.wholesaler_changed()
     
     return jsonify({'success': True})
 
-# First, update the database schema by adding this function
-def update_database_schema():
-    """Add profile_photo column to wholesalers table if it doesn't exist"""
-    conn = sqlite3.connect('vendor_clubs.db')
-    cursor = conn.cursor()
-    
-    # Check if profile_photo column exists
-    cursor.execute("PRAGMA table_info(wholesalers)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'profile_photo' not in columns:
-        cursor.execute('ALTER TABLE wholesalers ADD COLUMN profile_photo TEXT')
-        conn.commit()
-        print("✅ Added profile_photo column to wholesalers table")
-    
-    conn.close()
-
 # Profile photo upload route
 @app.route('/api/upload-profile-photo', methods=['POST'])
 def upload_profile_photo():
@@ -762,7 +866,7 @@ def upload_profile_photo():
         file.save(full_path)
         
         # Update database with new profile photo path
-        conn = sqlite3.connect('vendor_clubs.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # Get old profile photo to delete it
@@ -773,7 +877,6 @@ def upload_profile_photo():
         cursor.execute('UPDATE wholesalers SET profile_photo = ? WHERE id = ?', 
                       (relative_path, session['wholesaler_id']))
         conn.commit()
-        conn.close()
         
         # Delete old profile photo if it exists
         if old_photo and old_photo[0]:
@@ -799,7 +902,7 @@ def edit_profile():
     
     wholesaler_id = session['wholesaler_id']
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     if request.method == 'POST':
@@ -817,18 +920,23 @@ def edit_profile():
         ''', (name, shop_name, location, sourcing_info, wholesaler_id))
         
         conn.commit()
+        storefront.wholesaler_changed()
+        search.wholesaler_renamed()
+        suggest.wholesaler_renamed()
         
         # Update session name if changed
         session['wholesaler_name'] = name
         
         flash('Profile updated successfully!', 'success')
-        conn.close()
         return redirect(url_for('wholesaler_profile'))
     
     # GET request - show edit form
-    cursor.execute('SELECT * FROM wholesalers WHERE id = ?', (wholesaler_id,))
-    wholesaler = cursor.fetchone()
-    conn.close()
+    cursor.execute('''
+        SELECT id, name, phone, shop_name, id_doc_path, license_doc_path, sourcing_info, location,
+               trust_score, response_rate, delivery_rate, created_at, profile_photo
+        FROM wholesalers WHERE id = ?
+    ''', (wholesaler_id,))
+    wholesaler = models.fetch_one(cursor, models.WholesalerProfile)
     
     if not wholesaler:
         flash('Wholesaler not found.', 'error')
@@ -856,7 +964,7 @@ def change_password():
     if len(new_password) < 6:
         return jsonify({'error': 'New password must be at least 6 characters long'}), 400
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # Verify current password
@@ -864,14 +972,12 @@ def change_password():
     stored_password = cursor.fetchone()
     
     if not stored_password or stored_password[0] != current_password:
-        conn.close()
         return jsonify({'error': 'Current password is incorrect'}), 400
     
     # Update password
     cursor.execute('UPDATE wholesalers SET password = ? WHERE id = ?', 
                   (new_password, session['wholesaler_id']))
     conn.commit()
-    conn.close()
     
     return jsonify({'success': True, 'message': 'Password changed successfully'})
 
@@ -889,16 +995,15 @@ def vendor_login():
         phone = request.form["phone"]
         password = request.form["password"]
         
-        conn = sqlite3.connect("vendor_clubs.db")
+        conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM vendors WHERE phone = ?", (phone,))
-        vendor = cursor.fetchone()
-        conn.close()
+        cursor.execute("SELECT id, name, password, is_approved FROM vendors WHERE phone = ?", (phone,))
+        vendor = models.fetch_one(cursor, models.Credentials)
         
-        if vendor and vendor[4] == password:
-            if vendor[6]:  # is_approved
-                session["vendor_id"] = vendor[0]
-                session["vendor_name"] = vendor[1]
+        if vendor and vendor.password == password:
+            if vendor.is_approved:
+                session["vendor_id"] = vendor.id
+                session["vendor_name"] = vendor.name
                 flash("Login successful!")
                 return redirect(url_for("vendor_dashboard"))
             else:
@@ -910,70 +1015,36 @@ def vendor_login():
     
     return render_template("vendor_login.html")
 
+DASHBOARD_RECOMMENDATIONS = 8
+
 @app.route("/vendor/dashboard")
 def vendor_dashboard():
     if "vendor_id" not in session:
         return redirect(url_for("vendor_login"))
     
-    vendor_id = session["vendor_id"]
+    # Categories and top wholesalers come from the precomputed storefront
+    # snapshot (see storefront.py), no per-wholesaler queries here
+    top_wholesalers_with_products, categories = storefront.storefront.snapshot()
     
-    conn = sqlite3.connect("vendor_clubs.db")
+    # Precomputed from co-purchases by update_recommendations.py (see recommend.py)
+    conn = get_db()
     cursor = conn.cursor()
-    
-    # Get recent orders for this vendor
-    cursor.execute("""
-        SELECT o.*, p.name, p.price, p.category
-        FROM orders o
-        JOIN products p ON o.product_id = p.id
-        WHERE o.vendor_id = ?
-        ORDER BY o.created_at DESC
-        LIMIT 5
-    """, (vendor_id,))
-    recent_orders = cursor.fetchall()
-    
-    # Get all categories for the grid
-    cursor.execute("""
-        SELECT DISTINCT category FROM products 
-        WHERE category IS NOT NULL AND category != ""
-        ORDER BY category
-    """)
-    categories = cursor.fetchall()
-
-    # Get top 6 wholesalers by trust_score
-    cursor.execute("""
-        SELECT id, name, shop_name, trust_score FROM wholesalers
-        WHERE is_approved = 1
-        ORDER BY trust_score DESC
-        LIMIT 6
-    """)
-    top_wholesalers = cursor.fetchall()
-    top_wholesalers_with_products = []
-    for wholesaler in top_wholesalers:
-        wholesaler_id, name, shop_name, trust_score = wholesaler
-        # Get top 3 products by views for this wholesaler
-        cursor.execute("""
-            SELECT id, name, price, image_path FROM products
-            WHERE wholesaler_id = ?
-            ORDER BY views DESC
-            LIMIT 3
-        """, (wholesaler_id,))
-        products = cursor.fetchall()
-        top_wholesalers_with_products.append({
-            'id': wholesaler_id,
-            'name': name,
-            'shop_name': shop_name,
-            'trust_score': trust_score,
-            'products': [
-                {'id': p[0], 'name': p[1], 'price': p[2], 'image_path': p[3]} for p in products
-            ]
-        })
-    conn.close()
+    cursor.execute('''
+        SELECT p.id, p.name, p.price, p.image_path, w.shop_name
+        FROM vendor_recommendations r
+        JOIN products p ON p.id = r.product_id
+        LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+        WHERE r.vendor_id = ? AND p.stock > 0
+        ORDER BY r.rank
+        LIMIT ?
+    ''', (session["vendor_id"], DASHBOARD_RECOMMENDATIONS))
+    recommendations = models.fetch_all(cursor, models.Recommendation)
     
     return render_template("vendor_dashboard.html", 
-                         recent_orders=recent_orders,
                          categories=categories,
                          vendor_name=session.get("vendor_name", "Vendor"),
-                         top_wholesalers_with_products=top_wholesalers_with_products)
+                         top_wholesalers_with_products=top_wholesalers_with_products,
+                         recommendations=recommendations)
 
 @app.route('/vendor/signup', methods=['GET', 'POST'])
 def vendor_signup():
@@ -984,7 +1055,7 @@ def vendor_signup():
         password = request.form['password']
         location = request.form['location']
         
-        conn = sqlite3.connect('vendor_clubs.db')
+        conn = get_db()
         cursor = conn.cursor()
         try:
             cursor.execute('''
@@ -994,11 +1065,9 @@ def vendor_signup():
             conn.commit()
             flash('Registration successful! Your account is pending approval.')
             return redirect(url_for('vendor_login'))
-        except sqlite3.IntegrityError:
+        except db.IntegrityError:
             flash('Email or phone number already exists.')
             return redirect(url_for('vendor_signup'))
-        finally:
-            conn.close()
     
     return render_template('vendor_signup.html')
 
@@ -1053,51 +1122,59 @@ def vendor_category(category_id):
     
     wholesaler_category = category_mapping.get(category_id, 'Produce')
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    # ?in_stock=1 hides sold-out products, read from the idx_products_category_in_stock partial index
+    in_stock = request.args.get('in_stock') == '1'
+    if in_stock:
+        listing_sql = ('''
+            SELECT p.id, p.name, p.category, p.price, p.stock, p.image_path, w.shop_name, w.location, w.trust_score,
+                   p.group_buy_eligible
+            FROM products p
+            LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+            WHERE p.category = ? AND p.status <> 'Out of Stock' AND (p.name, p.id) > (?, ?)
+            ORDER BY p.name, p.id
+            LIMIT ?
+        ''', '''
+            SELECT p.id, p.name, p.category, p.price, p.stock, p.image_path, w.shop_name, w.location, w.trust_score,
+                   p.group_buy_eligible
+            FROM products p
+            LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+            WHERE p.category = ? AND p.status <> 'Out of Stock' AND (p.name, p.id) < (?, ?)
+            ORDER BY p.name DESC, p.id DESC
+            LIMIT ?
+        ''')
+    else:
+        listing_sql = ('''
+            SELECT p.id, p.name, p.category, p.price, p.stock, p.image_path, w.shop_name, w.location, w.trust_score,
+                   p.group_buy_eligible
+            FROM products p
+            LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+            WHERE p.category = ? AND (p.name, p.id) > (?, ?)
+            ORDER BY p.name, p.id
+            LIMIT ?
+        ''', '''
+            SELECT p.id, p.name, p.category, p.price, p.stock, p.image_path, w.shop_name, w.location, w.trust_score,
+                   p.group_buy_eligible
+            FROM products p
+            LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+            WHERE p.category = ? AND (p.name, p.id) < (?, ?)
+            ORDER BY p.name DESC, p.id DESC
+            LIMIT ?
+        ''')
+    
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM products 
-        WHERE category = ? 
-        ORDER BY name
-    ''', (wholesaler_category,))
-    products = cursor.fetchall()
-    conn.close()
-    
+    page = pagination.fetch_page(cursor, *listing_sql, (wholesaler_category,), models.CatalogProduct,
+                                 key=lambda product: (product.name, product.id),
+                                 first=pagination.FIRST_ASCENDING_TEXT, limit=pagination.page_size())
+
+    if pagination.wants_json():
+        return jsonify(page.as_json(category=wholesaler_category, in_stock=in_stock))
     return render_template('category_products.html', 
-                         products=products,
+                         products=page.items,
+                         page=page,
                          category_name=wholesaler_category,
-                         category_id=category_id)
-
-# Vendor ordering routes
-@app.route('/vendor/order', methods=['POST'])
-def vendor_order():
-    if 'vendor_id' not in session:
-        return redirect(url_for('vendor_login'))
-    
-    vendor_id = session['vendor_id']
-    product_id = request.form.get('product_id')
-    quantity = request.form.get('quantity', 1)
-    
-    conn = sqlite3.connect('vendor_clubs.db')
-    cursor = conn.cursor()
-    
-    # Get product details
-    cursor.execute('SELECT * FROM products WHERE id = ?', (product_id,))
-    product = cursor.fetchone()
-    
-    if product:
-        # Create order
-        cursor.execute('''
-            INSERT INTO orders (vendor_id, product_id, quantity, status, created_at)
-            VALUES (?, ?, ?, 'pending', datetime('now'))
-        ''', (vendor_id, product_id, quantity))
-        conn.commit()
-        flash(f'Order placed successfully for {product[1]}!')
-    else:
-        flash('Product not found!')
-    
-    conn.close()
-    return redirect(request.referrer or url_for('vendor_dashboard'))
+                         category_id=category_id,
+                         in_stock=in_stock)
 
 # Demo payment route
 @app.route('/vendor/payment', methods=['GET', 'POST'])
@@ -1120,21 +1197,104 @@ def vendor_search():
     
     query = request.args.get('q', '')
     
-    conn = sqlite3.connect('vendor_clubs.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT * FROM products 
-        WHERE name LIKE ? OR category LIKE ? OR description LIKE ?
-        ORDER BY name
-    ''', (f'%{query}%', f'%{query}%', f'%{query}%'))
-    products = cursor.fetchall()
-    conn.close()
-    
+    # Full-text lookup ranked by relevance, tolerant of typos and regional
+    # names (see search.py)
+    page = search.search_products(get_db(), query, limit=pagination.page_size())
+
+    if pagination.wants_json():
+        return jsonify(page.as_json(query=query))
     return render_template('category_products.html', 
-                         products=products,
+                         products=page.items,
+                         page=page,
                          category_name=f'Search Results for "{query}"',
                          category_id='search')
 
+@app.route('/api/view-product', methods=['POST'])
+def view_product():
+    if 'vendor_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json(silent=True)
+    try:
+        product_id = int(data['product_id'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'product_id is required'}), 400
+    
+    if get_db().execute('SELECT 1 FROM products WHERE id = ?', (product_id,)).fetchone() is None:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    # Sent when a vendor opens a product card, not for every card listed;
+    # products.views catches up within counters.FLUSH_INTERVAL
+    counters.product_viewed(product_id)
+    return jsonify({'success': True})
+
+@app.route('/api/like-product', methods=['POST'])
+def like_product():
+    if 'vendor_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json()
+    try:
+        product_id = int(data['product_id'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'product_id is required'}), 400
+    
+    conn = get_db()
+    if conn.execute('SELECT 1 FROM products WHERE id = ?', (product_id,)).fetchone() is None:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    # Once per vendor; products.likes catches up within counters.FLUSH_INTERVAL
+    liked = counters.product_liked(conn, session['vendor_id'], product_id)
+    return jsonify({'success': True, 'already_liked': not liked})
+
+# Group buys: requests wait for the window to close, then pool_group_buys.py
+# turns each club's demand into one order (see groupbuy.py)
+@app.route('/api/group-buy/join', methods=['POST'])
+def join_group_buy():
+    if 'vendor_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json()
+    try:
+        product_id, quantity = int(data['product_id']), int(data['quantity'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'product_id and quantity are required'}), 400
+    if quantity < 1:
+        return jsonify({'error': 'Quantity must be at least 1'}), 400
+    
+    conn = get_db()
+    location = conn.execute('SELECT location FROM vendors WHERE id = ?', (session['vendor_id'],)).fetchone()
+    try:
+        groupbuy.join(conn, session['vendor_id'], location[0] if location else None, product_id, quantity)
+    except groupbuy.GroupBuyError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True, 'pool': groupbuy.pool_status(conn, product_id, location[0])})
+
+@app.route('/api/group-buy/cancel', methods=['POST'])
+def cancel_group_buy():
+    if 'vendor_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json()
+    try:
+        request_id = int(data['request_id'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'request_id is required'}), 400
+    
+    if not groupbuy.cancel(get_db(), session['vendor_id'], request_id):
+        return jsonify({'error': 'Only open group-buy requests can be cancelled'}), 409
+    return jsonify({'success': True})
+
+# Search-as-you-type suggestions, served from memory (see suggest.py)
+@app.route('/api/suggest')
+def api_suggest():
+    if 'vendor_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('k', suggest.DEFAULT_LIMIT, type=int), 1), suggest.MAX_LIMIT)
+    return jsonify({'query': query, 'suggestions': suggest.suggest_index.suggest(query, limit)})
+
 # Search route
 # Quick order route
 @app.route('/vendor/quick-order/<int:product_id>')
@@ -1147,41 +1307,11 @@ def vendor_quick_order(product_id):
 def vendor_cart():
     if 'vendor_id' not in session:
         return redirect(url_for('vendor_login'))
-    cart = session.get('cart', [])
-    if not cart:
-        return render_template('vendor_cart.html', cart_items=[], grouped_cart={}, total=0)
-    # Fetch product and wholesaler info for all items
-    conn = sqlite3.connect('vendor_clubs.db')
-    cursor = conn.cursor()
-    product_ids = [item['product_id'] for item in cart]
-    placeholders = ','.join('?' for _ in product_ids)
-    cursor.execute(f'SELECT p.id, p.name, p.price, p.image_path, p.wholesaler_id, w.shop_name FROM products p JOIN wholesalers w ON p.wholesaler_id = w.id WHERE p.id IN ({placeholders})', product_ids)
-    products = cursor.fetchall()
-    # Map product_id to product info
-    product_map = {str(p[0]): p for p in products}
-    # Group items by wholesaler
-    grouped_cart = {}
-    total = 0
-    for item in cart:
-        prod = product_map.get(str(item['product_id']))
-        if not prod:
-            continue
-        wid = prod[4]
-        if wid not in grouped_cart:
-            grouped_cart[wid] = {'shop_name': prod[5], 'items': [], 'subtotal': 0}
-        item_total = prod[2] * item['quantity']
-        grouped_cart[wid]['items'].append({
-            'product_id': prod[0],
-            'name': prod[1],
-            'price': prod[2],
-            'image_path': prod[3],
-            'quantity': item['quantity'],
-            'item_total': item_total
-        })
-        grouped_cart[wid]['subtotal'] += item_total
-        total += item_total
-    conn.close()
-    return render_template('vendor_cart.html', cart_items=cart, grouped_cart=grouped_cart, total=total)
+    cart.absorb_session_cart(session['vendor_id'], session)
+    # Lines and totals are kept current by cart.py, nothing to rebuild here
+    vendor_cart = cart.get_cart(session['vendor_id'])
+    return render_template('vendor_cart.html', cart_items=list(vendor_cart.lines.values()),
+                           grouped_cart=vendor_cart.grouped(), total=vendor_cart.total)
 
 # Place order route
 @app.route('/vendor/place-order', methods=['POST'])
@@ -1189,36 +1319,43 @@ def place_order():
     if 'vendor_id' not in session:
         return redirect(url_for('vendor_login'))
     
+    # Single-product order from the dashboard or a category page; priced
+    # from the products table, whatever the form says
+    back = request.referrer or url_for('vendor_dashboard')
+    product_id = request.form.get('product_id', type=int)
+    quantity = request.form.get('quantity', 1, type=int)
+    if product_id is None or quantity < 1:
+        flash('Invalid product or quantity', 'error')
+        return redirect(back)
     
-    # Get order data from form
-    product_id = request.form.get("product_id")
-    quantity = int(request.form.get("quantity", 1))
-    total_amount = float(request.form.get("total_amount", 0))
-    # Insert order into database
-    conn = sqlite3.connect('vendor_clubs.db')
-    cursor = conn.cursor()
+    try:
+        placed = checkout.place_orders(get_db(), session['vendor_id'], [(product_id, quantity)])
+    except checkout.CheckoutError as e:
+        flash(str(e) + ''.join(f": {problem['error']}" for problem in e.problems), 'error')
+        return redirect(back)
+    
+    for wholesaler_id in placed['wholesaler_ids']:
+        invalidate_dashboard_stats(wholesaler_id)
+    flash(f"Order placed successfully! Total: ₹{placed['total']}", 'success')
+    return redirect(back)
+
+@app.route('/vendor/checkout', methods=['POST'])
+def vendor_checkout():
+    if 'vendor_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
     
-    # Get wholesaler_id from product
-    cursor.execute('SELECT wholesaler_id FROM products WHERE id = ?', (product_id,))
-    result = cursor.fetchone()
-    if result:
-        wholesaler_id = result[0]
-        
-        # Insert order
-        cursor.execute('''
-            INSERT INTO orders (wholesaler_id, vendor_id, product_id, quantity, total_amount, status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (wholesaler_id, session['vendor_id'], product_id, quantity, total_amount, 'pending'))
-        
-        order_id = cursor.lastrowid
-        conn.commit()
-        
-        flash('Order placed successfully! Order ID: #' + str(order_id), 'success')
-    else:
-        flash('Product not found', 'error')
+    vendor_id = session['vendor_id']
+    cart.absorb_session_cart(vendor_id, session)
+    try:
+        placed = checkout.place_orders(get_db(), vendor_id)
+    except checkout.CheckoutError as e:
+        return jsonify({'error': str(e), 'problems': e.problems}), 409
     
-    conn.close()
-    return redirect(url_for('vendor_dashboard'))
+    cart.checked_out(vendor_id)
+    for wholesaler_id in placed['wholesaler_ids']:
+        invalidate_dashboard_stats(wholesaler_id)
+    return jsonify({'success': True, 'orders': placed['orders'], 'total': placed['total'],
+                    'redirect': url_for('vendor_orders')})
 
 # Vendor orders history
 @app.route('/vendor/orders')
@@ -1226,22 +1363,55 @@ def vendor_orders():
     if 'vendor_id' not in session:
         return redirect(url_for('vendor_login'))
     
-    # Get vendor's orders
-    conn = sqlite3.connect('vendor_clubs.db')
+    # Get vendor's orders, newest first, one keyset page at a time
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT o.*, p.name as product_name, w.name as wholesaler_name, w.phone as wholesaler_phone
+    page = pagination.fetch_page(cursor, '''
+        SELECT o.id, o.quantity, o.total_amount, o.status, o.created_at, w.shop_name, p.name as product_name
         FROM orders o 
         JOIN products p ON o.product_id = p.id 
         JOIN wholesalers w ON o.wholesaler_id = w.id 
-        WHERE o.vendor_id = ? 
-        ORDER BY o.created_at DESC
+        WHERE o.vendor_id = ? AND (o.created_at, o.id) < (?, ?)
+        ORDER BY o.created_at DESC, o.id DESC
+        LIMIT ?
+    ''', '''
+        SELECT o.id, o.quantity, o.total_amount, o.status, o.created_at, w.shop_name, p.name as product_name
+        FROM orders o 
+        JOIN products p ON o.product_id = p.id 
+        JOIN wholesalers w ON o.wholesaler_id = w.id 
+        WHERE o.vendor_id = ? AND (o.created_at, o.id) > (?, ?)
+        ORDER BY o.created_at, o.id
+        LIMIT ?
+    ''', (session['vendor_id'],), models.OrderLine, key=lambda order: (order.created_at, order.id),
+        first=pagination.FIRST_DESCENDING_TIME, limit=pagination.page_size(50))
+
+    if pagination.wants_json():
+        return jsonify(page.as_json())
+
+    cursor.execute('''
+        SELECT status, COUNT(*), COALESCE(SUM(total_amount), 0)
+        FROM orders
+        WHERE vendor_id = ?
+        GROUP BY status
+    ''', (session['vendor_id'],))
+    order_totals = summarize_order_statuses(cursor.fetchall())
+    
+    # Group buys the vendor joined; pooled ones show the consolidated order's status
+    cursor.execute('''
+        SELECT gr.id, p.name, gr.location, gr.quantity, gr.status, gr.unit_price, o.status, gr.created_at
+        FROM group_buy_requests gr
+        JOIN products p ON gr.product_id = p.id
+        LEFT JOIN group_buys g ON gr.group_buy_id = g.id
+        LEFT JOIN orders o ON g.order_id = o.id
+        WHERE gr.vendor_id = ? AND gr.status <> 'cancelled'
+        ORDER BY gr.created_at DESC
+        LIMIT 20
     ''', (session['vendor_id'],))
-    orders = cursor.fetchall()
-    conn.close()
+    group_buy_requests = models.fetch_all(cursor, models.GroupBuyRequest)
     
     # Render the orders template
-    return render_template('orders_manage.html', orders=orders)
+    return render_template('orders_manage.html', orders=page.items, page=page, order_totals=order_totals,
+                           party_label='Wholesaler', group_buy_requests=group_buy_requests)
 
 # AI Assistant route for multilingual queries
 @app.route('/vendor/ask-ai', methods=['POST'])
@@ -1306,7 +1476,7 @@ def update_vendor_profile():
     address = request.form.get('address')
     business_name = request.form.get('business_name')
     
-    conn = sqlite3.connect('vendor_clubs.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
         UPDATE vendors 
@@ -1314,7 +1484,6 @@ def update_vendor_profile():
         WHERE id = ?
     ''', (name, phone, address, vendor_id))
     conn.commit()
-    conn.close()
     
     flash('Profile updated successfully!', 'success')
     return redirect(url_for('edit_profile'))
@@ -1325,34 +1494,52 @@ def add_to_cart():
     if 'vendor_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
     
-    product_id = request.form.get('product_id')
-    quantity = int(request.form.get('quantity', 1))
+    product_id = request.form.get('product_id', type=int)
+    quantity = request.form.get('quantity', 1, type=int)
+    if product_id is None or quantity < 1:
+        return jsonify({'error': 'Invalid product or quantity'}), 400
     
-    # Fetch wholesaler_id for this product
-    conn = sqlite3.connect('vendor_clubs.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT wholesaler_id FROM products WHERE id = ?', (product_id,))
-    result = cursor.fetchone()
-    conn.close()
-    if not result:
+    cart.absorb_session_cart(session['vendor_id'], session)
+    try:
+        vendor_cart = cart.add(session['vendor_id'], product_id, quantity)
+    except inventory.OutOfStock as e:
+        return jsonify({'error': f'Only {e.available} available', 'available': e.available}), 409
+    if vendor_cart is None:
         return jsonify({'error': 'Product not found'}), 404
-    wholesaler_id = result[0]
-    
-    # Initialize cart in session if it doesn't exist
-    if 'cart' not in session:
-        session['cart'] = []
-    # Check if product already in cart
-    found = False
-    for item in session['cart']:
-        if item['product_id'] == product_id:
-            item['quantity'] += quantity
-            found = True
-            break
-    if not found:
-        session['cart'].append({'product_id': product_id, 'quantity': quantity, 'wholesaler_id': wholesaler_id})
-    session.modified = True
-    return jsonify({'success': True, 'cart_count': len(session['cart'])})
+    return jsonify({'success': True, **vendor_cart.summary()})
+
+@app.route('/api/cart/update', methods=['POST'])
+def update_cart_item():
+    if 'vendor_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json()
+    try:
+        product_id, quantity = int(data['product_id']), int(data['quantity'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'product_id and quantity are required'}), 400
+    
+    try:
+        vendor_cart = cart.set_quantity(session['vendor_id'], product_id, quantity)
+    except inventory.OutOfStock as e:
+        return jsonify({'error': f'Only {e.available} available', 'available': e.available}), 409
+    return jsonify({'success': True, **vendor_cart.summary()})
+
+@app.route('/api/cart/remove', methods=['POST'])
+def remove_cart_item():
+    if 'vendor_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json()
+    try:
+        product_id = int(data['product_id'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'product_id is required'}), 400
+    
+    vendor_cart = cart.remove(session['vendor_id'], product_id)
+    return jsonify({'success': True, **vendor_cart.summary()})
 
 if __name__ == '__main__':
-    init_db()
+    with app.app_context():
+        init_db()
     app.run(debug=True)
\ No newline at end of file
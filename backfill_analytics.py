@@ -0,0 +1,39 @@
+# backfill_analytics.py
+# Rebuild the analytics daily rollup from the orders table.
+#
+# The triggers from migration 0010 keep the rollup current; run this after
+# importing orders with triggers disabled, or to repair drift. Safe to run
+# while the app is serving: each chunk of wholesalers is swapped in its own
+# short transaction.
+#
+#   python backfill_analytics.py                 # 50 wholesalers per transaction
+#   python backfill_analytics.py --chunk 500
+
+import sys
+import time
+
+import db
+import rollup
+import schema
+
+
+def main(argv):
+    chunk_size = rollup.DEFAULT_CHUNK_SIZE
+    if '--chunk' in argv:
+        chunk_size = int(argv[argv.index('--chunk') + 1])
+
+    conn = db.connect()
+    try:
+        if not schema.is_current(conn):
+            print('Database schema is out of date, run "python migrate.py" first')
+            return 1
+        started = time.perf_counter()
+        rebuilt = rollup.backfill(conn, chunk_size=chunk_size, progress=print)
+        print(f'✅ Rebuilt analytics for {rebuilt} wholesaler(s) in {time.perf_counter() - started:.2f}s')
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
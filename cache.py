@@ -0,0 +1,64 @@
+# cache.py
+# Small in-process caches for hot, read-mostly data.
+#
+# Each gunicorn worker holds its own copy. Writes in the same worker
+# invalidate immediately; the TTL bounds how stale another worker's copy can
+# get.
+
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe key -> value cache where entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl=30.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict_expired()
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_load(self, key, loader):
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+
+
+# Per-wholesaler dashboard stats, see get_dashboard_stats in app.py
+dashboard_stats = TTLCache(ttl=30.0)
+
+# Per-vendor carts, written through by cart.py
+carts = TTLCache(ttl=60.0)
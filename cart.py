@@ -0,0 +1,221 @@
+# cart.py
+# Server-side vendor carts.
+#
+# cart_items (migration 0007) holds one row per (vendor_id, product_id), so
+# the session cookie no longer grows with the cart. Loaded carts are kept in
+# cache.carts; every change is written to the database first and then
+# applied to the cached Cart, whose per-wholesaler subtotals and total are
+# adjusted in place rather than recomputed.
+#
+# Every line holds a stock reservation for its quantity (inventory.py), so a
+# vendor cannot put more in the cart than other vendors have left them.
+
+import threading
+
+import cache
+import inventory
+from db import get_db
+
+CART_SQL = '''
+    SELECT c.product_id, c.quantity, p.name, p.price, p.image_path, p.wholesaler_id, w.shop_name
+    FROM cart_items c
+    JOIN products p ON p.id = c.product_id
+    LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+    WHERE c.vendor_id = ?
+    ORDER BY c.added_at, c.product_id
+'''
+
+PRODUCT_SQL = '''
+    SELECT p.id, p.name, p.price, p.image_path, p.wholesaler_id, w.shop_name
+    FROM products p
+    LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+    WHERE p.id = ?
+'''
+
+_lock = threading.Lock()
+
+
+class CartLine:
+    __slots__ = ('product_id', 'name', 'price', 'image_path', 'wholesaler_id', 'shop_name', 'quantity')
+
+    def __init__(self, product_id, name, price, image_path, wholesaler_id, shop_name, quantity=0):
+        self.product_id = product_id
+        self.name = name
+        self.price = price
+        self.image_path = image_path
+        self.wholesaler_id = wholesaler_id
+        self.shop_name = shop_name
+        self.quantity = quantity
+
+    @property
+    def item_total(self):
+        return self.price * self.quantity
+
+
+class Cart:
+    """A vendor's cart lines with running per-wholesaler subtotals and total."""
+
+    def __init__(self, vendor_id):
+        self.vendor_id = vendor_id
+        self.lines = {}       # product id -> CartLine, in the order added
+        self.subtotals = {}   # wholesaler id -> amount
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self.lines)
+
+    def _adjust(self, line, delta):
+        amount = line.price * delta
+        line.quantity += delta
+        self.subtotals[line.wholesaler_id] = self.subtotals.get(line.wholesaler_id, 0.0) + amount
+        self.total += amount
+        if line.quantity <= 0:
+            del self.lines[line.product_id]
+            if not any(other.wholesaler_id == line.wholesaler_id for other in self.lines.values()):
+                del self.subtotals[line.wholesaler_id]
+
+    def set_quantity(self, line, quantity):
+        self.lines.setdefault(line.product_id, line)
+        self._adjust(self.lines[line.product_id], quantity - self.lines[line.product_id].quantity)
+
+    def grouped(self):
+        """{wholesaler_id: {'shop_name', 'items', 'subtotal'}} for vendor_cart.html."""
+        groups = {}
+        with _lock:
+            lines = list(self.lines.values())
+        for line in lines:
+            group = groups.setdefault(line.wholesaler_id, {
+                'shop_name': line.shop_name,
+                'items': [],
+                'subtotal': self.subtotals[line.wholesaler_id],
+            })
+            group['items'].append(line)
+        return groups
+
+    def summary(self):
+        return {'cart_count': len(self.lines), 'total': round(self.total, 2)}
+
+
+def _load(vendor_id):
+    cursor = get_db().cursor()
+    cursor.execute(CART_SQL, (vendor_id,))
+    cart = Cart(vendor_id)
+    for product_id, quantity, name, price, image_path, wholesaler_id, shop_name in cursor.fetchall():
+        cart.set_quantity(CartLine(product_id, name, price, image_path, wholesaler_id, shop_name), quantity)
+    return cart
+
+
+def get_cart(vendor_id):
+    return cache.carts.get_or_load(vendor_id, lambda: _load(vendor_id))
+
+
+def _reserve(conn, vendor_id, product_id, quantity):
+    try:
+        inventory.reserve(conn, vendor_id, product_id, quantity)
+    except inventory.OutOfStock:
+        conn.rollback()
+        raise
+
+
+def add(vendor_id, product_id, quantity):
+    """Add quantity of a product; returns the Cart, or None if the product does not exist.
+
+    Raises inventory.OutOfStock if the line's new quantity cannot be reserved.
+    """
+    conn = get_db()
+    cart = get_cart(vendor_id)
+    line = cart.lines.get(product_id)
+    if line is None:
+        row = conn.execute(PRODUCT_SQL, (product_id,)).fetchone()
+        if row is None:
+            return None
+        line = CartLine(*row)
+    # Reserve the line's stored total, which another worker may have moved
+    # since this cart was cached; _reserve rolls the upsert back if it fails
+    total = conn.execute('''
+        INSERT INTO cart_items (vendor_id, product_id, quantity) VALUES (?, ?, ?)
+        ON CONFLICT (vendor_id, product_id) DO UPDATE SET quantity = cart_items.quantity + excluded.quantity
+        RETURNING quantity
+    ''', (vendor_id, product_id, quantity)).fetchone()[0]
+    _reserve(conn, vendor_id, product_id, total)
+    conn.commit()
+    with _lock:
+        cart.set_quantity(line, total)
+    return cart
+
+
+def set_quantity(vendor_id, product_id, quantity):
+    """Set a line's quantity, removing it at zero; returns the Cart.
+
+    Raises inventory.OutOfStock if the new quantity cannot be reserved.
+    """
+    if quantity <= 0:
+        return remove(vendor_id, product_id)
+    conn = get_db()
+    cart = get_cart(vendor_id)
+    line = cart.lines.get(product_id)
+    if line is None:
+        return cart
+    _reserve(conn, vendor_id, product_id, quantity)
+    conn.execute('UPDATE cart_items SET quantity = ? WHERE vendor_id = ? AND product_id = ?',
+                 (quantity, vendor_id, product_id))
+    conn.commit()
+    with _lock:
+        cart.set_quantity(line, quantity)
+    return cart
+
+
+def remove(vendor_id, product_id):
+    conn = get_db()
+    cart = get_cart(vendor_id)
+    conn.execute('DELETE FROM cart_items WHERE vendor_id = ? AND product_id = ?', (vendor_id, product_id))
+    inventory.release(conn, vendor_id, [product_id])
+    conn.commit()
+    line = cart.lines.get(product_id)
+    if line is not None:
+        with _lock:
+            cart.set_quantity(line, 0)
+    return cart
+
+
+def clear(vendor_id):
+    conn = get_db()
+    conn.execute('DELETE FROM cart_items WHERE vendor_id = ?', (vendor_id,))
+    inventory.release(conn, vendor_id)
+    conn.commit()
+    cache.carts.invalidate(vendor_id)
+
+
+def checked_out(vendor_id):
+    """checkout.place_orders emptied cart_items inside its own transaction."""
+    cache.carts.invalidate(vendor_id)
+
+
+def absorb_session_cart(vendor_id, session):
+    """Move a cart left in the cookie session by an older version into cart_items."""
+    for item in session.pop('cart', None) or ():
+        try:
+            add(vendor_id, int(item['product_id']), int(item['quantity']))
+        except inventory.OutOfStock:
+            continue  # sold out since it was added; nothing to carry over
+
+
+# Write hooks -------------------------------------------------------------
+
+def product_changed():
+    """A product's name, price or image changed; cached lines may be stale."""
+    cache.carts.clear()
+
+
+def product_removing(conn, product_id):
+    """A product is about to be deleted; drop it from every cart first. Does not commit.
+
+    cart_items and stock_reservations reference the product, so on
+    PostgreSQL they must go in the same transaction, before it does.
+    """
+    conn.execute('DELETE FROM cart_items WHERE product_id = ?', (product_id,))
+    inventory.product_removed(conn, product_id)
+
+
+def product_removed(product_id):
+    cache.carts.clear()
@@ -0,0 +1,225 @@
+# check_query_plans.py
+# Query-plan regression guard for the app's SQL.
+#
+# Builds a scratch copy of the schema, runs EXPLAIN QUERY PLAN over every
+# SQL string literal in the app's modules and exits non-zero if a query on a
+# hot table falls back to a full table SCAN.
+#
+# SQL built with f-strings is planned as the module constant it is assigned
+# to, rendered by importing the module; "{}" placeholder lists are planned
+# with a single "?". An f-string statement built inside a function cannot be
+# rendered, so it fails the check unless TEMPLATES lists why it need not be.
+#
+#   python check_query_plans.py            # check all app modules
+#   python check_query_plans.py -v         # also print every plan
+
+import ast
+import glob
+import importlib
+import os
+import re
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Top-level scripts and old copies of app.py that are not part of the app
+NOT_APP_MODULES = {'app_backup.py', 'app_backup_old.py', 'app_broken.py', 'check_query_plans.py', 'main.py', 'migrate.py'}
+
+HOT_TABLES = {'orders', 'products', 'reviews', 'vendors', 'analytics'}
+
+# Statements that are allowed to scan, with the reason. Matched as a prefix
+# of the whitespace-normalized SQL.
+ALLOWED_SCANS = {
+    # search.SearchIndex loads the whole catalog vocabulary once per TTL
+    'SELECT p.id, p.name, p.category, w.shop_name FROM products p LEFT JOIN wholesalers w ON w.id = p.wholesaler_id':
+        'in-memory search index rebuild',
+    # suggest.SuggestIndex likewise, with popularity
+    'SELECT p.id, p.name, p.category, p.wholesaler_id, w.shop_name, COALESCE(p.views, 0) + COALESCE(p.likes, 0) FROM products p LEFT JOIN wholesalers w ON w.id = p.wholesaler_id':
+        'in-memory suggestion index rebuild',
+}
+
+# PostgreSQL-only module constants, which cannot be planned on the scratch
+# SQLite database, with the reason. Constants keyed by dialect are planned
+# under their 'sqlite' key only.
+POSTGRES_ONLY = {
+    'search.POSTGRES_SEARCH_SQL': 'full-text search through tsvector/ts_rank',
+}
+
+# Functions that build f-string SQL, with why their statements are not planned
+TEMPLATES = {
+    'scores.apply_sql': 'trigger body over a NEW row, run by the wholesaler_scores trigger',
+    'scores.delta_sql': 'trigger body over NEW/OLD rows, run by the reviews and orders triggers',
+    'search._keyset': 'wrapper; its queries are planned as search.SQLITE_SEARCH_SQL',
+}
+
+SQL_START = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\s+\S', re.IGNORECASE)
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+# "FROM products p" plans as "SCAN p"; map aliases back to their tables
+TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(\w+)', re.IGNORECASE)
+SQL_KEYWORDS = {'on', 'where', 'join', 'left', 'inner', 'group', 'order', 'limit', 'set', 'using', 'natural', 'cross'}
+
+
+def normalize(sql):
+    return ' '.join(sql.split())
+
+
+def extract_statements(path):
+    """Return (lineno, sql) for every plain string literal that looks like SQL."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    # Pieces of f-strings are not complete statements
+    fragments = {id(part) for node in ast.walk(tree) if isinstance(node, ast.JoinedStr) for part in node.values}
+    statements = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and id(node) not in fragments:
+            if SQL_START.match(node.value):
+                statements.append((node.lineno, normalize(node.value)))
+    return sorted(statements)
+
+
+def _flatten(value, label):
+    """(label, string) for a constant that is a string or nests strings in tuples, lists or dicts."""
+    if isinstance(value, str):
+        yield label, value
+    elif isinstance(value, (tuple, list)):
+        for i, item in enumerate(value):
+            yield from _flatten(item, f'{label}[{i}]')
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if key != 'postgresql':
+                yield from _flatten(item, f'{label}[{key!r}]')
+
+
+def built_statements(path):
+    """Return ((lineno, label, sql) for module constants built with f-strings, [skipped constant names]).
+
+    The constants are read off the imported module, so they are planned
+    exactly as the app runs them.
+    """
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    module = None
+    statements, skipped = [], []
+    for node in tree.body:
+        if not isinstance(node, ast.Assign) or not any(isinstance(n, ast.JoinedStr) for n in ast.walk(node.value)):
+            continue
+        module = module or importlib.import_module(name)
+        for target in node.targets:
+            if not isinstance(target, ast.Name):
+                continue
+            if f'{name}.{target.id}' in POSTGRES_ONLY:
+                skipped.append(f'{name}.{target.id}')
+                continue
+            for label, sql in _flatten(getattr(module, target.id), target.id):
+                if SQL_START.match(sql):
+                    statements.append((node.lineno, label, normalize(sql)))
+    return statements, skipped
+
+
+def function_templates(path):
+    """Return (lineno, 'module.function') for f-string SQL built inside a function and not in TEMPLATES."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    found = []
+    for function in ast.walk(tree):
+        if not isinstance(function, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        if f'{name}.{function.name}' in TEMPLATES:
+            continue
+        for node in ast.walk(function):
+            if isinstance(node, ast.JoinedStr):
+                text = ''.join(part.value if isinstance(part, ast.Constant) else '{}' for part in node.values)
+                if SQL_START.match(text):
+                    found.append((node.lineno, f'{name}.{function.name}'))
+    return found
+
+
+def full_scans(conn, sql):
+    """Return (hot tables scanned without an index, plan details) for sql."""
+    # Templates like "WHERE id IN ({})" are filled with a placeholder list at
+    # runtime; plan them with a single one
+    sql = sql.replace('{}', '?')
+    params = [None] * sql.count('?')
+    plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+    aliases = {alias: table for table, alias in TABLE_ALIAS.findall(sql) if alias.lower() not in SQL_KEYWORDS}
+    scanned = set()
+    for detail in plan:
+        match = FULL_SCAN.match(detail)
+        table = match and aliases.get(match.group(1), match.group(1))
+        if table in HOT_TABLES:
+            scanned.add(table)
+    return scanned, plan
+
+
+def app_modules():
+    return sorted(path for path in glob.glob(os.path.join(ROOT, '*.py'))
+                  if os.path.basename(path) not in NOT_APP_MODULES)
+
+
+def main(argv):
+    verbose = '-v' in argv
+
+    # Build the schema in a scratch database through the app's own init_db
+    scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    scratch.close()
+    os.environ['DATABASE_PATH'] = scratch.name
+    os.environ.setdefault('DB_CHECKPOINT_INTERVAL', '0')
+    import app as app_module
+    from db import get_db
+
+    failures = []
+    unplanned = []
+    skipped = []
+    checked = 0
+    try:
+        with app_module.app.app_context():
+            app_module.init_db()
+            conn = get_db()
+            for source in app_modules():
+                filename = os.path.basename(source)
+                built, postgres_only = built_statements(source)
+                skipped += postgres_only
+                unplanned += [(filename, lineno, function) for lineno, function in function_templates(source)]
+                statements = [(lineno, '', sql) for lineno, sql in extract_statements(source)] + built
+                for lineno, label, sql in sorted(statements):
+                    scanned, plan = full_scans(conn, sql)
+                    checked += 1
+                    where = f'{filename}:{lineno}' + (f' ({label})' if label else '')
+                    if verbose:
+                        print(f'{where}: {sql}')
+                        for detail in plan:
+                            print(f'    {detail}')
+                    if scanned and not any(sql.startswith(allowed) for allowed in ALLOWED_SCANS):
+                        failures.append((where, sql, scanned, plan))
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(scratch.name + suffix):
+                os.remove(scratch.name + suffix)
+
+    for where, sql, scanned, plan in failures:
+        print(f'❌ {where}: full SCAN of {", ".join(sorted(scanned))}')
+        print(f'    {sql}')
+        for detail in plan:
+            print(f'    {detail}')
+    for filename, lineno, function in unplanned:
+        print(f'❌ {filename}:{lineno}: {function}() builds SQL with an f-string; '
+              f'make it a module constant (with {{}} for placeholder lists) so it can be planned')
+
+    for name in skipped:
+        print(f'   not planned: {name} ({POSTGRES_ONLY[name]})')
+    for function, reason in TEMPLATES.items():
+        print(f'   not planned: {function}() ({reason})')
+
+    if failures or unplanned:
+        print(f'{len(failures)} of {checked} statements regressed to a full table scan, '
+              f'{len(unplanned)} f-string statements cannot be planned')
+        return 1
+    print(f'✅ {checked} statements checked, no full scans on {", ".join(sorted(HOT_TABLES))}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
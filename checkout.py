@@ -0,0 +1,98 @@
+# checkout.py
+# Turns a vendor's cart into orders in one transaction.
+#
+# Prices and wholesalers come from the products table, never from the
+# client. The whole checkout (reading the cart, checking stock, decrementing
+# it, inserting one order per line and emptying the cart) runs under a single
+# BEGIN IMMEDIATE, so it either happens completely or not at all, and costs
+# the same handful of statements whatever the cart size: the per-line stock
+# updates and order inserts go through executemany.
+#
+# A vendor can buy what is in stock minus other vendors' live reservations
+# (see inventory.py); the stock decrement itself is conditional, so even a
+# backend that lets two checkouts interleave cannot sell below zero.
+
+import inventory
+
+CART_LINES_SQL = 'SELECT product_id, quantity FROM cart_items WHERE vendor_id = ? ORDER BY added_at, product_id'
+
+PRODUCTS_SQL = f'''
+    SELECT p.id, p.name, p.price, p.stock - {inventory.HELD_BY_OTHERS}, p.wholesaler_id
+    FROM products p
+    WHERE p.id IN ({{}})
+'''
+
+INSERT_ORDER_SQL = '''
+    INSERT INTO orders (wholesaler_id, vendor_id, product_id, quantity, total_amount, status)
+    VALUES (?, ?, ?, ?, ?, 'pending')
+'''
+
+
+class CheckoutError(Exception):
+    """The checkout was rolled back; problems lists what the vendor must fix."""
+
+    def __init__(self, message, problems=()):
+        super().__init__(message)
+        self.problems = list(problems)
+
+
+def _products(cursor, vendor_id, product_ids):
+    cursor.execute(PRODUCTS_SQL.format(', '.join('?' * len(product_ids))),
+                   (vendor_id, inventory.now(), *product_ids))
+    return {row[0]: row for row in cursor.fetchall()}
+
+
+def place_orders(conn, vendor_id, lines=None):
+    """Create one pending order per line and return a summary dict.
+
+    lines is a list of (product_id, quantity); None checks out the vendor's
+    cart_items and empties it. Raises CheckoutError, with nothing written,
+    if a product is gone or short of stock.
+    """
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        from_cart = lines is None
+        if from_cart:
+            cursor.execute(CART_LINES_SQL, (vendor_id,))
+            lines = cursor.fetchall()
+        if not lines:
+            raise CheckoutError('Your cart is empty')
+
+        products = _products(cursor, vendor_id, sorted({product_id for product_id, _ in lines}))
+        problems = []
+        orders = []
+        for product_id, quantity in lines:
+            product = products.get(product_id)
+            if product is None:
+                problems.append({'product_id': product_id, 'error': 'no longer available'})
+                continue
+            _, name, price, available, wholesaler_id = product
+            available = max(available or 0, 0)
+            if quantity > available:
+                problems.append({'product_id': product_id, 'name': name,
+                                 'error': f'only {available} available', 'available': available})
+                continue
+            orders.append((wholesaler_id, vendor_id, product_id, quantity, round(price * quantity, 2)))
+        if problems:
+            raise CheckoutError('Some items could not be ordered', problems)
+
+        try:
+            inventory.decrement(cursor, [(product_id, quantity) for _, _, product_id, quantity, _ in orders])
+        except inventory.StockConflict:
+            raise CheckoutError('Stock changed while you were checking out, please try again')
+        cursor.executemany(INSERT_ORDER_SQL, orders)
+        # A direct order leaves the cart, and the stock its lines hold, as it was
+        if from_cart:
+            cursor.execute('DELETE FROM cart_items WHERE vendor_id = ?', (vendor_id,))
+            inventory.release(cursor, vendor_id)
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+
+    return {
+        'orders': len(orders),
+        'total': round(sum(order[4] for order in orders), 2),
+        'wholesaler_ids': sorted({order[0] for order in orders}),
+    }
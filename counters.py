@@ -0,0 +1,196 @@
+# counters.py
+# Write-behind buffer for products.views and products.likes.
+#
+# Counting a view must not put a write on the page that shows the product:
+# every UPDATE would queue behind SQLite's single writer. Increments are
+# added up in memory instead and flushed as one executemany transaction
+# every FLUSH_INTERVAL seconds by a background thread, and once more when
+# the worker exits. A crash loses at most one interval of counts, which is
+# fine for popularity ranking.
+#
+# A flush that wrote views also re-ranks this worker's storefront snapshot
+# (storefront.views_flushed), so the landing page follows the counts.
+#
+# Likes are deduplicated first: product_likes (migration 0017) holds one row
+# per vendor and product, written straight away, and only a new row adds to
+# the buffered count.
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+import storefront
+from db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5.0
+
+FIELDS = ('views', 'likes')
+
+FLUSH_SQL = 'UPDATE products SET views = COALESCE(views, 0) + ?, likes = COALESCE(likes, 0) + ? WHERE id = ?'
+
+LIKE_SQL = '''
+    INSERT INTO product_likes (vendor_id, product_id) VALUES (?, ?)
+    ON CONFLICT (vendor_id, product_id) DO NOTHING
+'''
+
+
+class CounterBuffer:
+    """Per-worker product view/like increments waiting to be written."""
+
+    def __init__(self, interval=FLUSH_INTERVAL):
+        self.interval = interval
+        self._pending = defaultdict(lambda: [0, 0])   # product id -> [views, likes]
+        self._oldest = None                           # monotonic time of the oldest unflushed increment
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._pool = None
+        # Reported by stats()
+        self.flushes = 0
+        self.flushed_increments = 0
+        self.failures = 0
+        self.last_flush_at = None
+        self.last_flush_seconds = None
+        self.last_flush_rows = 0
+
+    def increment(self, product_id, field, amount=1):
+        with self._lock:
+            self._pending[product_id][FIELDS.index(field)] += amount
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def flush(self):
+        """Write everything pending in one transaction; returns the number of products updated."""
+        if self._pool is None:
+            return 0  # not started in this process yet; keep buffering
+        with self._flush_lock:
+            if not self._pending:
+                return 0
+            started = time.perf_counter()
+            conn = self._pool.acquire()
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(lambda: [0, 0])
+                oldest, self._oldest = self._oldest, None
+            rows = [(views, likes, product_id) for product_id, (views, likes) in pending.items()]
+            try:
+                conn.executemany(FLUSH_SQL, rows)
+                conn.commit()
+            except DatabaseError:
+                conn.rollback()
+                self.failures += 1
+                # Put the counts back so the next flush retries them
+                with self._lock:
+                    for product_id, (views, likes) in pending.items():
+                        counts = self._pending[product_id]
+                        counts[0] += views
+                        counts[1] += likes
+                    if oldest is not None and (self._oldest is None or oldest < self._oldest):
+                        self._oldest = oldest
+                raise
+            else:
+                if any(views for views, _, _ in rows):
+                    try:
+                        storefront.views_flushed(conn)
+                    except DatabaseError:
+                        # The counts are written; the snapshot catches up at its TTL
+                        logger.exception('Storefront refresh after counter flush failed')
+            finally:
+                self._pool.release(conn)
+
+            self.flushes += 1
+            self.flushed_increments += sum(views + likes for views, likes, _ in rows)
+            self.last_flush_at = time.time()
+            self.last_flush_seconds = time.perf_counter() - started
+            self.last_flush_rows = len(rows)
+            return len(rows)
+
+    def stats(self):
+        with self._lock:
+            pending_products = len(self._pending)
+            pending_increments = sum(views + likes for views, likes in self._pending.values())
+            lag = time.monotonic() - self._oldest if self._oldest is not None else 0.0
+        return {
+            'flush_interval_seconds': self.interval,
+            'pending_products': pending_products,
+            'pending_increments': pending_increments,
+            # How long the oldest unwritten increment has been waiting
+            'flush_lag_seconds': round(lag, 3),
+            'flushes': self.flushes,
+            'flushed_increments': self.flushed_increments,
+            'failures': self.failures,
+            'last_flush_at': self.last_flush_at,
+            'last_flush_ms': round(self.last_flush_seconds * 1000, 2) if self.last_flush_seconds is not None else None,
+            'last_flush_products': self.last_flush_rows,
+            'worker_pid': os.getpid(),
+        }
+
+    def start(self, pool):
+        """Start the flush thread in this process (once) against a db.ConnectionPool."""
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Counts inherited across a fork belong to the parent
+                self._pending = defaultdict(lambda: [0, 0])
+                self._oldest = None
+                atexit.register(self._flush_at_exit)
+            self._pid = os.getpid()
+        self._pool = pool
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='counter-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                # Counts stay buffered; the next interval retries
+                logger.exception('Counter flush failed')
+
+    def _flush_at_exit(self):
+        if self._pid != os.getpid():
+            return
+        self.stop()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Final counter flush failed')
+
+
+product_counters = CounterBuffer()
+
+
+# Hooks -------------------------------------------------------------------
+
+def product_viewed(product_id):
+    """A vendor opened the product; listing impressions are not views."""
+    product_counters.increment(product_id, 'views')
+
+
+def product_liked(conn, vendor_id, product_id):
+    """Record the vendor's like of an existing product. Commits.
+
+    Returns False, counting nothing, if the vendor already liked it.
+    """
+    cursor = conn.execute(LIKE_SQL, (vendor_id, product_id))
+    conn.commit()
+    if cursor.rowcount == 0:
+        return False
+    product_counters.increment(product_id, 'likes')
+    return True
+
+
+def product_removing(conn, product_id):
+    """A product is about to be deleted; product_likes references it. Does not commit."""
+    conn.execute('DELETE FROM product_likes WHERE product_id = ?', (product_id,))
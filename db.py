@@ -0,0 +1,425 @@
+# db.py
+# Shared database connection management for the Flask app.
+#
+# Every request borrows one connection from a bounded per-worker pool and
+# hands it back in teardown, so routes no longer pay the open/parse/schema
+# load cost of connecting on every hit.
+#
+# SQLite (the default) and PostgreSQL are interchangeable backends: set
+# DATABASE_URL=postgresql://... to switch. App code keeps writing portable
+# SQL with "?" placeholders and checks conn.dialect for the few places that
+# genuinely differ.
+
+import functools
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+
+from flask import current_app, g
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+except ImportError:
+    # Only needed when DATABASE_URL points at PostgreSQL
+    psycopg2 = None
+
+logger = logging.getLogger(__name__)
+
+DATABASE = 'vendor_clubs.db'
+
+# Exceptions to catch regardless of backend
+if psycopg2 is not None:
+    DatabaseError = (sqlite3.DatabaseError, psycopg2.DatabaseError)
+    IntegrityError = (sqlite3.IntegrityError, psycopg2.IntegrityError)
+else:
+    DatabaseError = (sqlite3.DatabaseError,)
+    IntegrityError = (sqlite3.IntegrityError,)
+
+# Storage profiles, picked at startup with DB_PROFILE. WAL lets dashboard
+# readers keep going while place_order/update_stock hold the write lock;
+# busy_timeout (ms) makes a blocked writer wait instead of failing with
+# "database is locked".
+STORAGE_PROFILES = {
+    'development': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -8000,  # negative = KiB, i.e. ~8MB page cache per connection
+        'temp_store': 'MEMORY',
+        'mmap_size': 0,
+    },
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 15000,
+        'cache_size': -64000,
+        'temp_store': 'MEMORY',
+        'mmap_size': 256 * 1024 * 1024,
+        'wal_autocheckpoint': 1000,
+        'journal_size_limit': 64 * 1024 * 1024,
+    },
+    # For filesystems where WAL's shared memory is unavailable (NFS etc.)
+    'compat': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 15000,
+        'cache_size': -8000,
+        'temp_store': 'MEMORY',
+    },
+}
+
+# PRAGMAs stored in the database file itself; set once at startup rather
+# than on every pooled connection
+DATABASE_PRAGMAS = ('journal_mode',)
+
+
+class SQLiteConnection(sqlite3.Connection):
+    dialect = 'sqlite'
+
+
+def _sqlite_connect(database, timeout, pragmas):
+    # check_same_thread=False: a connection may be handed to another
+    # thread once it is back in the pool, never used by two at once
+    conn = sqlite3.connect(database, timeout=timeout, check_same_thread=False, factory=SQLiteConnection)
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+# Column types that differ between the SQLite DDL in migrations/ and
+# PostgreSQL. BOOLEAN columns stay integers because the app compares them
+# with 0/1.
+_PG_DDL_TYPES = [
+    (re.compile(r'INTEGER PRIMARY KEY AUTOINCREMENT', re.I), 'SERIAL PRIMARY KEY'),
+    (re.compile(r'\bDATETIME\b', re.I), 'TIMESTAMP'),
+    (re.compile(r'\bBOOLEAN DEFAULT FALSE\b', re.I), 'INTEGER DEFAULT 0'),
+    (re.compile(r'\bBOOLEAN DEFAULT TRUE\b', re.I), 'INTEGER DEFAULT 1'),
+    (re.compile(r'\bREAL\b', re.I), 'DOUBLE PRECISION'),
+]
+
+
+@functools.lru_cache(maxsize=1024)
+def _pg_sql(sql):
+    """Translate portable SQL ("?" placeholders, SQLite DDL) for psycopg2."""
+    if sql.lstrip().upper().startswith(('CREATE TABLE', 'ALTER TABLE')):
+        for pattern, replacement in _PG_DDL_TYPES:
+            sql = pattern.sub(replacement, sql)
+    return sql.replace('%', '%%').replace('?', '%s')
+
+
+class PostgresCursor:
+    """psycopg2 cursor that accepts the same SQL as sqlite3."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection.raw.cursor()
+
+    def execute(self, sql, params=()):
+        # psycopg2 opens transactions implicitly; map explicit control
+        # statements onto the connection
+        statement = sql.strip().upper()
+        if statement in ('BEGIN', 'BEGIN IMMEDIATE'):
+            return self
+        if statement == 'COMMIT':
+            self.connection.commit()
+            return self
+        if statement == 'ROLLBACK':
+            self.connection.rollback()
+            return self
+        self._cursor.execute(_pg_sql(sql), tuple(params))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(_pg_sql(sql), [tuple(params) for params in seq_of_params])
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+
+class PostgresConnection:
+    """Wraps a psycopg2 connection in the subset of the sqlite3 API the app uses."""
+
+    dialect = 'postgresql'
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self):
+        return PostgresCursor(self)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+    @property
+    def in_transaction(self):
+        return self.raw.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+def _postgres_connect(dsn):
+    if psycopg2 is None:
+        raise RuntimeError('DATABASE_URL points at PostgreSQL but psycopg2 is not installed')
+    raw = psycopg2.connect(dsn)
+    # Hand DATE/TIMESTAMP values back as text, the way sqlite3 does, so
+    # templates slicing created_at[:10] behave the same on both backends
+    psycopg2.extensions.register_type(
+        psycopg2.extensions.new_type((1082, 1114, 1184), 'TEXT_DATES', lambda value, cursor: value), raw)
+    return PostgresConnection(raw)
+
+
+def is_postgres_url(url):
+    return bool(url) and url.startswith(('postgres://', 'postgresql://'))
+
+
+def connect(database=None):
+    """Open a standalone connection for scripts (migrate.py etc.)."""
+    database = database or os.getenv('DATABASE_URL') or os.getenv('DATABASE_PATH', DATABASE)
+    if is_postgres_url(database):
+        return _postgres_connect(database)
+    return _sqlite_connect(database, 30, {'busy_timeout': 30000})
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within the pool timeout."""
+
+
+class ConnectionPool:
+    """Bounded pool of connections shared by one worker's threads.
+
+    `connect` is a zero-argument factory returning a new SQLiteConnection
+    or PostgresConnection.
+    """
+
+    def __init__(self, connect, max_size=8, timeout=10.0):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        # Connections must not cross a fork (gunicorn --preload), start fresh
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue()
+                    self._size = 0
+                    self._pid = os.getpid()
+
+    def acquire(self):
+        self._check_fork()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._size < self.max_size
+            if can_open:
+                self._size += 1
+
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(f'No database connection available after {self.timeout}s')
+
+    def release(self, conn):
+        if self._pid != os.getpid():
+            return
+        try:
+            # Never hand a half-finished transaction to the next request
+            if conn.in_transaction:
+                conn.rollback()
+        except DatabaseError:
+            self.discard(conn)
+            return
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        try:
+            conn.close()
+        except DatabaseError:
+            pass
+        with self._lock:
+            self._size -= 1
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+
+def get_pool(app=None):
+    app = app or current_app
+    return app.extensions['db_pool']
+
+
+def get_db():
+    """Return the connection bound to the current app context."""
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def close_db(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+
+class WalCheckpointer:
+    """Background thread that keeps the WAL file from growing unbounded.
+
+    A PASSIVE checkpoint runs every `interval` seconds and never blocks
+    readers or writers; once the -wal file passes `max_wal_bytes` a
+    TRUNCATE checkpoint resets it to zero length.
+    """
+
+    def __init__(self, database, interval=60.0, max_wal_bytes=64 * 1024 * 1024, busy_timeout=15000):
+        self.database = database
+        self.interval = interval
+        self.max_wal_bytes = max_wal_bytes
+        self.busy_timeout = busy_timeout
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='wal-checkpointer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def checkpoint(self, conn):
+        wal_path = self.database + '-wal'
+        wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        mode = 'TRUNCATE' if wal_size > self.max_wal_bytes else 'PASSIVE'
+        busy, log_frames, checkpointed = conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+        return {'mode': mode, 'busy': busy, 'log_frames': log_frames,
+                'checkpointed': checkpointed, 'wal_bytes': wal_size}
+
+    def _run(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    self.checkpoint(conn)
+                except sqlite3.Error:
+                    logger.exception('WAL checkpoint failed')
+        finally:
+            conn.close()
+
+
+def configure_storage(database, pragmas):
+    """Apply the database-level PRAGMAs (journal mode) once at startup."""
+    conn = sqlite3.connect(database, timeout=pragmas.get('busy_timeout', 5000) / 1000)
+    try:
+        for name in DATABASE_PRAGMAS:
+            if name in pragmas:
+                conn.execute(f'PRAGMA {name} = {pragmas[name]}')
+    finally:
+        conn.close()
+
+
+def _start_checkpointer():
+    checkpointer = current_app.extensions.get('db_checkpointer')
+    if checkpointer is not None:
+        checkpointer.start()
+
+
+def init_app(app):
+    app.config.setdefault('DATABASE_URL', os.getenv('DATABASE_URL'))
+    app.config.setdefault('DATABASE', os.getenv('DATABASE_PATH', DATABASE))
+    app.config.setdefault('DB_PROFILE', os.getenv('DB_PROFILE', 'production'))
+    app.config.setdefault('DB_POOL_SIZE', int(os.getenv('DB_POOL_SIZE', 8)))
+    app.config.setdefault('DB_POOL_TIMEOUT', float(os.getenv('DB_POOL_TIMEOUT', 15)))
+    app.config.setdefault('DB_CHECKPOINT_INTERVAL', float(os.getenv('DB_CHECKPOINT_INTERVAL', 60)))
+    app.teardown_appcontext(close_db)
+
+    dsn = app.config['DATABASE_URL']
+    if is_postgres_url(dsn):
+        app.extensions['db_pool'] = ConnectionPool(
+            functools.partial(_postgres_connect, dsn),
+            max_size=app.config['DB_POOL_SIZE'],
+            timeout=app.config['DB_POOL_TIMEOUT'],
+        )
+        return
+
+    profile = app.config['DB_PROFILE']
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f'Unknown DB_PROFILE {profile!r}, expected one of {sorted(STORAGE_PROFILES)}')
+    # DB_PRAGMAS in app.config overrides individual profile settings
+    pragmas = {**STORAGE_PROFILES[profile], **app.config.get('DB_PRAGMAS', {})}
+    app.config['DB_PRAGMAS'] = pragmas
+    busy_timeout = pragmas.get('busy_timeout', 5000)
+
+    configure_storage(app.config['DATABASE'], pragmas)
+
+    connection_pragmas = {name: value for name, value in pragmas.items() if name not in DATABASE_PRAGMAS}
+    app.extensions['db_pool'] = ConnectionPool(
+        functools.partial(_sqlite_connect, app.config['DATABASE'], busy_timeout / 1000, connection_pragmas),
+        max_size=app.config['DB_POOL_SIZE'],
+        timeout=app.config['DB_POOL_TIMEOUT'],
+    )
+
+    if str(pragmas.get('journal_mode', '')).upper() == 'WAL' and app.config['DB_CHECKPOINT_INTERVAL'] > 0:
+        app.extensions['db_checkpointer'] = WalCheckpointer(
+            app.config['DATABASE'],
+            interval=app.config['DB_CHECKPOINT_INTERVAL'],
+            max_wal_bytes=pragmas.get('journal_size_limit', 64 * 1024 * 1024),
+            busy_timeout=busy_timeout,
+        )
+        # Started lazily so the thread lives in the worker, not a pre-fork master
+        app.before_request(_start_checkpointer)
@@ -0,0 +1,168 @@
+# dispatch.py
+# Delivery runs for a wholesaler's open orders.
+#
+# Pending and processing orders are grouped into stops, one per vendor (or
+# group-buy club), placed at their locality (LOCALITIES). Every run leaves
+# from and returns to the wholesaler's locality carrying at most `capacity`
+# units: nearest neighbour fills the runs one after another, then 2-opt
+# untangles each run. Distances are great-circle kilometres times
+# ROAD_FACTOR, which is enough to order stops between localities; stops in
+# the same locality are zero apart and end up next to each other.
+
+import numpy as np
+
+VEHICLE_CAPACITY = 500   # units per run
+ROAD_FACTOR = 1.3
+EARTH_RADIUS_KM = 6371.0
+
+# Approximate centres (lat, lon) of the localities vendors and wholesalers use
+LOCALITIES = {
+    'andheri': (19.1136, 72.8697),
+    'bandra': (19.0596, 72.8295),
+    'bhandup': (19.1439, 72.9371),
+    'borivali': (19.2307, 72.8567),
+    'byculla': (18.9793, 72.8336),
+    'chembur': (19.0522, 72.9005),
+    'churchgate': (18.9322, 72.8264),
+    'colaba': (18.9067, 72.8147),
+    'dadar': (19.0178, 72.8478),
+    'dahisar': (19.2494, 72.8593),
+    'ghatkopar': (19.0856, 72.9081),
+    'goregaon': (19.1663, 72.8526),
+    'jogeshwari': (19.1364, 72.8490),
+    'juhu': (19.1075, 72.8263),
+    'kandivali': (19.2047, 72.8526),
+    'kurla': (19.0726, 72.8845),
+    'mahim': (19.0380, 72.8400),
+    'malad': (19.1874, 72.8484),
+    'matunga': (19.0271, 72.8553),
+    'mulund': (19.1726, 72.9565),
+    'powai': (19.1176, 72.9060),
+    'santacruz': (19.0843, 72.8360),
+    'sion': (19.0390, 72.8619),
+    'thane': (19.2183, 72.9781),
+    'vashi': (19.0771, 72.9986),
+    'vikhroli': (19.1110, 72.9270),
+    'vile parle': (19.0990, 72.8440),
+    'worli': (19.0176, 72.8162),
+}
+
+OPEN_ORDERS_SQL = '''
+    SELECT o.id, o.quantity, o.status, o.vendor_id, o.group_buy_id,
+           COALESCE(v.name, 'Group buy: ' || g.location), COALESCE(v.location, g.location), p.name
+    FROM orders o
+    LEFT JOIN vendors v ON v.id = o.vendor_id
+    LEFT JOIN group_buys g ON g.id = o.group_buy_id
+    LEFT JOIN products p ON p.id = o.product_id
+    WHERE o.wholesaler_id = ? AND o.status IN ('pending', 'processing')
+'''
+
+
+def locate(location):
+    """(lat, lon) of a free-text locality, or None if it is not one we know."""
+    return LOCALITIES.get(' '.join((location or '').split()).lower())
+
+
+def distance_matrix(points):
+    """Road-distance estimate in km between every pair of (lat, lon) points."""
+    lat, lon = np.radians(np.asarray(points, dtype=float)).T
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1))) * ROAD_FACTOR
+
+
+def nearest_neighbour_runs(dist, demand, capacity):
+    """Split stops 1..n (0 is the depot) into runs of at most capacity units, each in visiting order.
+
+    A stop bigger than a whole vehicle gets a run of its own.
+    """
+    unvisited = np.ones(len(demand), dtype=bool)
+    unvisited[0] = False
+    runs = []
+    while unvisited.any():
+        run, load, here = [], 0, 0
+        while True:
+            fits = unvisited & (demand <= capacity - load)
+            if not fits.any():
+                break
+            here = int(np.argmin(np.where(fits, dist[here], np.inf)))
+            run.append(here)
+            load += demand[here]
+            unvisited[here] = False
+        if not run:
+            here = int(np.argmin(np.where(unvisited, dist[0], np.inf)))
+            run.append(here)
+            unvisited[here] = False
+        runs.append(run)
+    return runs
+
+
+def two_opt(run, dist, max_passes=1000):
+    """Improve a depot -> run -> depot tour by reversing segments while that shortens it.
+
+    Each pass scores every pair of edges at once and applies the best move.
+    """
+    tour = np.array([0] + run + [0])
+    for _ in range(max_passes):
+        a, b = tour[:-1], tour[1:]
+        edges = dist[a, b]
+        # Replacing edges (a_i, b_i) and (a_j, b_j) with (a_i, a_j) and (b_i, b_j)
+        delta = dist[np.ix_(a, a)] + dist[np.ix_(b, b)] - edges[:, None] - edges[None, :]
+        delta = np.triu(delta, k=2)
+        i, j = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[i, j] >= -1e-9:
+            break
+        tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+    return tour[1:-1].tolist()
+
+
+def tour_length(run, dist):
+    tour = [0] + run + [0]
+    return float(dist[tour[:-1], tour[1:]].sum())
+
+
+def _stops(rows):
+    """Group open order rows into stops, in first-order order."""
+    stops = {}
+    for order_id, quantity, status, vendor_id, group_buy_id, name, location, product_name in sorted(rows):
+        key = ('vendor', vendor_id) if vendor_id is not None else ('group_buy', group_buy_id)
+        stop = stops.setdefault(key, {'name': name, 'location': location, 'units': 0, 'orders': []})
+        stop['units'] += quantity or 0
+        stop['orders'].append({'id': order_id, 'product': product_name, 'quantity': quantity, 'status': status})
+    return list(stops.values())
+
+
+def plan(cursor, wholesaler_id, depot_location, capacity=VEHICLE_CAPACITY):
+    """Delivery runs for the wholesaler's open orders.
+
+    Returns {'runs': [{'stops', 'units', 'distance_km'}], 'unlocated': [stops],
+    'distance_km'}; stops whose locality is unknown cannot be routed and are
+    listed separately.
+    """
+    cursor.execute(OPEN_ORDERS_SQL, (wholesaler_id,))
+    stops = _stops(cursor.fetchall())
+    located = [stop for stop in stops if locate(stop['location'])]
+    unlocated = [stop for stop in stops if not locate(stop['location'])]
+    if not located:
+        return {'runs': [], 'unlocated': unlocated, 'distance_km': 0.0, 'capacity': capacity}
+
+    points = [locate(stop['location']) for stop in located]
+    depot = locate(depot_location) or tuple(np.mean(points, axis=0))
+    dist = distance_matrix([depot] + points)
+    demand = np.array([0] + [stop['units'] for stop in located])
+
+    runs = []
+    for run in nearest_neighbour_runs(dist, demand, capacity):
+        run = two_opt(run, dist)
+        runs.append({
+            'stops': [located[i - 1] for i in run],
+            'units': int(demand[run].sum()),
+            'distance_km': round(tour_length(run, dist), 1),
+        })
+    return {
+        'runs': runs,
+        'unlocated': unlocated,
+        'distance_km': round(sum(run['distance_km'] for run in runs), 1),
+        'capacity': capacity,
+    }
@@ -0,0 +1,167 @@
+# forecast.py
+# Next-week demand forecasts per product, from the analytics_products rollup.
+#
+# Two forecasters run side by side on each product's daily quantities:
+# simple exponential smoothing (a flat daily level) and seasonal naive (next
+# week repeats last week). Each keeps a smoothed one-day-ahead absolute
+# error, and a product's forecast comes from whichever has been more
+# accurate for it lately.
+#
+# The run is incremental: forecasts stores each product's smoothed level and
+# errors together with the last day folded into them, so a run only reads
+# the rollup rows since then (plus one week for seasonal naive) and folds in
+# the new days. All products of a wholesaler are folded together as NumPy
+# vectors, one step per day. Only complete (UTC) days are used; days already
+# folded in are not revisited if their orders change later.
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+HORIZON_DAYS = 7
+SEASON_DAYS = 7
+# Days of history a product without a forecast yet starts from
+HISTORY_DAYS = 56
+# Smoothing of the demand level and of the forecasters' errors
+LEVEL_ALPHA = 0.3
+ERROR_BETA = 0.1
+
+SES = 'ses'
+SEASONAL_NAIVE = 'seasonal_naive'
+
+QUANTITIES_SQL = '''
+    SELECT date, product_id, quantity
+    FROM analytics_products
+    WHERE wholesaler_id = ? AND date >= ? AND date <= ?
+'''
+
+STATE_SQL = 'SELECT product_id, through_date, level, ses_error, naive_error FROM forecasts WHERE wholesaler_id = ?'
+
+SAVE_SQL = '''
+    INSERT INTO forecasts (product_id, wholesaler_id, through_date, level, ses_error, naive_error, method, quantity, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (product_id) DO UPDATE SET
+        wholesaler_id = excluded.wholesaler_id, through_date = excluded.through_date, level = excluded.level,
+        ses_error = excluded.ses_error, naive_error = excluded.naive_error, method = excluded.method,
+        quantity = excluded.quantity, updated_at = excluded.updated_at
+'''
+
+
+def _day(value):
+    return np.datetime64(str(value), 'D')
+
+
+def _quantity_matrix(cursor, wholesaler_id, product_ids, start, days):
+    """products x days matrix of units ordered, from the rollup rows of [start, start + days)."""
+    end = start + np.timedelta64(days - 1, 'D')
+    cursor.execute(QUANTITIES_SQL, (wholesaler_id, str(start), str(end)))
+    rows = cursor.fetchall()
+    matrix = np.zeros((len(product_ids), days))
+    if not rows or not len(product_ids):
+        return matrix
+    dates, ids, quantities = zip(*rows)
+    ids = np.array(ids, dtype=np.int64)
+    position = np.minimum(np.searchsorted(product_ids, ids), len(product_ids) - 1)
+    known = product_ids[position] == ids  # drops rows of products no longer in the catalog
+    day = (np.array([str(date) for date in dates], dtype='datetime64[D]') - start).astype(np.int64)
+    np.add.at(matrix, (position[known], day[known]), np.array(quantities, dtype=float)[known])
+    return matrix
+
+
+def fold(quantities, through, level, ses_error, naive_error):
+    """Fold the days after each product's `through` index into its state.
+
+    quantities is products x days; through is the index of the last day
+    already folded in per product (at least SEASON_DAYS - 1). Returns the
+    updated (level, ses_error, naive_error).
+    """
+    level, ses_error, naive_error = level.copy(), ses_error.copy(), naive_error.copy()
+    for t in range(int(through.min()) + 1, quantities.shape[1]):
+        active = through < t
+        actual = quantities[:, t]
+        ses_error = np.where(active, (1 - ERROR_BETA) * ses_error + ERROR_BETA * np.abs(actual - level), ses_error)
+        naive_error = np.where(active, (1 - ERROR_BETA) * naive_error
+                               + ERROR_BETA * np.abs(actual - quantities[:, t - SEASON_DAYS]), naive_error)
+        level = np.where(active, LEVEL_ALPHA * actual + (1 - LEVEL_ALPHA) * level, level)
+    return level, ses_error, naive_error
+
+
+def forecast_wholesaler(cursor, wholesaler_id, yesterday, product_ids):
+    """Rows for SAVE_SQL forecasting product_ids (sorted) through yesterday, or [] if all are current."""
+    yesterday = _day(yesterday)
+    oldest_start = yesterday - np.timedelta64(HISTORY_DAYS - 1, 'D')
+
+    cursor.execute(STATE_SQL, (wholesaler_id,))
+    state = {row[0]: row[1:] for row in cursor.fetchall()}
+    current = [product_id for product_id in product_ids
+               if product_id in state and _day(state[product_id][0]) >= yesterday]
+    if len(current) == len(product_ids):
+        return []
+
+    # Products without usable state start from the first week of history
+    seeded = np.array([product_id in state and _day(state[product_id][0]) >= oldest_start + SEASON_DAYS - 1
+                       for product_id in product_ids], dtype=bool)
+    seeded_state = [state[product_id] if known else (None, 0.0, 0.0, 0.0)
+                    for product_id, known in zip(product_ids, seeded)]
+    through_dates, level, ses_error, naive_error = zip(*seeded_state)
+    through_dates = np.array([str(day) if day is not None else 'NaT' for day in through_dates], dtype='datetime64[D]')
+    starts = [day - np.timedelta64(SEASON_DAYS - 1, 'D') for day in through_dates[seeded]]
+    if not seeded.all():
+        starts.append(oldest_start)
+    start = min(starts)
+    days = int((yesterday - start).astype(np.int64)) + 1
+    quantities = _quantity_matrix(cursor, wholesaler_id, product_ids, start, days)
+
+    through = np.where(seeded, (through_dates - start).astype(np.int64), 0)
+    level = np.array(level, dtype=float)
+    if not seeded.all():
+        new_through = int((oldest_start - start).astype(np.int64)) + SEASON_DAYS - 1
+        through[~seeded] = new_through
+        level[~seeded] = quantities[~seeded, new_through - SEASON_DAYS + 1:new_through + 1].mean(axis=1)
+
+    level, ses_error, naive_error = fold(quantities, through, level,
+                                         np.array(ses_error, dtype=float), np.array(naive_error, dtype=float))
+
+    use_naive = naive_error < ses_error
+    last_week = quantities[:, -SEASON_DAYS:].sum(axis=1) * HORIZON_DAYS / SEASON_DAYS
+    quantity = np.where(use_naive, last_week, level * HORIZON_DAYS)
+
+    updated_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    return [(int(product_ids[i]), wholesaler_id, str(yesterday), float(level[i]), float(ses_error[i]),
+             float(naive_error[i]), SEASONAL_NAIVE if use_naive[i] else SES, round(float(quantity[i]), 2), updated_at)
+            for i in range(len(product_ids))]
+
+
+def run(conn, today=None, progress=print):
+    """Bring every wholesaler's forecasts up to yesterday. Returns the number of products forecast."""
+    today = today or datetime.now(timezone.utc).date()
+    yesterday = today - timedelta(days=1)
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM wholesalers ORDER BY id')
+    wholesaler_ids = [row[0] for row in cursor.fetchall()]
+    forecast = 0
+    for wholesaler_id in wholesaler_ids:
+        cursor.execute('SELECT id FROM products WHERE wholesaler_id = ?', (wholesaler_id,))
+        product_ids = np.array(sorted(row[0] for row in cursor.fetchall()), dtype=np.int64)
+        rows = forecast_wholesaler(cursor, wholesaler_id, yesterday, product_ids)
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('DELETE FROM forecasts WHERE wholesaler_id = ? AND product_id NOT IN '
+                           '(SELECT id FROM products WHERE wholesaler_id = ?)', (wholesaler_id, wholesaler_id))
+            if rows:
+                cursor.executemany(SAVE_SQL, rows)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        if rows:
+            forecast += len(rows)
+            progress(f'    wholesaler {wholesaler_id}: {len(rows)} products')
+    return forecast
+
+
+# Write hooks -------------------------------------------------------------
+
+def product_removing(conn, product_id):
+    """A product is about to be deleted; forecasts references it. Does not commit."""
+    conn.execute('DELETE FROM forecasts WHERE product_id = ?', (product_id,))
@@ -0,0 +1,33 @@
+# forecast_demand.py
+# Update the next-week demand forecasts (see forecast.py).
+#
+# Run once a day, after midnight UTC, e.g. from cron. Each run only folds in
+# the days since the previous one; the first run seeds every product from
+# forecast.HISTORY_DAYS of order history.
+#
+#   python forecast_demand.py
+
+import sys
+import time
+
+import db
+import forecast
+import schema
+
+
+def main(argv):
+    conn = db.connect()
+    try:
+        if not schema.is_current(conn):
+            print('Database schema is out of date, run "python migrate.py" first')
+            return 1
+        started = time.perf_counter()
+        forecast_count = forecast.run(conn, progress=print)
+        print(f'✅ Forecast {forecast_count} product(s) in {time.perf_counter() - started:.2f}s')
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,224 @@
+# groupbuy.py
+# Pools vendors' demand into one consolidated order per club.
+#
+# A vendor joins a group buy for a group_buy_eligible product by leaving an
+# open request; requests are grouped by the vendor's location (their club)
+# and the product. Every WINDOW, pool() closes the window: each club's open
+# requests for a product become one group_buys row and one orders row for
+# the wholesaler, priced at the tier the pooled quantity reaches (TIERS), and
+# each request records its share at that unit price.
+#
+# Requests are filled oldest first up to what is in stock; the rest stay
+# open for the next window. The stock decrement is conditional, as in
+# checkout.py.
+
+from datetime import datetime, timedelta, timezone
+
+import inventory
+
+WINDOW = timedelta(hours=4)
+
+# (minimum pooled quantity, discount in percent), ascending
+TIERS = ((0, 0.0), (25, 3.0), (50, 5.0), (100, 8.0), (250, 12.0))
+
+PRODUCT_SQL = 'SELECT stock, group_buy_eligible FROM products WHERE id = ?'
+
+# Requests joined during one window; older open ones are left over from a
+# closed window that pool() has not reached yet or had too little stock for
+POOL_STATUS_SQL = '''
+    SELECT COALESCE(SUM(quantity), 0), COUNT(*)
+    FROM group_buy_requests
+    WHERE product_id = ? AND location = ? AND status = 'open' AND created_at >= ? AND created_at < ?
+'''
+
+MERGE_REQUEST_SQL = '''
+    UPDATE group_buy_requests SET quantity = quantity + ?
+    WHERE vendor_id = ? AND product_id = ? AND status = 'open' AND created_at >= ? AND created_at < ?
+'''
+
+# Open requests from windows that have closed, oldest first for each product
+DUE_REQUESTS_SQL = f'''
+    SELECT gr.id, gr.location, gr.product_id, gr.quantity, p.wholesaler_id, p.price, p.group_buy_eligible,
+           p.stock - {inventory.HELD_BY_OTHERS}
+    FROM group_buy_requests gr
+    LEFT JOIN products p ON p.id = gr.product_id
+    WHERE gr.status = 'open' AND gr.created_at < ?
+    ORDER BY gr.product_id, gr.created_at, gr.id
+'''
+
+INSERT_GROUP_BUY_SQL = '''
+    INSERT INTO group_buys (wholesaler_id, product_id, location, window_end, quantity, unit_price, discount_percent)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    RETURNING id
+'''
+
+INSERT_ORDER_SQL = '''
+    INSERT INTO orders (wholesaler_id, vendor_id, product_id, quantity, total_amount, status, group_buy_id)
+    VALUES (?, NULL, ?, ?, ?, 'pending', ?)
+    RETURNING id
+'''
+
+POOLED_SQL = "UPDATE group_buy_requests SET status = 'pooled', group_buy_id = ?, unit_price = ? WHERE id = ?"
+
+
+class GroupBuyError(Exception):
+    """The request was refused; the message is shown to the vendor."""
+
+
+def club(location):
+    """The pooling key for a vendor location: case and spacing don't matter."""
+    return ' '.join((location or '').split()).lower()
+
+
+def discount_for(quantity):
+    """Discount percent of the highest tier quantity reaches."""
+    discount = 0.0
+    for minimum, percent in TIERS:
+        if quantity >= minimum:
+            discount = percent
+    return discount
+
+
+def next_tier(quantity):
+    """(units still needed, discount percent) for the next tier up, or None at the top."""
+    for minimum, percent in TIERS:
+        if quantity < minimum:
+            return minimum - quantity, percent
+    return None
+
+
+def window_end(moment):
+    """Start of the window containing moment, i.e. the end of the last closed one (UTC)."""
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight + WINDOW * ((moment - midnight) // WINDOW)
+
+
+def current_window(moment=None):
+    """(start, end) of the window containing moment, now by default, as stored timestamps (UTC).
+
+    pool() run after end takes exactly the requests created from start on.
+    """
+    start = window_end(moment or datetime.now(timezone.utc))
+    return start.strftime('%Y-%m-%d %H:%M:%S'), (start + WINDOW).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def pool_status(conn, product_id, location):
+    """What is pooled so far this window for a product in a club."""
+    start, end = current_window()
+    quantity, vendors = conn.execute(POOL_STATUS_SQL, (product_id, club(location), start, end)).fetchone()
+    return {
+        'quantity': quantity,
+        'vendors': vendors,
+        'discount_percent': discount_for(quantity),
+        'next_tier': next_tier(quantity),
+        'closes_at': end[:16],
+    }
+
+
+def join(conn, vendor_id, location, product_id, quantity):
+    """Add quantity to the vendor's open request for the product this window, creating it if needed. Commits.
+
+    A request still open from an earlier window is left as it is; pool()
+    takes it on its own, ahead of this window's requests.
+    """
+    if not club(location):
+        raise GroupBuyError('Add your location to your profile to join group buys')
+    product = conn.execute(PRODUCT_SQL, (product_id,)).fetchone()
+    if product is None:
+        raise GroupBuyError('Product not found')
+    stock, eligible = product
+    if not eligible:
+        raise GroupBuyError('This product is not available for group buying')
+    if quantity > stock:
+        raise GroupBuyError(f'Only {max(stock, 0)} in stock')
+    start, end = current_window()
+    cursor = conn.execute(MERGE_REQUEST_SQL, (quantity, vendor_id, product_id, start, end))
+    if cursor.rowcount == 0:
+        conn.execute('''
+            INSERT INTO group_buy_requests (vendor_id, product_id, location, quantity, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (vendor_id, product_id, club(location), quantity, inventory.now()))
+    conn.commit()
+
+
+def cancel(conn, vendor_id, request_id):
+    """Withdraw an open request; False if it is not the vendor's or was already pooled."""
+    cursor = conn.execute('''
+        UPDATE group_buy_requests SET status = 'cancelled'
+        WHERE id = ? AND vendor_id = ? AND status = 'open'
+    ''', (request_id, vendor_id))
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def _plan(rows):
+    """Split due request rows into pools and requests to cancel.
+
+    Returns ([(location, product_id, wholesaler_id, price, [(request_id, quantity)])], [request_id]).
+    """
+    pools, cancelled = {}, []
+    remaining = {}  # product id -> stock not yet given to an earlier request
+    for request_id, location, product_id, quantity, wholesaler_id, price, eligible, available in rows:
+        if wholesaler_id is None or not eligible:
+            cancelled.append(request_id)
+            continue
+        remaining.setdefault(product_id, max(available or 0, 0))
+        # Oldest first, across clubs, while stock lasts; the rest wait for the next window
+        if quantity <= remaining[product_id]:
+            if (location, product_id) not in pools:
+                pools[location, product_id] = (location, product_id, wholesaler_id, price, [])
+            pools[location, product_id][4].append((request_id, quantity))
+            remaining[product_id] -= quantity
+    return list(pools.values()), cancelled
+
+
+def pool(conn, now=None):
+    """Consolidate the open requests of closed windows. Returns a summary dict."""
+    closed = window_end(now or datetime.now(timezone.utc))
+    closed_at = closed.strftime('%Y-%m-%d %H:%M:%S')
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute(DUE_REQUESTS_SQL, (0, inventory.now(), closed_at))
+        pools, cancelled = _plan(cursor.fetchall())
+        if cancelled:
+            cursor.executemany("UPDATE group_buy_requests SET status = 'cancelled' WHERE id = ?",
+                               [(request_id,) for request_id in cancelled])
+        if pools:
+            inventory.decrement(cursor, [(product_id, sum(quantity for _, quantity in requests))
+                                         for _, product_id, _, _, requests in pools])
+        wholesaler_ids = set()
+        for location, product_id, wholesaler_id, price, requests in pools:
+            quantity = sum(quantity for _, quantity in requests)
+            discount = discount_for(quantity)
+            unit_price = round(price * (100 - discount) / 100, 2)
+            cursor.execute(INSERT_GROUP_BUY_SQL, (wholesaler_id, product_id, location.title(), closed_at,
+                                                  quantity, unit_price, discount))
+            group_buy_id = cursor.fetchone()[0]
+            cursor.execute(INSERT_ORDER_SQL, (wholesaler_id, product_id, quantity,
+                                              round(unit_price * quantity, 2), group_buy_id))
+            order_id = cursor.fetchone()[0]
+            cursor.execute('UPDATE group_buys SET order_id = ? WHERE id = ?', (order_id, group_buy_id))
+            cursor.executemany(POOLED_SQL, [(group_buy_id, unit_price, request_id) for request_id, _ in requests])
+            wholesaler_ids.add(wholesaler_id)
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    return {
+        'window_end': closed_at,
+        'group_buys': len(pools),
+        'requests': sum(len(requests) for *_, requests in pools),
+        'cancelled': len(cancelled),
+        'wholesaler_ids': sorted(wholesaler_ids),
+    }
+
+
+# Write hooks -------------------------------------------------------------
+
+def product_removing(conn, product_id):
+    """A product is about to be deleted; its requests that were never pooled go with it. Does not commit.
+
+    Pooled requests belong to a group buy whose order still references the product.
+    """
+    conn.execute('DELETE FROM group_buy_requests WHERE product_id = ? AND group_buy_id IS NULL', (product_id,))
@@ -0,0 +1,198 @@
+# inventory.py
+# Stock reservations and oversell-safe stock decrements.
+#
+# Adding to a cart reserves the quantity for RESERVATION_TTL; what other
+# vendors can still reserve or buy is stock minus everyone else's live
+# reservations. Reservations are never swept by a job: expired rows are
+# ignored by every check and deleted when their product is next reserved.
+#
+# Each check is a single conditional statement (INSERT ... WHERE stock - held
+# >= ?, UPDATE ... WHERE stock >= ?), so concurrent vendors never read stock,
+# decide, and write back; the database arbitrates and the loser's statement
+# simply matches no row.
+
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+
+RESERVATION_TTL = timedelta(minutes=15)
+
+# Quantity of product p held by vendors other than ?, as of ?
+HELD_BY_OTHERS = '''COALESCE((SELECT SUM(r.quantity) FROM stock_reservations r
+                              WHERE r.product_id = p.id AND r.vendor_id <> ? AND r.expires_at > ?), 0)'''
+
+RESERVE_SQL = f'''
+    INSERT INTO stock_reservations (vendor_id, product_id, quantity, expires_at)
+    SELECT ?, p.id, ?, ?
+    FROM products p
+    WHERE p.id = ? AND p.stock - {HELD_BY_OTHERS} >= ?
+    ON CONFLICT (vendor_id, product_id) DO UPDATE SET quantity = excluded.quantity, expires_at = excluded.expires_at
+'''
+
+AVAILABLE_SQL = f'SELECT p.stock - {HELD_BY_OTHERS} FROM products p WHERE p.id = ?'
+
+DECREMENT_STOCK_SQL = '''
+    UPDATE products
+    SET stock = stock - ?, version = version + 1
+    WHERE id = ? AND stock >= ?
+'''
+
+
+class OutOfStock(Exception):
+    """Fewer than the requested units are free; available is what is left."""
+
+    def __init__(self, product_id, available):
+        super().__init__(f'only {max(available, 0)} available')
+        self.product_id = product_id
+        self.available = max(available, 0)
+
+
+class StockConflict(Exception):
+    """A conditional decrement matched no row; another order got there first."""
+
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def now():
+    return _timestamp(datetime.now(timezone.utc))
+
+
+def available(conn, product_id, vendor_id=None):
+    """Units of product_id that vendor_id could still buy, or None if it is gone."""
+    row = conn.execute(AVAILABLE_SQL, (vendor_id or 0, now(), product_id)).fetchone()
+    return row[0] if row else None
+
+
+def reserve(conn, vendor_id, product_id, quantity):
+    """Hold quantity units (the vendor's total, not an increment) for RESERVATION_TTL.
+
+    Raises OutOfStock without changing anything if they are not free. Does
+    not commit; the caller commits together with its own writes.
+    """
+    moment = datetime.now(timezone.utc)
+    conn.execute('DELETE FROM stock_reservations WHERE product_id = ? AND expires_at <= ?',
+                 (product_id, _timestamp(moment)))
+    cursor = conn.execute(RESERVE_SQL, (vendor_id, quantity, _timestamp(moment + RESERVATION_TTL),
+                                        product_id, vendor_id, _timestamp(moment), quantity))
+    if cursor.rowcount == 0:
+        raise OutOfStock(product_id, available(conn, product_id, vendor_id) or 0)
+
+
+def release(conn, vendor_id, product_ids=None):
+    """Drop the vendor's reservations, all of them or just product_ids. Does not commit."""
+    if product_ids is None:
+        conn.execute('DELETE FROM stock_reservations WHERE vendor_id = ?', (vendor_id,))
+    else:
+        conn.executemany('DELETE FROM stock_reservations WHERE vendor_id = ? AND product_id = ?',
+                         [(vendor_id, product_id) for product_id in product_ids])
+
+
+def decrement(cursor, lines):
+    """Take [(product_id, quantity)] out of stock, all or nothing.
+
+    Every UPDATE only matches while enough stock is left. Raises StockConflict
+    if any line lost a race, and the caller must roll back.
+    """
+    cursor.executemany(DECREMENT_STOCK_SQL,
+                       [(quantity, product_id, quantity) for product_id, quantity in lines])
+    if cursor.rowcount != len(lines):
+        raise StockConflict('Stock changed during checkout')
+
+
+# Bulk restock --------------------------------------------------------------
+
+MAX_BULK_CHANGES = 5000
+
+# Columns of a bulk CSV upload; stock or price may be left blank
+BULK_CSV_COLUMNS = ('product_id', 'stock', 'price')
+
+BULK_UPDATE_SQL = '''
+    UPDATE products
+    SET stock = COALESCE(?, stock), price = COALESCE(?, price), version = version + 1
+    WHERE id = ? AND wholesaler_id = ?
+'''
+
+BULK_STATUS_SQL = 'SELECT id, status FROM products WHERE wholesaler_id = ? AND id IN ({})'
+
+
+class BulkUpdateError(Exception):
+    """The upload was rejected as a whole; errors lists the bad rows."""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} invalid row(s)')
+        self.errors = errors
+
+
+def _number(value, kind):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    number = kind(value)
+    if number < 0:
+        raise ValueError('must not be negative')
+    return number
+
+
+def parse_changes(rows):
+    """Validate dicts with product_id and stock and/or price into (product_id, stock, price) tuples.
+
+    Later rows for the same product override earlier ones. Raises
+    BulkUpdateError listing every bad row (numbered from 1).
+    """
+    changes, errors = {}, []
+    for number, row in enumerate(rows, 1):
+        try:
+            product_id = int(row['product_id'])
+            stock = _number(row.get('stock'), int)
+            price = _number(row.get('price'), float)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            errors.append({'row': number, 'error': str(e) or 'invalid value'})
+            continue
+        if stock is None and price is None:
+            errors.append({'row': number, 'error': 'nothing to change'})
+            continue
+        changes[product_id] = (product_id, stock, price)
+    if len(changes) > MAX_BULK_CHANGES:
+        errors.append({'row': None, 'error': f'at most {MAX_BULK_CHANGES} products per upload'})
+    if errors:
+        raise BulkUpdateError(errors)
+    return list(changes.values())
+
+
+def parse_csv(text):
+    """parse_changes() over a CSV upload whose header names BULK_CSV_COLUMNS."""
+    reader = csv.DictReader(io.StringIO(text))
+    if 'product_id' not in (reader.fieldnames or ()):
+        raise BulkUpdateError([{'row': None, 'error': 'CSV header must include product_id, stock, price'}])
+    return parse_changes(reader)
+
+
+def bulk_update(conn, wholesaler_id, changes):
+    """Apply [(product_id, stock, price)] for one wholesaler in one transaction.
+
+    None leaves a field unchanged. Returns ({product_id: status} for the
+    updated products, [ids skipped because they are not the wholesaler's]).
+    """
+    if not changes:
+        return {}, []
+    product_ids = [product_id for product_id, _, _ in changes]
+    placeholders = ', '.join('?' * len(product_ids))
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.executemany(BULK_UPDATE_SQL, [(stock, price, product_id, wholesaler_id)
+                                             for product_id, stock, price in changes])
+        cursor.execute(BULK_STATUS_SQL.format(placeholders), (wholesaler_id, *product_ids))
+        statuses = dict(cursor.fetchall())
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    return statuses, [product_id for product_id in product_ids if product_id not in statuses]
+
+
+# Write hooks -------------------------------------------------------------
+
+def product_removed(conn, product_id):
+    conn.execute('DELETE FROM stock_reservations WHERE product_id = ?', (product_id,))
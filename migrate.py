@@ -0,0 +1,32 @@
+# migrate.py
+# Apply pending schema migrations offline, before starting the workers.
+#
+#   python migrate.py            # apply everything pending, with progress
+#   python migrate.py --status   # show current vs latest version only
+
+import sys
+import time
+
+import db
+import schema
+
+
+def main(argv):
+    conn = db.connect()
+    try:
+        current, latest = schema.current_version(conn), schema.latest_version()
+        print(f'{conn.dialect}: schema version {current}, latest {latest}')
+        if '--status' in argv:
+            return 0 if current >= latest else 1
+
+        started = time.perf_counter()
+        applied = schema.migrate(conn, progress=print)
+        if applied:
+            print(f'✅ Applied {applied} migration(s) in {time.perf_counter() - started:.2f}s')
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,96 @@
+"""Core tables: vendors, wholesalers, products, orders, reviews, analytics."""
+
+
+def upgrade(cursor, progress):
+    # IF NOT EXISTS so databases created before schema_version existed are
+    # adopted as-is
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vendors (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            phone TEXT,
+            password TEXT,
+            location TEXT,
+            is_approved BOOLEAN DEFAULT FALSE,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS wholesalers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL,
+            shop_name TEXT NOT NULL,
+            id_doc_path TEXT,
+            license_doc_path TEXT,
+            sourcing_info TEXT,
+            location TEXT,
+            is_approved BOOLEAN DEFAULT FALSE,
+            trust_score REAL DEFAULT 4.7,
+            response_rate REAL DEFAULT 95.0,
+            delivery_rate REAL DEFAULT 92.0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            wholesaler_id INTEGER,
+            name TEXT NOT NULL,
+            category TEXT,
+            price REAL NOT NULL,
+            stock INTEGER NOT NULL,
+            group_buy_eligible BOOLEAN DEFAULT TRUE,
+            image_path TEXT,
+            views INTEGER DEFAULT 0,
+            likes INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'In Stock',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (wholesaler_id) REFERENCES wholesalers (id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            wholesaler_id INTEGER,
+            vendor_id INTEGER,
+            product_id INTEGER,
+            quantity INTEGER,
+            total_amount REAL,
+            status TEXT DEFAULT 'pending',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (wholesaler_id) REFERENCES wholesalers (id),
+            FOREIGN KEY (vendor_id) REFERENCES vendors (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            wholesaler_id INTEGER,
+            vendor_id INTEGER,
+            rating INTEGER,
+            comment TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (wholesaler_id) REFERENCES wholesalers (id),
+            FOREIGN KEY (vendor_id) REFERENCES vendors (id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            wholesaler_id INTEGER,
+            date DATE,
+            total_orders INTEGER DEFAULT 0,
+            total_revenue REAL DEFAULT 0,
+            active_customers INTEGER DEFAULT 0,
+            FOREIGN KEY (wholesaler_id) REFERENCES wholesalers (id)
+        )
+    ''')
@@ -0,0 +1,7 @@
+"""Add products.description."""
+
+from schema import add_column
+
+
+def upgrade(cursor, progress):
+    add_column(cursor, 'products', 'description', 'TEXT')
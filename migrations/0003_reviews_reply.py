@@ -0,0 +1,7 @@
+"""Add reviews.reply for wholesaler responses."""
+
+from schema import add_column
+
+
+def upgrade(cursor, progress):
+    add_column(cursor, 'reviews', 'reply', 'TEXT')
@@ -0,0 +1,7 @@
+"""Add wholesalers.profile_photo."""
+
+from schema import add_column
+
+
+def upgrade(cursor, progress):
+    add_column(cursor, 'wholesalers', 'profile_photo', 'TEXT')
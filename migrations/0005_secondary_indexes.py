@@ -0,0 +1,7 @@
+"""Secondary indexes for the hot queries (see schema.INDEXES)."""
+
+from schema import create_indexes
+
+
+def upgrade(cursor, progress):
+    create_indexes(cursor, progress=progress)
@@ -0,0 +1,63 @@
+"""Full-text product search: FTS5 table + sync triggers (GIN tsvector on PostgreSQL)."""
+
+# Text indexed on PostgreSQL, as search.PG_SEARCH_DOCUMENT was when this migration was written
+PG_SEARCH_DOCUMENT = "coalesce(name, '') || ' ' || coalesce(category, '') || ' ' || coalesce(description, '')"
+
+
+def upgrade(cursor, progress):
+    if cursor.connection.dialect == 'postgresql':
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_products_search ON products
+            USING GIN (to_tsvector('simple', {PG_SEARCH_DOCUMENT}))
+        ''')
+        return
+
+    # rowid is the product id. prefix='2 3' keeps short prefix queries
+    # ("to", "tom") on an index instead of a term scan.
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, category, description, shop_name,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, category, description, shop_name)
+            VALUES (new.id, new.name, new.category, new.description,
+                    (SELECT shop_name FROM wholesalers WHERE id = new.wholesaler_id));
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_update
+        AFTER UPDATE OF name, category, description, wholesaler_id ON products BEGIN
+            DELETE FROM products_fts WHERE rowid = old.id;
+            INSERT INTO products_fts (rowid, name, category, description, shop_name)
+            VALUES (new.id, new.name, new.category, new.description,
+                    (SELECT shop_name FROM wholesalers WHERE id = new.wholesaler_id));
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+            DELETE FROM products_fts WHERE rowid = old.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_shop_name
+        AFTER UPDATE OF shop_name ON wholesalers BEGIN
+            UPDATE products_fts SET shop_name = new.shop_name
+            WHERE rowid IN (SELECT id FROM products WHERE wholesaler_id = new.id);
+        END
+    ''')
+
+    # Index the existing catalog
+    cursor.execute('DELETE FROM products_fts')
+    cursor.execute('''
+        INSERT INTO products_fts (rowid, name, category, description, shop_name)
+        SELECT p.id, p.name, p.category, p.description, w.shop_name
+        FROM products p
+        LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+    ''')
+    progress(f'    indexed {cursor.rowcount} products')
+    cursor.execute("INSERT INTO products_fts (products_fts) VALUES ('optimize')")
@@ -0,0 +1,17 @@
+"""Server-side carts: cart_items keyed by (vendor_id, product_id)."""
+
+
+def upgrade(cursor, progress):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cart_items (
+            vendor_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            added_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (vendor_id, product_id),
+            FOREIGN KEY (vendor_id) REFERENCES vendors (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    # delete_product clears the product out of every cart
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cart_items_product ON cart_items (product_id)')
@@ -0,0 +1,20 @@
+"""Stock reservations for carts, and products.version for optimistic edits."""
+
+from schema import add_column
+
+
+def upgrade(cursor, progress):
+    add_column(cursor, 'products', 'version', 'INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            vendor_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            expires_at DATETIME NOT NULL,
+            PRIMARY KEY (vendor_id, product_id),
+            FOREIGN KEY (vendor_id) REFERENCES vendors (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    # Summing a product's live reservations, and purging expired ones
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stock_reservations_product ON stock_reservations (product_id, expires_at)')
@@ -0,0 +1,87 @@
+"""Derive products.status from stock in the database, with per-wholesaler low-stock thresholds."""
+
+from schema import add_column
+
+DEFAULT_LOW_STOCK_THRESHOLD = 50
+
+
+def status_case(stock, threshold):
+    return f'''CASE WHEN {stock} <= 0 THEN 'Out of Stock'
+                    WHEN {stock} < {threshold} THEN 'Low Stock'
+                    ELSE 'In Stock' END'''
+
+
+def threshold_of(wholesaler_id):
+    return (f'COALESCE((SELECT low_stock_threshold FROM wholesalers WHERE id = {wholesaler_id}), '
+            f'{DEFAULT_LOW_STOCK_THRESHOLD})')
+
+
+def upgrade(cursor, progress):
+    add_column(cursor, 'wholesalers', 'low_stock_threshold', f'INTEGER NOT NULL DEFAULT {DEFAULT_LOW_STOCK_THRESHOLD}')
+
+    if cursor.connection.dialect == 'postgresql':
+        # A BEFORE trigger can set NEW.status directly; touching status
+        # re-derives it, which is how a threshold change is applied
+        cursor.execute(f'''
+            CREATE OR REPLACE FUNCTION products_stock_status() RETURNS trigger AS $$
+            BEGIN
+                NEW.status := {status_case('NEW.stock', threshold_of('NEW.wholesaler_id'))};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS products_stock_status ON products')
+        cursor.execute('''
+            CREATE TRIGGER products_stock_status
+            BEFORE INSERT OR UPDATE OF stock, status, wholesaler_id ON products
+            FOR EACH ROW EXECUTE FUNCTION products_stock_status()
+        ''')
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION wholesalers_low_stock_threshold() RETURNS trigger AS $$
+            BEGIN
+                UPDATE products SET status = status WHERE wholesaler_id = NEW.id;
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS wholesalers_low_stock_threshold ON wholesalers')
+        cursor.execute('''
+            CREATE TRIGGER wholesalers_low_stock_threshold
+            AFTER UPDATE OF low_stock_threshold ON wholesalers
+            FOR EACH ROW EXECUTE FUNCTION wholesalers_low_stock_threshold()
+        ''')
+    else:
+        # Generated columns cannot read another table's threshold, so
+        # triggers it is. Listing status in UPDATE OF also corrects any
+        # write that sets status by hand.
+        new_status = status_case('new.stock', threshold_of('new.wholesaler_id'))
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_stock_status_insert AFTER INSERT ON products BEGIN
+                UPDATE products SET status = {new_status} WHERE id = new.id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_stock_status_update
+            AFTER UPDATE OF stock, status, wholesaler_id ON products
+            WHEN new.status IS NOT {new_status} BEGIN
+                UPDATE products SET status = {new_status} WHERE id = new.id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS wholesalers_low_stock_threshold
+            AFTER UPDATE OF low_stock_threshold ON wholesalers BEGIN
+                UPDATE products SET status = {status_case('stock', 'new.low_stock_threshold')}
+                WHERE wholesaler_id = new.id;
+            END
+        ''')
+
+    cursor.execute(f'UPDATE products SET status = {status_case("stock", threshold_of("products.wholesaler_id"))}')
+    progress(f'    derived status for {cursor.rowcount} products')
+
+    # vendor_category with ?in_stock=1: WHERE category = ? AND status <> 'Out of Stock' ORDER BY name, id
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_category_in_stock ON products (category, name, id)
+        WHERE status <> 'Out of Stock'
+    ''')
+    # Per-wholesaler stock status counts
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_wholesaler_status ON products (wholesaler_id, status)')
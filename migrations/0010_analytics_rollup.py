@@ -0,0 +1,144 @@
+"""Maintain analytics as a daily rollup of orders, replacing the seeded sample rows."""
+
+# Frozen copies of the rollup.py expressions this migration was written against
+ORDER_DAY = {
+    'sqlite': 'date(created_at)',
+    'postgresql': 'CAST(created_at AS DATE)',
+}
+REVENUE = "CASE WHEN status = 'completed' THEN COALESCE(total_amount, 0) ELSE 0 END"
+
+# Revenue contributed by the old/new row of a trigger
+NEW_REVENUE = "CASE WHEN new.status = 'completed' THEN COALESCE(new.total_amount, 0) ELSE 0 END"
+OLD_REVENUE = "CASE WHEN old.status = 'completed' THEN COALESCE(old.total_amount, 0) ELSE 0 END"
+
+
+def upgrade(cursor, progress):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_customers (
+            wholesaler_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            vendor_id INTEGER NOT NULL,
+            orders INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (wholesaler_id, date, vendor_id)
+        )
+    ''')
+    # The sample rows init_db used to write are not derived from orders
+    cursor.execute('DELETE FROM analytics')
+    # One row per wholesaler and day; supersedes the plain index from 0005
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_analytics_wholesaler_day ON analytics (wholesaler_id, date)')
+    cursor.execute('DROP INDEX IF EXISTS idx_analytics_wholesaler_date')
+
+    if cursor.connection.dialect == 'postgresql':
+        cursor.execute(f'''
+            CREATE OR REPLACE FUNCTION analytics_rollup() RETURNS trigger AS $$
+            DECLARE
+                day DATE;
+                first_order BOOLEAN;
+                last_order BOOLEAN;
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    IF new.wholesaler_id IS NULL THEN RETURN NULL; END IF;
+                    day := CAST(new.created_at AS DATE);
+                    INSERT INTO analytics_customers (wholesaler_id, date, vendor_id, orders)
+                    VALUES (new.wholesaler_id, day, COALESCE(new.vendor_id, 0), 1)
+                    ON CONFLICT (wholesaler_id, date, vendor_id) DO UPDATE SET orders = analytics_customers.orders + 1
+                    RETURNING orders = 1 INTO first_order;
+                    INSERT INTO analytics (wholesaler_id, date, total_orders, total_revenue, active_customers)
+                    VALUES (new.wholesaler_id, day, 1, {NEW_REVENUE}, CASE WHEN first_order THEN 1 ELSE 0 END)
+                    ON CONFLICT (wholesaler_id, date) DO UPDATE SET
+                        total_orders = analytics.total_orders + 1,
+                        total_revenue = analytics.total_revenue + excluded.total_revenue,
+                        active_customers = analytics.active_customers + excluded.active_customers;
+                ELSIF TG_OP = 'UPDATE' THEN
+                    IF new.wholesaler_id IS NULL THEN RETURN NULL; END IF;
+                    UPDATE analytics SET total_revenue = total_revenue + ({NEW_REVENUE}) - ({OLD_REVENUE})
+                    WHERE wholesaler_id = new.wholesaler_id AND date = CAST(new.created_at AS DATE);
+                ELSE
+                    IF old.wholesaler_id IS NULL THEN RETURN NULL; END IF;
+                    day := CAST(old.created_at AS DATE);
+                    UPDATE analytics_customers SET orders = orders - 1
+                    WHERE wholesaler_id = old.wholesaler_id AND date = day AND vendor_id = COALESCE(old.vendor_id, 0)
+                    RETURNING orders <= 0 INTO last_order;
+                    DELETE FROM analytics_customers
+                    WHERE wholesaler_id = old.wholesaler_id AND date = day AND vendor_id = COALESCE(old.vendor_id, 0)
+                          AND orders <= 0;
+                    UPDATE analytics SET
+                        total_orders = total_orders - 1,
+                        total_revenue = total_revenue - ({OLD_REVENUE}),
+                        active_customers = active_customers - CASE WHEN last_order THEN 1 ELSE 0 END
+                    WHERE wholesaler_id = old.wholesaler_id AND date = day;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS analytics_rollup ON orders')
+        cursor.execute('''
+            CREATE TRIGGER analytics_rollup
+            AFTER INSERT OR DELETE OR UPDATE OF status, total_amount ON orders
+            FOR EACH ROW EXECUTE FUNCTION analytics_rollup()
+        ''')
+    else:
+        day, old_day = 'date(new.created_at)', 'date(old.created_at)'
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS analytics_order_insert AFTER INSERT ON orders
+            WHEN new.wholesaler_id IS NOT NULL BEGIN
+                INSERT INTO analytics (wholesaler_id, date, total_orders, total_revenue, active_customers)
+                VALUES (new.wholesaler_id, {day}, 1, {NEW_REVENUE},
+                        NOT EXISTS (SELECT 1 FROM analytics_customers
+                                    WHERE wholesaler_id = new.wholesaler_id AND date = {day}
+                                          AND vendor_id = COALESCE(new.vendor_id, 0)))
+                ON CONFLICT (wholesaler_id, date) DO UPDATE SET
+                    total_orders = total_orders + 1,
+                    total_revenue = total_revenue + excluded.total_revenue,
+                    active_customers = active_customers + excluded.active_customers;
+                INSERT INTO analytics_customers (wholesaler_id, date, vendor_id, orders)
+                VALUES (new.wholesaler_id, {day}, COALESCE(new.vendor_id, 0), 1)
+                ON CONFLICT (wholesaler_id, date, vendor_id) DO UPDATE SET orders = orders + 1;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS analytics_order_update AFTER UPDATE OF status, total_amount ON orders
+            WHEN new.wholesaler_id IS NOT NULL BEGIN
+                UPDATE analytics SET total_revenue = total_revenue + ({NEW_REVENUE}) - ({OLD_REVENUE})
+                WHERE wholesaler_id = new.wholesaler_id AND date = {day};
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS analytics_order_delete AFTER DELETE ON orders
+            WHEN old.wholesaler_id IS NOT NULL BEGIN
+                UPDATE analytics_customers SET orders = orders - 1
+                WHERE wholesaler_id = old.wholesaler_id AND date = {old_day} AND vendor_id = COALESCE(old.vendor_id, 0);
+                UPDATE analytics SET
+                    total_orders = total_orders - 1,
+                    total_revenue = total_revenue - ({OLD_REVENUE}),
+                    active_customers = active_customers - EXISTS (
+                        SELECT 1 FROM analytics_customers
+                        WHERE wholesaler_id = old.wholesaler_id AND date = {old_day}
+                              AND vendor_id = COALESCE(old.vendor_id, 0) AND orders <= 0)
+                WHERE wholesaler_id = old.wholesaler_id AND date = {old_day};
+                DELETE FROM analytics_customers
+                WHERE wholesaler_id = old.wholesaler_id AND date = {old_day}
+                      AND vendor_id = COALESCE(old.vendor_id, 0) AND orders <= 0;
+            END
+        ''')
+
+    # Rebuild from the existing orders; already inside the migration's transaction
+    day = ORDER_DAY[cursor.connection.dialect]
+    cursor.execute('DELETE FROM analytics_customers')
+    cursor.execute(f'''
+        INSERT INTO analytics_customers (wholesaler_id, date, vendor_id, orders)
+        SELECT wholesaler_id, {day}, COALESCE(vendor_id, 0), COUNT(*)
+        FROM orders
+        WHERE wholesaler_id IN (SELECT id FROM wholesalers)
+        GROUP BY wholesaler_id, {day}, COALESCE(vendor_id, 0)
+    ''')
+    cursor.execute(f'''
+        INSERT INTO analytics (wholesaler_id, date, total_orders, total_revenue, active_customers)
+        SELECT wholesaler_id, {day}, COUNT(*), SUM({REVENUE}), COUNT(DISTINCT COALESCE(vendor_id, 0))
+        FROM orders
+        WHERE wholesaler_id IN (SELECT id FROM wholesalers)
+        GROUP BY wholesaler_id, {day}
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM wholesalers')
+    progress(f'    rolled up orders for {cursor.fetchone()[0]} wholesalers')
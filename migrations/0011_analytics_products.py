@@ -0,0 +1,115 @@
+"""Daily per-product order rollup behind the analytics breakdowns (see analytics.py)."""
+
+# Frozen copies of the rollup.py expressions this migration was written against
+ORDER_DAY = {
+    'sqlite': 'date(created_at)',
+    'postgresql': 'CAST(created_at AS DATE)',
+}
+REVENUE = "CASE WHEN status = 'completed' THEN COALESCE(total_amount, 0) ELSE 0 END"
+NEW_REVENUE = "CASE WHEN new.status = 'completed' THEN COALESCE(new.total_amount, 0) ELSE 0 END"
+OLD_REVENUE = "CASE WHEN old.status = 'completed' THEN COALESCE(old.total_amount, 0) ELSE 0 END"
+
+
+def upgrade(cursor, progress):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_products (
+            wholesaler_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            product_id INTEGER NOT NULL,
+            orders INTEGER NOT NULL DEFAULT 0,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (wholesaler_id, date, product_id)
+        )
+    ''')
+
+    if cursor.connection.dialect == 'postgresql':
+        cursor.execute(f'''
+            CREATE OR REPLACE FUNCTION analytics_products_rollup() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    IF new.wholesaler_id IS NULL THEN RETURN NULL; END IF;
+                    INSERT INTO analytics_products (wholesaler_id, date, product_id, orders, quantity, revenue)
+                    VALUES (new.wholesaler_id, CAST(new.created_at AS DATE), COALESCE(new.product_id, 0), 1,
+                            COALESCE(new.quantity, 0), {NEW_REVENUE})
+                    ON CONFLICT (wholesaler_id, date, product_id) DO UPDATE SET
+                        orders = analytics_products.orders + 1,
+                        quantity = analytics_products.quantity + excluded.quantity,
+                        revenue = analytics_products.revenue + excluded.revenue;
+                ELSIF TG_OP = 'UPDATE' THEN
+                    IF new.wholesaler_id IS NULL THEN RETURN NULL; END IF;
+                    UPDATE analytics_products SET
+                        quantity = quantity + COALESCE(new.quantity, 0) - COALESCE(old.quantity, 0),
+                        revenue = revenue + ({NEW_REVENUE}) - ({OLD_REVENUE})
+                    WHERE wholesaler_id = new.wholesaler_id AND date = CAST(new.created_at AS DATE)
+                          AND product_id = COALESCE(new.product_id, 0);
+                ELSE
+                    IF old.wholesaler_id IS NULL THEN RETURN NULL; END IF;
+                    UPDATE analytics_products SET
+                        orders = orders - 1,
+                        quantity = quantity - COALESCE(old.quantity, 0),
+                        revenue = revenue - ({OLD_REVENUE})
+                    WHERE wholesaler_id = old.wholesaler_id AND date = CAST(old.created_at AS DATE)
+                          AND product_id = COALESCE(old.product_id, 0);
+                    DELETE FROM analytics_products
+                    WHERE wholesaler_id = old.wholesaler_id AND date = CAST(old.created_at AS DATE)
+                          AND product_id = COALESCE(old.product_id, 0) AND orders <= 0;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS analytics_products_rollup ON orders')
+        cursor.execute('''
+            CREATE TRIGGER analytics_products_rollup
+            AFTER INSERT OR DELETE OR UPDATE OF status, total_amount, quantity ON orders
+            FOR EACH ROW EXECUTE FUNCTION analytics_products_rollup()
+        ''')
+    else:
+        new_key = 'wholesaler_id = new.wholesaler_id AND date = date(new.created_at) AND product_id = COALESCE(new.product_id, 0)'
+        old_key = 'wholesaler_id = old.wholesaler_id AND date = date(old.created_at) AND product_id = COALESCE(old.product_id, 0)'
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS analytics_products_insert AFTER INSERT ON orders
+            WHEN new.wholesaler_id IS NOT NULL BEGIN
+                INSERT INTO analytics_products (wholesaler_id, date, product_id, orders, quantity, revenue)
+                VALUES (new.wholesaler_id, date(new.created_at), COALESCE(new.product_id, 0), 1,
+                        COALESCE(new.quantity, 0), {NEW_REVENUE})
+                ON CONFLICT (wholesaler_id, date, product_id) DO UPDATE SET
+                    orders = orders + 1,
+                    quantity = quantity + excluded.quantity,
+                    revenue = revenue + excluded.revenue;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS analytics_products_update AFTER UPDATE OF status, total_amount, quantity ON orders
+            WHEN new.wholesaler_id IS NOT NULL BEGIN
+                UPDATE analytics_products SET
+                    quantity = quantity + COALESCE(new.quantity, 0) - COALESCE(old.quantity, 0),
+                    revenue = revenue + ({NEW_REVENUE}) - ({OLD_REVENUE})
+                WHERE {new_key};
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS analytics_products_delete AFTER DELETE ON orders
+            WHEN old.wholesaler_id IS NOT NULL BEGIN
+                UPDATE analytics_products SET
+                    orders = orders - 1,
+                    quantity = quantity - COALESCE(old.quantity, 0),
+                    revenue = revenue - ({OLD_REVENUE})
+                WHERE {old_key};
+                DELETE FROM analytics_products WHERE {old_key} AND orders <= 0;
+            END
+        ''')
+
+    # Rebuild from the existing orders; already inside the migration's transaction
+    day = ORDER_DAY[cursor.connection.dialect]
+    cursor.execute('DELETE FROM analytics_products')
+    cursor.execute(f'''
+        INSERT INTO analytics_products (wholesaler_id, date, product_id, orders, quantity, revenue)
+        SELECT wholesaler_id, {day}, COALESCE(product_id, 0), COUNT(*), SUM(COALESCE(quantity, 0)), SUM({REVENUE})
+        FROM orders
+        WHERE wholesaler_id IN (SELECT id FROM wholesalers)
+        GROUP BY wholesaler_id, {day}, COALESCE(product_id, 0)
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM wholesalers')
+    progress(f'    rolled up product orders for {cursor.fetchone()[0]} wholesalers')
@@ -0,0 +1,21 @@
+"""Per-product demand forecasts and the smoothing state behind them (see forecast.py)."""
+
+
+def upgrade(cursor, progress):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS forecasts (
+            product_id INTEGER PRIMARY KEY,
+            wholesaler_id INTEGER NOT NULL,
+            through_date DATE NOT NULL,
+            level REAL NOT NULL DEFAULT 0,
+            ses_error REAL NOT NULL DEFAULT 0,
+            naive_error REAL NOT NULL DEFAULT 0,
+            method TEXT NOT NULL DEFAULT 'ses',
+            quantity REAL NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (wholesaler_id) REFERENCES wholesalers (id)
+        )
+    ''')
+    # wholesaler_dashboard restock alerts / forecast.run: WHERE wholesaler_id = ?
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_forecasts_wholesaler ON forecasts (wholesaler_id)')
@@ -0,0 +1,50 @@
+"""Group-buy requests and the consolidated orders they are pooled into (see groupbuy.py)."""
+
+from schema import add_column
+
+
+def upgrade(cursor, progress):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS group_buys (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            wholesaler_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            location TEXT NOT NULL,
+            window_end DATETIME NOT NULL,
+            quantity INTEGER NOT NULL,
+            unit_price REAL NOT NULL,
+            discount_percent REAL NOT NULL DEFAULT 0,
+            order_id INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (wholesaler_id) REFERENCES wholesalers (id),
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (order_id) REFERENCES orders (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS group_buy_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vendor_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            location TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'open',
+            group_buy_id INTEGER,
+            unit_price REAL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (vendor_id) REFERENCES vendors (id),
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (group_buy_id) REFERENCES group_buys (id)
+        )
+    ''')
+    add_column(cursor, 'orders', 'group_buy_id', 'INTEGER REFERENCES group_buys (id)')
+
+    # groupbuy.pool: WHERE status = 'open' AND created_at < ?
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_group_buy_requests_status_created '
+                   'ON group_buy_requests (status, created_at)')
+    # groupbuy.pool_status: WHERE product_id = ? AND location = ? AND status = 'open'
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_group_buy_requests_pool '
+                   'ON group_buy_requests (product_id, location, status)')
+    # vendor_orders group buys / groupbuy.join: WHERE vendor_id = ? ORDER BY created_at
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_group_buy_requests_vendor_created '
+                   'ON group_buy_requests (vendor_id, created_at)')
@@ -0,0 +1,100 @@
+"""Vendor x product purchase pairs kept by triggers, and the precomputed recommendations (see recommend.py)."""
+
+
+def upgrade(cursor, progress):
+    # The sparse interaction matrix: one row per product a vendor has ordered.
+    # changed marks pairs that appeared or disappeared since recommend.run
+    # last looked at them.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vendor_products (
+            vendor_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            orders INTEGER NOT NULL DEFAULT 0,
+            changed INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (vendor_id, product_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_similarities (
+            product_id INTEGER NOT NULL,
+            similar_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (product_id, similar_id)
+        )
+    ''')
+    # vendor_dashboard: WHERE vendor_id = ? ORDER BY rank
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vendor_recommendations (
+            vendor_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (vendor_id, rank)
+        )
+    ''')
+
+    if cursor.connection.dialect == 'postgresql':
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION vendor_products_pairs() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO vendor_products (vendor_id, product_id, orders)
+                    VALUES (new.vendor_id, new.product_id, 1)
+                    ON CONFLICT (vendor_id, product_id) DO UPDATE SET
+                        orders = vendor_products.orders + 1,
+                        changed = CASE WHEN vendor_products.orders <= 0 THEN 1 ELSE vendor_products.changed END;
+                ELSE
+                    UPDATE vendor_products SET
+                        orders = orders - 1,
+                        changed = CASE WHEN orders <= 1 THEN 1 ELSE changed END
+                    WHERE vendor_id = old.vendor_id AND product_id = old.product_id;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS vendor_products_insert ON orders')
+        cursor.execute('''
+            CREATE TRIGGER vendor_products_insert AFTER INSERT ON orders
+            FOR EACH ROW WHEN (new.vendor_id IS NOT NULL AND new.product_id IS NOT NULL)
+            EXECUTE FUNCTION vendor_products_pairs()
+        ''')
+        cursor.execute('DROP TRIGGER IF EXISTS vendor_products_delete ON orders')
+        cursor.execute('''
+            CREATE TRIGGER vendor_products_delete AFTER DELETE ON orders
+            FOR EACH ROW WHEN (old.vendor_id IS NOT NULL AND old.product_id IS NOT NULL)
+            EXECUTE FUNCTION vendor_products_pairs()
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS vendor_products_insert AFTER INSERT ON orders
+            WHEN new.vendor_id IS NOT NULL AND new.product_id IS NOT NULL BEGIN
+                INSERT INTO vendor_products (vendor_id, product_id, orders)
+                VALUES (new.vendor_id, new.product_id, 1)
+                ON CONFLICT (vendor_id, product_id) DO UPDATE SET
+                    orders = orders + 1,
+                    changed = CASE WHEN orders <= 0 THEN 1 ELSE changed END;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS vendor_products_delete AFTER DELETE ON orders
+            WHEN old.vendor_id IS NOT NULL AND old.product_id IS NOT NULL BEGIN
+                UPDATE vendor_products SET
+                    orders = orders - 1,
+                    changed = CASE WHEN orders <= 1 THEN 1 ELSE changed END
+                WHERE vendor_id = old.vendor_id AND product_id = old.product_id;
+            END
+        ''')
+
+    # Existing orders; every pair starts out changed, so the first
+    # recommend.run computes everything
+    cursor.execute('DELETE FROM vendor_products')
+    cursor.execute('''
+        INSERT INTO vendor_products (vendor_id, product_id, orders)
+        SELECT vendor_id, product_id, COUNT(*)
+        FROM orders
+        WHERE vendor_id IS NOT NULL AND product_id IS NOT NULL
+        GROUP BY vendor_id, product_id
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM vendor_products')
+    progress(f'    {cursor.fetchone()[0]} vendor/product pairs')
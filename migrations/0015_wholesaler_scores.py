@@ -0,0 +1,175 @@
+"""Derive wholesalers' trust_score, response_rate and delivery_rate from running counts (see scores.py)."""
+
+from schema import add_column
+
+# Frozen copies of the scores.py settings this migration was written against.
+# scores.install() replaces the apply trigger when the formula is tuned later.
+PRIOR_WEIGHT = 5
+PRIOR_RATING = 4.0
+PRIOR_RESPONSE = 0.8
+PRIOR_DELIVERY = 0.9
+RATING_WEIGHT = 0.7
+RESPONSE_WEIGHT = 0.15
+DELIVERY_WEIGHT = 0.15
+RESPONSE_WINDOW_HOURS = 48
+
+COUNTERS = ('reviews', 'ratings', 'rating_sum', 'replied_on_time', 'orders_completed', 'orders_cancelled')
+
+REPLIED_LATENCY = {
+    'sqlite': "(julianday({row}replied_at) - julianday({row}created_at)) * 24 <= {hours}",
+    'postgresql': "{row}replied_at - {row}created_at <= INTERVAL '{hours} hours'",
+}
+
+
+def on_time(dialect, row):
+    latency = REPLIED_LATENCY[dialect].format(row=row, hours=RESPONSE_WINDOW_HOURS)
+    return (f"CASE WHEN COALESCE({row}reply, '') <> '' AND ({row}replied_at IS NULL OR {latency}) "
+            f"THEN 1 ELSE 0 END")
+
+
+def smoothed(hits, trials, prior):
+    return f'(({PRIOR_WEIGHT} * {prior} + {hits}) * 1.0 / ({PRIOR_WEIGHT} + {trials}))'
+
+
+def apply_sql(row):
+    rating = smoothed(f'{row}rating_sum', f'{row}ratings', PRIOR_RATING)
+    response = smoothed(f'{row}replied_on_time', f'{row}reviews', PRIOR_RESPONSE)
+    delivery = smoothed(f'{row}orders_completed', f'{row}orders_completed + {row}orders_cancelled', PRIOR_DELIVERY)
+    trust = f'{RATING_WEIGHT} * {rating} + 5 * ({RESPONSE_WEIGHT} * {response} + {DELIVERY_WEIGHT} * {delivery})'
+    return f'''
+        UPDATE wholesalers SET
+            trust_score = ROUND(CAST({trust} AS NUMERIC), 2),
+            response_rate = ROUND(CAST(100 * {response} AS NUMERIC), 2),
+            delivery_rate = ROUND(CAST(100 * {delivery} AS NUMERIC), 2)
+        WHERE id = {row}wholesaler_id
+    '''
+
+
+def delta_sql(values):
+    assignments = ', '.join(f'{name} = wholesaler_scores.{name} + excluded.{name}' for name in COUNTERS)
+    return f'''
+        INSERT INTO wholesaler_scores (wholesaler_id, {', '.join(COUNTERS)})
+        VALUES ({', '.join(values)})
+        ON CONFLICT (wholesaler_id) DO UPDATE SET {assignments}
+    '''
+
+
+def review_counts(dialect, row):
+    return ('1', f'CASE WHEN {row}rating IS NULL THEN 0 ELSE 1 END', f'COALESCE({row}rating, 0)',
+            on_time(dialect, row), '0', '0')
+
+
+def order_counts(row):
+    return ('0', '0', '0', '0', f"CASE WHEN {row}status = 'completed' THEN 1 ELSE 0 END",
+            f"CASE WHEN {row}status = 'cancelled' THEN 1 ELSE 0 END")
+
+
+def upgrade(cursor, progress):
+    dialect = cursor.connection.dialect
+    add_column(cursor, 'reviews', 'replied_at', 'DATETIME')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS wholesaler_scores (
+            wholesaler_id INTEGER PRIMARY KEY,
+            reviews INTEGER NOT NULL DEFAULT 0,
+            ratings INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            replied_on_time INTEGER NOT NULL DEFAULT 0,
+            orders_completed INTEGER NOT NULL DEFAULT 0,
+            orders_cancelled INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (wholesaler_id) REFERENCES wholesalers (id)
+        )
+    ''')
+
+    zero = ('0',) * len(COUNTERS)
+    review_insert = delta_sql(('new.wholesaler_id',) + review_counts(dialect, 'new.'))
+    review_delete = delta_sql(('old.wholesaler_id',) + tuple(
+        f'-({count})' for count in review_counts(dialect, 'old.')))
+    review_update = delta_sql(('new.wholesaler_id',) + tuple(
+        f'({new}) - ({old})' for new, old in zip(review_counts(dialect, 'new.'), review_counts(dialect, 'old.'))))
+    order_insert = delta_sql(('new.wholesaler_id',) + order_counts('new.'))
+    order_delete = delta_sql(('old.wholesaler_id',) + tuple(f'-({count})' for count in order_counts('old.')))
+    order_update = delta_sql(('new.wholesaler_id',) + tuple(
+        f'({new}) - ({old})' for new, old in zip(order_counts('new.'), order_counts('old.'))))
+    new_wholesaler = delta_sql(('new.id',) + zero)
+
+    if dialect == 'postgresql':
+        cursor.execute(f'''
+            CREATE OR REPLACE FUNCTION wholesaler_scores_apply() RETURNS trigger AS $$
+            BEGIN
+                {apply_sql('new.')};
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        cursor.execute(f'''
+            CREATE OR REPLACE FUNCTION wholesaler_scores_count() RETURNS trigger AS $$
+            BEGIN
+                IF TG_TABLE_NAME = 'wholesalers' THEN
+                    {new_wholesaler};
+                ELSIF TG_TABLE_NAME = 'reviews' THEN
+                    IF TG_OP = 'INSERT' THEN
+                        IF new.wholesaler_id IS NOT NULL THEN {review_insert}; END IF;
+                    ELSIF TG_OP = 'UPDATE' THEN
+                        IF new.wholesaler_id IS NOT NULL THEN {review_update}; END IF;
+                    ELSIF old.wholesaler_id IS NOT NULL THEN
+                        {review_delete};
+                    END IF;
+                ELSE
+                    IF TG_OP = 'INSERT' THEN
+                        IF new.wholesaler_id IS NOT NULL THEN {order_insert}; END IF;
+                    ELSIF TG_OP = 'UPDATE' THEN
+                        IF new.wholesaler_id IS NOT NULL THEN {order_update}; END IF;
+                    ELSIF old.wholesaler_id IS NOT NULL THEN
+                        {order_delete};
+                    END IF;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        triggers = (
+            ('wholesaler_scores_apply', 'AFTER INSERT OR UPDATE ON wholesaler_scores', 'wholesaler_scores_apply'),
+            ('wholesaler_scores_wholesaler', 'AFTER INSERT ON wholesalers', 'wholesaler_scores_count'),
+            ('wholesaler_scores_review',
+             'AFTER INSERT OR DELETE OR UPDATE OF rating, reply, replied_at ON reviews', 'wholesaler_scores_count'),
+            ('wholesaler_scores_order', 'AFTER INSERT OR DELETE OR UPDATE OF status ON orders',
+             'wholesaler_scores_count'),
+        )
+        for name, event, function in triggers:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name} ON {event.split()[-1]}')
+            cursor.execute(f'CREATE TRIGGER {name} {event} FOR EACH ROW EXECUTE FUNCTION {function}()')
+    else:
+        triggers = (
+            ('wholesaler_scores_apply_insert', 'AFTER INSERT ON wholesaler_scores', '', apply_sql('new.')),
+            ('wholesaler_scores_apply_update', 'AFTER UPDATE ON wholesaler_scores', '', apply_sql('new.')),
+            ('wholesaler_scores_wholesaler', 'AFTER INSERT ON wholesalers', '', new_wholesaler),
+            ('wholesaler_scores_review_insert', 'AFTER INSERT ON reviews', 'new', review_insert),
+            ('wholesaler_scores_review_update', 'AFTER UPDATE OF rating, reply, replied_at ON reviews', 'new',
+             review_update),
+            ('wholesaler_scores_review_delete', 'AFTER DELETE ON reviews', 'old', review_delete),
+            ('wholesaler_scores_order_insert', 'AFTER INSERT ON orders', 'new', order_insert),
+            ('wholesaler_scores_order_update', 'AFTER UPDATE OF status ON orders', 'new', order_update),
+            ('wholesaler_scores_order_delete', 'AFTER DELETE ON orders', 'old', order_delete),
+        )
+        for name, event, row, body in triggers:
+            when = f'WHEN {row}.wholesaler_id IS NOT NULL ' if row else ''
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event} {when}BEGIN {body}; END')
+
+    # Count the existing history; already inside the migration's transaction.
+    # The upsert fires the apply trigger, which fills in the derived figures.
+    assignments = ', '.join(f'{name} = excluded.{name}' for name in COUNTERS)
+    cursor.execute(f'''
+        INSERT INTO wholesaler_scores (wholesaler_id, {', '.join(COUNTERS)})
+        SELECT w.id,
+            (SELECT COUNT(*) FROM reviews r WHERE r.wholesaler_id = w.id),
+            (SELECT COUNT(r.rating) FROM reviews r WHERE r.wholesaler_id = w.id),
+            (SELECT COALESCE(SUM(r.rating), 0) FROM reviews r WHERE r.wholesaler_id = w.id),
+            (SELECT COALESCE(SUM({on_time(dialect, 'r.')}), 0) FROM reviews r WHERE r.wholesaler_id = w.id),
+            (SELECT COUNT(*) FROM orders o WHERE o.wholesaler_id = w.id AND o.status = 'completed'),
+            (SELECT COUNT(*) FROM orders o WHERE o.wholesaler_id = w.id AND o.status = 'cancelled')
+        FROM wholesalers w
+        WHERE true  -- SQLite needs a WHERE before ON CONFLICT in INSERT ... SELECT
+        ON CONFLICT (wholesaler_id) DO UPDATE SET {assignments}
+    ''')
+    cursor.execute('SELECT COUNT(*) FROM wholesaler_scores')
+    progress(f'    scored {cursor.fetchone()[0]} wholesalers')
@@ -0,0 +1,56 @@
+"""Stored, weighted search vector on PostgreSQL that includes the shop name, like products_fts on SQLite."""
+
+from schema import add_column
+
+# Weights mirror search.BM25_WEIGHTS: name A, category B, shop_name C, description D
+SEARCH_VECTOR = '''
+    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(NEW.category, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce((SELECT shop_name FROM wholesalers WHERE id = NEW.wholesaler_id), '')),
+              'C') ||
+    setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'D')
+'''
+
+
+def upgrade(cursor, progress):
+    # SQLite already indexes shop_name in products_fts (migration 0006)
+    if cursor.connection.dialect != 'postgresql':
+        return
+
+    add_column(cursor, 'products', 'search_vector', 'tsvector')
+    # Touching search_vector re-derives it, which is how a shop rename is applied
+    cursor.execute(f'''
+        CREATE OR REPLACE FUNCTION products_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('DROP TRIGGER IF EXISTS products_search_vector ON products')
+    cursor.execute('''
+        CREATE TRIGGER products_search_vector
+        BEFORE INSERT OR UPDATE OF name, category, description, wholesaler_id, search_vector ON products
+        FOR EACH ROW EXECUTE FUNCTION products_search_vector()
+    ''')
+    cursor.execute('''
+        CREATE OR REPLACE FUNCTION wholesalers_search_shop_name() RETURNS trigger AS $$
+        BEGIN
+            UPDATE products SET search_vector = NULL WHERE wholesaler_id = NEW.id;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    cursor.execute('DROP TRIGGER IF EXISTS wholesalers_search_shop_name ON wholesalers')
+    cursor.execute('''
+        CREATE TRIGGER wholesalers_search_shop_name
+        AFTER UPDATE OF shop_name ON wholesalers
+        FOR EACH ROW WHEN (OLD.shop_name IS DISTINCT FROM NEW.shop_name)
+        EXECUTE FUNCTION wholesalers_search_shop_name()
+    ''')
+
+    cursor.execute('UPDATE products SET search_vector = NULL')
+    progress(f'    indexed {cursor.rowcount} products')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_search_vector ON products USING GIN (search_vector)')
+    # The expression index from migration 0006 left out shop_name
+    cursor.execute('DROP INDEX IF EXISTS idx_products_search')
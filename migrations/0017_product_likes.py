@@ -0,0 +1,16 @@
+"""One like per vendor and product: product_likes keyed by (vendor_id, product_id)."""
+
+
+def upgrade(cursor, progress):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_likes (
+            vendor_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (vendor_id, product_id),
+            FOREIGN KEY (vendor_id) REFERENCES vendors (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+    # delete_product clears the product's likes
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_product_likes_product ON product_likes (product_id)')
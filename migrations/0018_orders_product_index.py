@@ -0,0 +1,6 @@
+"""Index orders by product, for delete_product's "has it been ordered" check."""
+
+
+def upgrade(cursor, progress):
+    # delete_product: WHERE product_id = ? (also backs the products foreign key on PostgreSQL)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_product ON orders (product_id)')
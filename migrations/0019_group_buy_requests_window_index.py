@@ -0,0 +1,9 @@
+"""Extend the group-buy pool index with created_at, for the current-window filter."""
+
+
+def upgrade(cursor, progress):
+    # groupbuy.pool_status: WHERE product_id = ? AND location = ? AND status = 'open'
+    #                       AND created_at >= ? AND created_at < ?
+    cursor.execute('DROP INDEX IF EXISTS idx_group_buy_requests_pool')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_group_buy_requests_window '
+                   'ON group_buy_requests (product_id, location, status, created_at)')
@@ -0,0 +1,170 @@
+# models.py
+# Row models for what the pages read.
+#
+# Each model is a NamedTuple whose fields are exactly the columns one kind of
+# page renders, in the SELECT's column order. Queries list those columns
+# instead of SELECT *, and templates use attribute access (product.name)
+# rather than positions that shift whenever a migration adds a column.
+# NamedTuples are plain tuples underneath: no per-row __dict__, cheap to
+# build from cursor rows.
+
+from typing import NamedTuple, Optional
+
+
+def fetch_all(cursor, model):
+    return [model._make(row) for row in cursor.fetchall()]
+
+
+def fetch_one(cursor, model):
+    row = cursor.fetchone()
+    return model._make(row) if row is not None else None
+
+
+# Products ------------------------------------------------------------------
+
+class CatalogProduct(NamedTuple):
+    """A product card on the vendor category pages, with its seller."""
+    id: int
+    name: str
+    category: Optional[str]
+    price: float
+    stock: int
+    image_path: Optional[str]
+    shop_name: Optional[str]
+    location: Optional[str]
+    trust_score: Optional[float]
+    group_buy_eligible: Optional[bool]
+
+
+class Recommendation(NamedTuple):
+    """A "vendors like you also buy" card on the vendor dashboard (see recommend.py)."""
+    id: int
+    name: str
+    price: float
+    image_path: Optional[str]
+    shop_name: Optional[str]
+
+
+class SearchHit(NamedTuple):
+    """A CatalogProduct from /vendor/search, with its rank and snippet."""
+    id: int
+    name: str
+    category: Optional[str]
+    price: float
+    stock: int
+    image_path: Optional[str]
+    shop_name: Optional[str]
+    location: Optional[str]
+    trust_score: Optional[float]
+    score: float
+    snippet: Optional[str]
+
+
+class InventoryProduct(NamedTuple):
+    """A product on the wholesaler's own product grid and dashboard."""
+    id: int
+    name: str
+    category: Optional[str]
+    price: float
+    stock: int
+    image_path: Optional[str]
+    views: int
+    likes: int
+    status: Optional[str]
+    created_at: str
+
+
+class ProductForm(NamedTuple):
+    """The editable fields of a product, and the version they were read at."""
+    id: int
+    name: str
+    category: Optional[str]
+    price: float
+    stock: int
+    image_path: Optional[str]
+    version: int
+
+
+class RestockAlert(NamedTuple):
+    """A product whose stock is low or will not cover next week's forecast demand."""
+    id: int
+    name: str
+    stock: int
+    status: Optional[str]
+    forecast: Optional[float]   # units expected over the next forecast.HORIZON_DAYS, None before the first run
+    method: Optional[str]
+
+
+# Orders --------------------------------------------------------------------
+
+class OrderLine(NamedTuple):
+    """An order in a listing; party_name is the other side of the order."""
+    id: int
+    quantity: int
+    total_amount: Optional[float]
+    status: Optional[str]
+    created_at: str
+    party_name: Optional[str]
+    product_name: Optional[str]
+
+
+class GroupBuyRequest(NamedTuple):
+    """A vendor's share of a group buy; order_status is the consolidated order's once pooled."""
+    id: int
+    product_name: str
+    location: str
+    quantity: int
+    status: str
+    unit_price: Optional[float]
+    order_status: Optional[str]
+    created_at: str
+
+
+# Reviews -------------------------------------------------------------------
+
+class Review(NamedTuple):
+    id: int
+    rating: int
+    comment: Optional[str]
+    reply: Optional[str]
+    vendor_name: str
+    created_at: str
+
+
+# Wholesalers and vendors -----------------------------------------------------
+
+class WholesalerProfile(NamedTuple):
+    id: int
+    name: str
+    phone: str
+    shop_name: str
+    id_doc_path: Optional[str]
+    license_doc_path: Optional[str]
+    sourcing_info: Optional[str]
+    location: Optional[str]
+    trust_score: Optional[float]
+    response_rate: Optional[float]
+    delivery_rate: Optional[float]
+    created_at: str
+    profile_photo: Optional[str]
+
+
+class WholesalerApplication(NamedTuple):
+    """A pending wholesaler as the admin reviews it."""
+    id: int
+    name: str
+    phone: str
+    shop_name: str
+    id_doc_path: Optional[str]
+    license_doc_path: Optional[str]
+    sourcing_info: Optional[str]
+    location: Optional[str]
+    created_at: str
+
+
+class Credentials(NamedTuple):
+    """What the login forms check, for vendors and wholesalers alike."""
+    id: int
+    name: str
+    password: Optional[str]
+    is_approved: bool
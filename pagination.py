@@ -0,0 +1,135 @@
+# pagination.py
+# Keyset (cursor) pagination for the long listings.
+#
+# Every paginated listing orders by a unique key such as (name, id) or
+# (created_at, id) and reads the page after a boundary with
+# WHERE (name, id) > (?, ?), so the hundredth page is the same index range
+# scan as the first, unlike OFFSET. Cursors are opaque URL-safe tokens that
+# hold the boundary row's key.
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import request, url_for
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# Boundaries that sort before every row, for the first page of a listing
+FIRST_ASCENDING_TEXT = ('', 0)
+FIRST_DESCENDING_TIME = ('9999-12-31 23:59:59', 2 ** 62)
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip('=')
+
+
+def _is_timestamp(value):
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _fits(value, boundary):
+    """value can stand in the key position that boundary occupies.
+
+    Beyond the type, rules out values PostgreSQL refuses to compare: text
+    that is not a timestamp against created_at, NUL characters, and numbers
+    outside BIGINT range (or not finite).
+    """
+    if isinstance(value, bool):
+        return False
+    if isinstance(boundary, float):
+        return isinstance(value, (int, float)) and abs(value) < 2 ** 63
+    if isinstance(boundary, int):
+        return isinstance(value, int) and abs(value) < 2 ** 63
+    if not isinstance(value, str) or '\x00' in value:
+        return False
+    return _is_timestamp(value) or not _is_timestamp(boundary)
+
+
+def decode_cursor(token, first):
+    """Key tuple for token, or None for a missing or malformed cursor.
+
+    A well-formed key matches first, the listing's first-page boundary: as
+    many values, each of the same type. Anything else, such as a cursor from
+    another listing or a hand-edited one, also gives None (the first page).
+    """
+    if not token:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(key, list) or len(key) != len(first):
+        return None
+    if not all(_fits(value, boundary) for value, boundary in zip(key, first)):
+        return None
+    return tuple(key)
+
+
+def page_size(default=DEFAULT_PAGE_SIZE):
+    """?limit= from the request, clamped to 1..MAX_PAGE_SIZE."""
+    return min(max(request.args.get('limit', default, type=int), 1), MAX_PAGE_SIZE)
+
+
+def wants_json():
+    return request.args.get('format') == 'json'
+
+
+class Page:
+    """One page of row models plus the cursors for its neighbours."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def as_json(self, **extra):
+        return dict(extra,
+                    items=[row._asdict() for row in self.items],
+                    next=self.next_cursor,
+                    prev=self.prev_cursor)
+
+
+def fetch_page(cursor, forward_sql, backward_sql, params, model, key, first, limit):
+    """Run one page of a keyset listing for the current request's cursor.
+
+    forward_sql returns the rows after a boundary in listing order and
+    backward_sql the rows before it in reverse order; both take params, then
+    the boundary key, then a LIMIT. Rows become model instances (see
+    models.py); key(row) returns a row's sort key, and first is a boundary
+    that sorts before every row.
+    """
+    after = decode_cursor(request.args.get('after'), first)
+    before = decode_cursor(request.args.get('before'), first)
+    if before is not None:
+        cursor.execute(backward_sql, (*params, *before, limit + 1))
+        rows = [model._make(row) for row in cursor.fetchall()]
+        has_prev, has_next = len(rows) > limit, True
+        rows = rows[:limit][::-1]
+    else:
+        cursor.execute(forward_sql, (*params, *(after or first), limit + 1))
+        rows = [model._make(row) for row in cursor.fetchall()]
+        has_prev, has_next = after is not None, len(rows) > limit
+        rows = rows[:limit]
+
+    return Page(rows,
+                next_cursor=encode_cursor(key(rows[-1])) if rows and has_next else None,
+                prev_cursor=encode_cursor(key(rows[0])) if rows and has_prev else None)
+
+
+def page_url(**cursor):
+    """URL of the current listing with after=/before= replaced by cursor."""
+    args = {name: value for name, value in request.args.items() if name not in ('after', 'before')}
+    return url_for(request.endpoint, **(request.view_args or {}), **args, **cursor)
@@ -0,0 +1,36 @@
+# pool_group_buys.py
+# Close the group-buy window: turn each club's open requests into one
+# consolidated order per product (see groupbuy.py).
+#
+# Run at every window boundary (groupbuy.WINDOW, on the hour from midnight
+# UTC), e.g. from cron. Running more often is harmless: requests of the
+# current window are left alone.
+#
+#   python pool_group_buys.py
+
+import sys
+import time
+
+import db
+import groupbuy
+import schema
+
+
+def main(argv):
+    conn = db.connect()
+    try:
+        if not schema.is_current(conn):
+            print('Database schema is out of date, run "python migrate.py" first')
+            return 1
+        started = time.perf_counter()
+        summary = groupbuy.pool(conn)
+        print(f'✅ Pooled {summary["requests"]} request(s) into {summary["group_buys"]} group buy(s) '
+              f'up to {summary["window_end"]} in {time.perf_counter() - started:.2f}s'
+              + (f', cancelled {summary["cancelled"]}' if summary['cancelled'] else ''))
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,250 @@
+# recommend.py
+# "Vendors like you also buy" recommendations from order co-occurrence.
+#
+# vendor_products (migration 0014) is the sparse vendor x product matrix: one
+# row per product a vendor has ordered, kept current by triggers on orders.
+# run() turns it into two precomputed tables:
+#
+#   product_similarities     each product's SIMILAR_PRODUCTS nearest products by
+#                            cosine similarity of their buyer sets
+#   vendor_recommendations   each vendor's RECOMMENDATIONS best products they
+#                            have not ordered, scored by summing the
+#                            similarity rows of everything they have
+#
+# so the vendor dashboard reads a vendor's list with one primary-key lookup.
+#
+# The matrix is held as CSR-style index arrays (by vendor and by product) and
+# co-occurrence counts are built BATCH_CELLS at a time with bincount, so
+# memory stays flat however large the catalog is.
+#
+# Runs are incremental. Triggers flag pairs that appear or disappear, and
+# only the products whose similarity row can have changed are recomputed:
+# the flagged products and everything co-purchased with them. Only their
+# buyers' recommendations are refreshed.
+
+import numpy as np
+
+SIMILAR_PRODUCTS = 20
+RECOMMENDATIONS = 12
+# Dense co-occurrence cells (rows x products) per batch
+BATCH_CELLS = 4_000_000
+
+PAIRS_SQL = 'SELECT vendor_id, product_id, orders, changed FROM vendor_products'
+
+SIMILARITIES_SQL = 'SELECT product_id, similar_id, score FROM product_similarities'
+
+INSERT_SIMILARITY_SQL = 'INSERT INTO product_similarities (product_id, similar_id, score) VALUES (?, ?, ?)'
+
+INSERT_RECOMMENDATION_SQL = '''
+    INSERT INTO vendor_recommendations (vendor_id, rank, product_id, score)
+    VALUES (?, ?, ?, ?)
+'''
+
+# Clear a flag only if the pair is still in the state this run saw
+SEEN_SQL = '''
+    UPDATE vendor_products SET changed = 0
+    WHERE vendor_id = ? AND product_id = ? AND changed = 1 AND (CASE WHEN orders > 0 THEN 1 ELSE 0 END) = ?
+'''
+
+GONE_SQL = 'DELETE FROM vendor_products WHERE vendor_id = ? AND product_id = ? AND orders <= 0'
+
+
+class Matrix:
+    """A binary vendor x product matrix in compressed-row form, both ways round."""
+
+    def __init__(self, vendor_ids, product_ids):
+        self.vendor_ids, vendor = np.unique(np.asarray(vendor_ids, dtype=np.int64), return_inverse=True)
+        self.product_ids, product = np.unique(np.asarray(product_ids, dtype=np.int64), return_inverse=True)
+        order = np.lexsort((product, vendor))
+        self.vendor_products = product[order]
+        self.vendor_ptr = np.searchsorted(vendor[order], np.arange(len(self.vendor_ids) + 1))
+        order = np.lexsort((vendor, product))
+        self.product_vendors = vendor[order]
+        self.product_ptr = np.searchsorted(product[order], np.arange(len(self.product_ids) + 1))
+        self.buyers = np.diff(self.product_ptr)
+
+    def vendor_index(self, vendor_ids):
+        return _index(self.vendor_ids, vendor_ids)
+
+    def product_index(self, product_ids):
+        return _index(self.product_ids, product_ids)
+
+    def products_of(self, vendors):
+        """(position in vendors, product index) for every product each vendor index has."""
+        return _expand(self.vendor_ptr, self.vendor_products, vendors)
+
+    def vendors_of(self, products):
+        """(position in products, vendor index) for every buyer of each product index."""
+        return _expand(self.product_ptr, self.product_vendors, products)
+
+
+def _index(sorted_ids, ids):
+    """Positions of the ids that are in sorted_ids."""
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(sorted_ids) == 0:
+        return np.zeros(0, dtype=np.int64)
+    position = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return np.unique(position[sorted_ids[position] == ids])
+
+
+def _expand(ptr, members, rows):
+    """Concatenate the compressed rows `rows`: (position in rows, member) pairs."""
+    rows = np.asarray(rows, dtype=np.int64)
+    lengths = ptr[rows + 1] - ptr[rows]
+    owner = np.repeat(np.arange(len(rows)), lengths)
+    starts = np.repeat(ptr[rows] - (np.cumsum(lengths) - lengths), lengths)
+    return owner, members[starts + np.arange(lengths.sum())]
+
+
+def _top(scores, k):
+    """(row, column, score) of each row's k highest positive scores, best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    columns = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best = np.take_along_axis(scores, columns, axis=1)
+    order = np.argsort(-best, axis=1, kind='stable')
+    columns, best = np.take_along_axis(columns, order, axis=1), np.take_along_axis(best, order, axis=1)
+    rows = np.repeat(np.arange(scores.shape[0]), k).reshape(-1, k)
+    keep = best > 0
+    return rows[keep], columns[keep], best[keep]
+
+
+def _batches(items, width):
+    size = max(1, BATCH_CELLS // max(width, 1))
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def similar_products(matrix, products):
+    """Each product index's SIMILAR_PRODUCTS most similar products: (product, similar, score) index arrays."""
+    width = len(matrix.product_ids)
+    found = []
+    for batch in _batches(products, width):
+        owner, vendors = matrix.vendors_of(batch)
+        position, similar = matrix.products_of(vendors)
+        counts = np.bincount(owner[position] * width + similar, minlength=len(batch) * width)
+        counts = counts.reshape(len(batch), width).astype(float)
+        counts[np.arange(len(batch)), batch] = 0
+        scores = counts / np.sqrt(np.outer(matrix.buyers[batch], matrix.buyers))
+        rows, columns, best = _top(scores, SIMILAR_PRODUCTS)
+        # As stored, so fresh and stored rows score vendors identically
+        found.append((batch[rows], columns, best.round(6)))
+    if not found:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    return tuple(np.concatenate(parts) for parts in zip(*found))
+
+
+def recommendations(matrix, similarities, vendors):
+    """Each vendor index's RECOMMENDATIONS best unordered products: (vendor, rank, product, score) arrays.
+
+    similarities is (product, similar, score) index arrays covering every product.
+    """
+    width = len(matrix.product_ids)
+    product, similar, score = similarities
+    order = np.lexsort((similar, product))
+    similar, score = similar[order], score[order]
+    ptr = np.searchsorted(product[order], np.arange(width + 1))
+    found = []
+    for batch in _batches(vendors, width):
+        owner, bought = matrix.products_of(batch)
+        position, neighbours = _expand(ptr, similar, bought)
+        _, weights = _expand(ptr, score, bought)
+        scores = np.bincount(owner[position] * width + neighbours, weights=weights, minlength=len(batch) * width)
+        scores = scores.reshape(len(batch), width)
+        scores[owner, bought] = 0
+        rows, columns, best = _top(scores, RECOMMENDATIONS)
+        ranks = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        found.append((batch[rows], ranks + 1, columns, best))
+    if not found:
+        return (np.zeros(0, dtype=np.int64),) * 3 + (np.zeros(0),)
+    return tuple(np.concatenate(parts) for parts in zip(*found))
+
+
+def _stored_similarities(rows, matrix, replaced):
+    """product_similarities rows of products not in `replaced`, as matrix index arrays."""
+    ids = matrix.product_ids
+    if not rows or not len(ids):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    product_ids, similar_ids, scores = (np.array(column) for column in zip(*rows))
+    product = np.minimum(np.searchsorted(ids, product_ids), len(ids) - 1)
+    similar = np.minimum(np.searchsorted(ids, similar_ids), len(ids) - 1)
+    keep = (ids[product] == product_ids) & (ids[similar] == similar_ids) & ~np.isin(product, replaced)
+    return product[keep], similar[keep], scores[keep].astype(float)
+
+
+def _diff(stored, computed, keys):
+    """Which of keys (first column) have different rows in stored and computed, and their computed rows."""
+    keys = set(keys)
+    differ = {row[0] for row in {row for row in stored if row[0] in keys} ^ set(computed)}
+    return differ, [row for row in computed if row[0] in differ]
+
+
+def run(conn, progress=print):
+    """Bring the similarity and recommendation tables up to date with vendor_products.
+
+    Returns {'products', 'vendors'}: how many products' similarity rows and
+    vendors' lists changed.
+    """
+    cursor = conn.cursor()
+    cursor.execute(PAIRS_SQL)
+    rows = cursor.fetchall()
+    if not rows:
+        return {'products': 0, 'vendors': 0}
+    vendor_ids, product_ids, orders, changed = (np.array(column, dtype=np.int64) for column in zip(*rows))
+    live, flagged = orders > 0, changed == 1
+    if not flagged.any():
+        return {'products': 0, 'vendors': 0}
+    matrix = Matrix(vendor_ids[live], product_ids[live])
+
+    # A flagged pair changes its product's buyer count, so the similarity of
+    # that product to everything its buyers order, and co-counts among the
+    # flagged vendor's products
+    flagged_vendors = matrix.vendor_index(vendor_ids[flagged])
+    flagged_products = matrix.product_index(product_ids[flagged])
+    _, buyers = matrix.vendors_of(flagged_products)
+    _, affected = matrix.products_of(np.union1d(buyers, flagged_vendors))
+    affected = np.union1d(affected, flagged_products)
+    similarities = similar_products(matrix, affected)
+    progress(f'    recomputed {len(affected)} product similarity rows')
+
+    # Their buyers' lists, from the merged similarity rows
+    cursor.execute(SIMILARITIES_SQL)
+    stored_similarities = cursor.fetchall()
+    merged = tuple(np.concatenate(parts)
+                   for parts in zip(_stored_similarities(stored_similarities, matrix, affected), similarities))
+    _, refresh = matrix.vendors_of(affected)
+    refresh = np.union1d(refresh, flagged_vendors)
+    vendor, rank, product, score = recommendations(matrix, merged, refresh)
+    progress(f'    recomputed {len(refresh)} vendor recommendation lists')
+
+    # Only rows that came out different are rewritten; rows of products and
+    # vendors without any orders left are dropped
+    changed_products, similarity_rows = _diff(
+        stored_similarities,
+        list(zip(matrix.product_ids[similarities[0]].tolist(), matrix.product_ids[similarities[1]].tolist(),
+                 similarities[2].tolist())),
+        np.union1d(matrix.product_ids[affected], product_ids[flagged]).tolist())
+    cursor.execute('SELECT vendor_id, rank, product_id, score FROM vendor_recommendations')
+    changed_vendors, recommendation_rows = _diff(
+        cursor.fetchall(),
+        list(zip(matrix.vendor_ids[vendor].tolist(), rank.tolist(), matrix.product_ids[product].tolist(),
+                 score.round(6).tolist())),
+        np.union1d(matrix.vendor_ids[refresh], vendor_ids[flagged]).tolist())
+
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.executemany('DELETE FROM product_similarities WHERE product_id = ?',
+                           [(product_id,) for product_id in changed_products])
+        cursor.executemany(INSERT_SIMILARITY_SQL, similarity_rows)
+        cursor.executemany('DELETE FROM vendor_recommendations WHERE vendor_id = ?',
+                           [(vendor_id,) for vendor_id in changed_vendors])
+        cursor.executemany(INSERT_RECOMMENDATION_SQL, recommendation_rows)
+        cursor.executemany(SEEN_SQL, zip(vendor_ids[flagged].tolist(), product_ids[flagged].tolist(),
+                                         live[flagged].astype(int).tolist()))
+        cursor.executemany(GONE_SQL, zip(vendor_ids[flagged & ~live].tolist(), product_ids[flagged & ~live].tolist()))
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    return {'products': len(changed_products), 'vendors': len(changed_vendors)}
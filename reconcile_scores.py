@@ -0,0 +1,38 @@
+# reconcile_scores.py
+# Recount every wholesaler's score counters from reviews and orders (see scores.py).
+#
+# Run nightly, e.g. from cron. The triggers keep the counters current as
+# things happen; this catches anything they could not see, such as rows
+# changed by hand, and reports how many wholesalers it had to correct.
+# It also applies the current formula in scores.py to every wholesaler, so
+# run it once after tuning the settings there.
+#
+#   python reconcile_scores.py [--chunk N]
+
+import sys
+import time
+
+import db
+import schema
+import scores
+
+
+def main(argv):
+    chunk_size = scores.DEFAULT_CHUNK_SIZE
+    if '--chunk' in argv:
+        chunk_size = int(argv[argv.index('--chunk') + 1])
+    conn = db.connect()
+    try:
+        if not schema.is_current(conn):
+            print('Database schema is out of date, run "python migrate.py" first')
+            return 1
+        started = time.perf_counter()
+        checked, corrected = scores.reconcile(conn, chunk_size, progress=print)
+        print(f'✅ Checked {checked} wholesaler(s), corrected {corrected}, in {time.perf_counter() - started:.2f}s')
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
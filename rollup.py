@@ -0,0 +1,113 @@
+# rollup.py
+# Per-wholesaler daily order totals in the analytics table.
+#
+# analytics holds one row per (wholesaler_id, date): orders placed that day,
+# revenue from those of them that are completed, and distinct vendors who
+# ordered. analytics_customers keeps the per-vendor order counts behind the
+# distinct count, and analytics_products the same totals plus quantity per
+# product (analytics.py). Triggers on orders (migrations 0010 and 0011) keep
+# them current on every insert, status/amount change and delete, whichever
+# code path makes it, so the analytics page only ever reads these
+# precomputed rows.
+#
+# rebuild() recomputes wholesalers from their orders; backfill() runs it over
+# every wholesaler in chunks, see backfill_analytics.py.
+
+# Calendar day of an order, as stored in analytics.date
+ORDER_DAY = {
+    'sqlite': 'date(created_at)',
+    'postgresql': 'CAST(created_at AS DATE)',
+}
+
+# Revenue an order contributes: its amount once completed
+REVENUE = "CASE WHEN status = 'completed' THEN COALESCE(total_amount, 0) ELSE 0 END"
+
+DEFAULT_CHUNK_SIZE = 50
+
+ROLLUP_TABLES = ('analytics', 'analytics_customers', 'analytics_products')
+
+
+# {dialect: {table: INSERT ... SELECT recomputing its rows}}; the {} takes
+# the placeholders for a chunk of wholesaler ids
+REBUILD_SQL = {
+    dialect: {
+        'analytics_customers': f'''
+        INSERT INTO analytics_customers (wholesaler_id, date, vendor_id, orders)
+        SELECT wholesaler_id, {day}, COALESCE(vendor_id, 0), COUNT(*)
+        FROM orders
+        WHERE wholesaler_id IN ({{}})
+        GROUP BY wholesaler_id, {day}, COALESCE(vendor_id, 0)
+        ''',
+        'analytics': f'''
+        INSERT INTO analytics (wholesaler_id, date, total_orders, total_revenue, active_customers)
+        SELECT wholesaler_id, {day}, COUNT(*), SUM({REVENUE}), COUNT(DISTINCT COALESCE(vendor_id, 0))
+        FROM orders
+        WHERE wholesaler_id IN ({{}})
+        GROUP BY wholesaler_id, {day}
+        ''',
+        'analytics_products': f'''
+        INSERT INTO analytics_products (wholesaler_id, date, product_id, orders, quantity, revenue)
+        SELECT wholesaler_id, {day}, COALESCE(product_id, 0), COUNT(*), SUM(COALESCE(quantity, 0)), SUM({REVENUE})
+        FROM orders
+        WHERE wholesaler_id IN ({{}})
+        GROUP BY wholesaler_id, {day}, COALESCE(product_id, 0)
+        ''',
+    }
+    for dialect, day in ORDER_DAY.items()
+}
+
+CLEAR_SQL = {table: f'DELETE FROM {table} WHERE wholesaler_id IN ({{}})' for table in ROLLUP_TABLES}
+
+
+def rebuild(cursor, dialect, wholesaler_ids, tables=ROLLUP_TABLES):
+    """Recompute the rollup rows of wholesaler_ids from orders. Does not commit."""
+    if not wholesaler_ids:
+        return
+    placeholders = ', '.join('?' * len(wholesaler_ids))
+    for table in tables:
+        cursor.execute(CLEAR_SQL[table].format(placeholders), tuple(wholesaler_ids))
+        cursor.execute(REBUILD_SQL[dialect][table].format(placeholders), tuple(wholesaler_ids))
+
+
+def backfill(conn, chunk_size=DEFAULT_CHUNK_SIZE, progress=print):
+    """Rebuild every wholesaler's rollup, chunk_size wholesalers per transaction.
+
+    Each chunk is replaced inside one BEGIN IMMEDIATE, so orders written
+    meanwhile are either in the recomputed rows or applied by the triggers
+    afterwards, never both. Returns the number of wholesalers rebuilt.
+    """
+    cursor = conn.cursor()
+    done, last_id = 0, 0
+    while True:
+        cursor.execute('SELECT id FROM wholesalers WHERE id > ? ORDER BY id LIMIT ?', (last_id, chunk_size))
+        wholesaler_ids = [row[0] for row in cursor.fetchall()]
+        if not wholesaler_ids:
+            return done
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            rebuild(cursor, conn.dialect, wholesaler_ids)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        done += len(wholesaler_ids)
+        last_id = wholesaler_ids[-1]
+        progress(f'    rebuilt {done} wholesalers (up to id {last_id})')
+
+
+def summarize(rows):
+    """Totals over (date, total_orders, total_revenue, active_customers) rows."""
+    orders = sum(row[1] or 0 for row in rows)
+    revenue = sum(row[2] or 0 for row in rows)
+    return {
+        'orders': orders,
+        'revenue': revenue,
+        'average_order_value': revenue / orders if orders else 0,
+    }
+
+
+def percent_change(current, previous):
+    """Change from previous to current in percent, or None without a baseline."""
+    if not previous:
+        return None
+    return (current - previous) * 100.0 / previous
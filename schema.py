@@ -0,0 +1,131 @@
+# schema.py
+# Versioned schema migrations and the managed index set.
+#
+# Migrations live in migrations/ as NNNN_description.py files, each with an
+# upgrade(cursor, progress) function, and are applied in order. The
+# schema_version table records what has run, so an up-to-date database costs
+# a single SELECT at boot. Run pending migrations offline with migrate.py.
+
+import importlib.util
+import os
+import time
+
+from db import DatabaseError
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Secondary indexes for the hot lookups in app.py, built by migration 0005.
+# Each one is named after the query it serves so check_query_plans.py
+# failures are easy to trace. New indexes belong in a new migration.
+INDEXES = [
+    # wholesaler_orders / get_dashboard_stats: WHERE wholesaler_id = ? ORDER BY created_at
+    ('idx_orders_wholesaler_created', 'orders', ('wholesaler_id', 'created_at')),
+    # get_dashboard_stats pending count: WHERE wholesaler_id = ? AND status = 'pending'
+    ('idx_orders_wholesaler_status', 'orders', ('wholesaler_id', 'status')),
+    # vendor_dashboard recent orders / vendor_orders: WHERE vendor_id = ? ORDER BY created_at
+    ('idx_orders_vendor_created', 'orders', ('vendor_id', 'created_at')),
+    # vendor_category: WHERE category = ? ORDER BY name (also serves DISTINCT category)
+    ('idx_products_category_name', 'products', ('category', 'name')),
+    # wholesaler_products / wholesaler_dashboard: WHERE wholesaler_id = ? ORDER BY created_at
+    ('idx_products_wholesaler_created', 'products', ('wholesaler_id', 'created_at')),
+    # vendor_dashboard top products per wholesaler: ORDER BY views DESC
+    ('idx_products_wholesaler_views', 'products', ('wholesaler_id', 'views')),
+    # wholesaler_dashboard recent reviews: WHERE wholesaler_id = ? ORDER BY created_at
+    ('idx_reviews_wholesaler_created', 'reviews', ('wholesaler_id', 'created_at')),
+    # vendor_login: WHERE phone = ?
+    ('idx_vendors_phone', 'vendors', ('phone',)),
+    # wholesaler_analytics: WHERE wholesaler_id = ? ORDER BY date
+    ('idx_analytics_wholesaler_date', 'analytics', ('wholesaler_id', 'date')),
+    # vendor_dashboard top wholesalers: WHERE is_approved = 1 ORDER BY trust_score
+    ('idx_wholesalers_approved_trust', 'wholesalers', ('is_approved', 'trust_score')),
+]
+
+
+def _quiet(message):
+    pass
+
+
+def create_indexes(cursor, indexes=INDEXES, progress=_quiet):
+    """Create any missing secondary indexes."""
+    for name, table, columns in indexes:
+        started = time.perf_counter()
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})')
+        progress(f'    index {name} on {table} ({time.perf_counter() - started:.2f}s)')
+
+
+def add_column(cursor, table, column, declaration):
+    """ALTER TABLE ADD COLUMN unless a pre-migration database already has it."""
+    if cursor.connection.dialect == 'postgresql':
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {declaration}')
+        return
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Return [(version, name, module)] sorted by version."""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.py') or not filename[:4].isdigit():
+            continue
+        name = filename[:-3]
+        spec = importlib.util.spec_from_file_location(f'migrations.{name}', os.path.join(directory, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        migrations.append((int(name[:4]), name, module))
+    return migrations
+
+
+def latest_version(directory=MIGRATIONS_DIR):
+    # Version comes from the filename, no need to import the modules
+    versions = [int(f[:4]) for f in os.listdir(directory) if f.endswith('.py') and f[:4].isdigit()]
+    return max(versions, default=0)
+
+
+def current_version(conn):
+    try:
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    except DatabaseError:
+        conn.rollback()  # clears the aborted transaction on PostgreSQL
+        return 0  # schema_version not created yet
+    return row[0] or 0
+
+
+def is_current(conn):
+    return current_version(conn) >= latest_version()
+
+
+def migrate(conn, progress=_quiet):
+    """Apply pending migrations, each in its own transaction. Returns the count applied."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    version = current_version(conn)
+    pending = [m for m in load_migrations() if m[0] > version]
+    if not pending:
+        progress(f'Schema is current (version {version})')
+        return 0
+
+    cursor = conn.cursor()
+    for number, (version, name, module) in enumerate(pending, 1):
+        progress(f'[{number}/{len(pending)}] applying {name}')
+        started = time.perf_counter()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            module.upgrade(cursor, progress)
+            cursor.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        progress(f'[{number}/{len(pending)}] {name} done in {time.perf_counter() - started:.2f}s')
+
+    # Refresh planner statistics so the new indexes get used
+    cursor.execute('ANALYZE' if conn.dialect == 'postgresql' else 'PRAGMA optimize')
+    return len(pending)
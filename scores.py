@@ -0,0 +1,207 @@
+# scores.py
+# Wholesaler trust_score, response_rate and delivery_rate, derived from activity.
+#
+# wholesaler_scores keeps running counts per wholesaler: reviews, their
+# ratings, replies made within RESPONSE_WINDOW_HOURS, and orders closed as
+# completed or cancelled. Triggers on reviews and orders (migration 0015)
+# add each change's delta, and a trigger on wholesaler_scores writes the
+# derived figures back onto the wholesalers row. So the storefront ranking
+# (ORDER BY trust_score) and every page reading those columns stay current,
+# and nothing aggregates history per request.
+#
+# Each figure is smoothed towards a prior worth PRIOR_WEIGHT observations,
+# so one early review or order does not swing a new wholesaler to an
+# extreme:
+#
+#   rating         (PRIOR_WEIGHT * PRIOR_RATING + sum of ratings) / (PRIOR_WEIGHT + ratings)
+#   response_rate  % of reviews replied to within the window (same smoothing)
+#   delivery_rate  % of closed orders that were completed (same smoothing)
+#   trust_score    RATING_WEIGHT of the rating plus the rest from the two rates, out of 5
+#
+# reconcile() recounts from reviews and orders and fixes any drift; run it
+# nightly with reconcile_scores.py. It also reinstalls the trigger holding
+# the formula (install()) and rewrites every wholesaler's figures, so after
+# tuning the settings below run it once to apply them.
+
+PRIOR_WEIGHT = 5
+PRIOR_RATING = 4.0
+PRIOR_RESPONSE = 0.8
+PRIOR_DELIVERY = 0.9
+RATING_WEIGHT = 0.7
+RESPONSE_WEIGHT = 0.15
+DELIVERY_WEIGHT = 0.15
+
+RESPONSE_WINDOW_HOURS = 48
+
+DEFAULT_CHUNK_SIZE = 50
+
+COUNTERS = ('reviews', 'ratings', 'rating_sum', 'replied_on_time', 'orders_completed', 'orders_cancelled')
+
+# Reviews answered in time; replies from before replied_at was recorded count
+REPLIED_LATENCY = {
+    'sqlite': "(julianday({row}replied_at) - julianday({row}created_at)) * 24 <= {hours}",
+    'postgresql': "{row}replied_at - {row}created_at <= INTERVAL '{hours} hours'",
+}
+
+
+def on_time(dialect, row=''):
+    """SQL 1/0: the review (columns prefixed with row, e.g. 'new.') was replied to within the window."""
+    latency = REPLIED_LATENCY[dialect].format(row=row, hours=RESPONSE_WINDOW_HOURS)
+    return (f"CASE WHEN COALESCE({row}reply, '') <> '' AND ({row}replied_at IS NULL OR {latency}) "
+            f"THEN 1 ELSE 0 END")
+
+
+def _smoothed(hits, trials, prior):
+    return f'(({PRIOR_WEIGHT} * {prior} + {hits}) * 1.0 / ({PRIOR_WEIGHT} + {trials}))'
+
+
+def _rounded(expression):
+    return f'ROUND(CAST({expression} AS NUMERIC), 2)'
+
+
+def derived(row=''):
+    """SQL (trust_score, response_rate, delivery_rate) from the wholesaler_scores columns prefixed with row."""
+    rating = _smoothed(f'{row}rating_sum', f'{row}ratings', PRIOR_RATING)
+    response = _smoothed(f'{row}replied_on_time', f'{row}reviews', PRIOR_RESPONSE)
+    delivery = _smoothed(f'{row}orders_completed', f'{row}orders_completed + {row}orders_cancelled', PRIOR_DELIVERY)
+    trust = f'{RATING_WEIGHT} * {rating} + 5 * ({RESPONSE_WEIGHT} * {response} + {DELIVERY_WEIGHT} * {delivery})'
+    return _rounded(trust), _rounded(f'100 * {response}'), _rounded(f'100 * {delivery}')
+
+
+def apply_sql(row):
+    """SQL copying the derived figures of the wholesaler_scores row `row` onto its wholesaler."""
+    trust, response, delivery = derived(row)
+    return f'''
+        UPDATE wholesalers SET trust_score = {trust}, response_rate = {response}, delivery_rate = {delivery}
+        WHERE id = {row}wholesaler_id
+    '''
+
+
+# The trigger(s) running apply_sql, on SQLite one per event
+APPLY_TRIGGERS = (
+    ('wholesaler_scores_apply_insert', 'AFTER INSERT ON wholesaler_scores'),
+    ('wholesaler_scores_apply_update', 'AFTER UPDATE ON wholesaler_scores'),
+)
+
+
+def install(cursor, dialect):
+    """(Re)create the wholesaler_scores trigger with the current formula. Does not commit."""
+    if dialect == 'postgresql':
+        cursor.execute(f'''
+            CREATE OR REPLACE FUNCTION wholesaler_scores_apply() RETURNS trigger AS $$
+            BEGIN
+                {apply_sql('new.')};
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        return
+    for name, event in APPLY_TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f"CREATE TRIGGER {name} {event} BEGIN {apply_sql('new.')}; END")
+
+
+def delta_sql(values):
+    """Upsert adding `values` (SQL expressions, in COUNTERS order) to a wholesaler's counters."""
+    assignments = ', '.join(f'{name} = wholesaler_scores.{name} + excluded.{name}' for name in COUNTERS)
+    return f'''
+        INSERT INTO wholesaler_scores (wholesaler_id, {', '.join(COUNTERS)})
+        VALUES ({', '.join(values)})
+        ON CONFLICT (wholesaler_id) DO UPDATE SET {assignments}
+    '''
+
+
+def review_counts(dialect, row):
+    """SQL expressions for a review's contribution to each counter, in COUNTERS order."""
+    return ('1', f'CASE WHEN {row}rating IS NULL THEN 0 ELSE 1 END', f'COALESCE({row}rating, 0)',
+            on_time(dialect, row), '0', '0')
+
+
+def order_counts(row):
+    """SQL expressions for an order's contribution to each counter, in COUNTERS order."""
+    return ('0', '0', '0', '0', f"CASE WHEN {row}status = 'completed' THEN 1 ELSE 0 END",
+            f"CASE WHEN {row}status = 'cancelled' THEN 1 ELSE 0 END")
+
+
+# {dialect: upsert of freshly counted counters}; the {} takes the placeholders
+# for a chunk of wholesaler ids
+RECOUNT_SQL = {
+    dialect: f'''
+        INSERT INTO wholesaler_scores (wholesaler_id, {', '.join(COUNTERS)})
+        SELECT w.id,
+            (SELECT COUNT(*) FROM reviews r WHERE r.wholesaler_id = w.id),
+            (SELECT COUNT(r.rating) FROM reviews r WHERE r.wholesaler_id = w.id),
+            (SELECT COALESCE(SUM(r.rating), 0) FROM reviews r WHERE r.wholesaler_id = w.id),
+            (SELECT COALESCE(SUM({on_time(dialect, 'r.')}), 0) FROM reviews r WHERE r.wholesaler_id = w.id),
+            (SELECT COUNT(*) FROM orders o WHERE o.wholesaler_id = w.id AND o.status = 'completed'),
+            (SELECT COUNT(*) FROM orders o WHERE o.wholesaler_id = w.id AND o.status = 'cancelled')
+        FROM wholesalers w
+        WHERE w.id IN ({{}})
+        ON CONFLICT (wholesaler_id) DO UPDATE SET {", ".join(f"{name} = excluded.{name}" for name in COUNTERS)}
+    '''
+    for dialect in ('sqlite', 'postgresql')
+}
+
+# Figures and counters of a chunk of wholesalers, compared before and after a recount
+STATE_SQL = f'''
+    SELECT w.id, w.trust_score, w.response_rate, w.delivery_rate, {", ".join(f"s.{name}" for name in COUNTERS)}
+    FROM wholesalers w
+    LEFT JOIN wholesaler_scores s ON s.wholesaler_id = w.id
+    WHERE w.id IN ({{}})
+'''
+
+
+def recount(cursor, dialect, wholesaler_ids):
+    """Recount the wholesalers' counters from reviews and orders. Does not commit.
+
+    The counters are upserted, so the wholesaler_scores trigger refreshes
+    the derived figures too.
+    """
+    if not wholesaler_ids:
+        return
+    placeholders = ', '.join('?' * len(wholesaler_ids))
+    cursor.execute(RECOUNT_SQL[dialect].format(placeholders), tuple(wholesaler_ids))
+
+
+def reconcile(conn, chunk_size=DEFAULT_CHUNK_SIZE, progress=print):
+    """Reinstall the formula and recount every wholesaler, chunk_size per transaction. Returns (checked, corrected).
+
+    corrected counts wholesalers whose running counters had drifted from a
+    full recount, or whose figures were not those of the current formula.
+    """
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        install(cursor, conn.dialect)
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    checked = corrected = last_id = 0
+    while True:
+        cursor.execute('SELECT id FROM wholesalers WHERE id > ? ORDER BY id LIMIT ?', (last_id, chunk_size))
+        wholesaler_ids = [row[0] for row in cursor.fetchall()]
+        if not wholesaler_ids:
+            return checked, corrected
+        placeholders = ', '.join('?' * len(wholesaler_ids))
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute(STATE_SQL.format(placeholders), tuple(wholesaler_ids))
+            before = set(cursor.fetchall())
+            recount(cursor, conn.dialect, wholesaler_ids)
+            cursor.execute(STATE_SQL.format(placeholders), tuple(wholesaler_ids))
+            corrected += len(set(cursor.fetchall()) - before)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        checked += len(wholesaler_ids)
+        last_id = wholesaler_ids[-1]
+        progress(f'    checked {checked} wholesalers (up to id {last_id})')
+
+
+# Write hooks -------------------------------------------------------------
+
+def wholesaler_removing(conn, wholesaler_id):
+    """A wholesaler is about to be deleted; wholesaler_scores references it. Does not commit."""
+    conn.execute('DELETE FROM wholesaler_scores WHERE wholesaler_id = ?', (wholesaler_id,))
@@ -0,0 +1,321 @@
+# search.py
+# Product search for /vendor/search.
+#
+# SQLite uses the products_fts FTS5 table (migration 0006), which triggers
+# keep in sync with products and wholesalers.shop_name. Results are ranked by
+# BM25 and every query term matches as a prefix, so "tom" finds "Tomatoes".
+# PostgreSQL uses products.search_vector instead, a GIN-indexed tsvector over
+# the same text that triggers keep current (migration 0016).
+#
+# Before the full-text lookup, each query word is widened with the catalog
+# words it could mean: regional names through search_terms.SYNONYMS
+# ("tamatar", "कांदा") and misspellings through a trigram index over the
+# catalog vocabulary ("onoin"). That index lives in memory, kept current by
+# the write hooks at the bottom and rebuilt on a TTL for other workers.
+
+import bisect
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from markupsafe import Markup, escape
+
+import models
+import pagination
+import search_terms
+from db import get_db
+
+# Column weights for bm25(): name, category, description, shop_name
+BM25_WEIGHTS = (10.0, 4.0, 1.0, 2.0)
+
+# Text behind products.search_vector on PostgreSQL, for ts_headline snippets
+PG_SEARCH_DOCUMENT = ("coalesce(p.name, '') || ' ' || coalesce(p.category, '') || ' ' || "
+                      "coalesce(p.description, '') || ' ' || coalesce(w.shop_name, '')")
+
+# Snippet highlight markers; control characters can't clash with product
+# text, and are swapped for <mark> after HTML-escaping
+HIGHLIGHT_START, HIGHLIGHT_END = '\x02', '\x03'
+
+# Word characters plus Devanagari vowel signs, which \w does not cover
+TOKEN_RE = re.compile(r'[\w\u0900-\u097F]+')
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+def fts_query(alternatives):
+    """FTS5 MATCH expression: each token's alternatives ORed as prefix terms, ANDed."""
+    return ' AND '.join('(' + ' OR '.join(f'"{word}"*' for word in words) + ')' for words in alternatives)
+
+
+def pg_tsquery(alternatives):
+    return ' & '.join('(' + ' | '.join(f'{word}:*' for word in words) + ')' for words in alternatives)
+
+
+def highlight(snippet):
+    """HTML-safe snippet with matched terms wrapped in <mark>."""
+    html = str(escape(snippet or ''))
+    return Markup(html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+
+def _keyset(inner):
+    """(forward, backward) keyset queries over inner, which yields SearchHit columns."""
+    return (f'SELECT * FROM ({inner}) ranked WHERE (score, id) > (?, ?) ORDER BY score, id LIMIT ?',
+            f'SELECT * FROM ({inner}) ranked WHERE (score, id) < (?, ?) ORDER BY score DESC, id DESC LIMIT ?')
+
+
+# Lower score is a better match in both, as bm25() already returns it
+SQLITE_SEARCH_SQL = _keyset(f'''
+    SELECT p.id, p.name, p.category, p.price, p.stock, p.image_path,
+           w.shop_name, w.location, w.trust_score,
+           bm25(products_fts, {", ".join(map(str, BM25_WEIGHTS))}) AS score,
+           snippet(products_fts, -1, ?, ?, '…', 12) AS snippet
+    FROM products_fts
+    JOIN products p ON p.id = products_fts.rowid
+    LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+    WHERE products_fts MATCH ?
+''')
+
+POSTGRES_SEARCH_SQL = _keyset(f'''
+    SELECT p.id, p.name, p.category, p.price, p.stock, p.image_path,
+           w.shop_name, w.location, w.trust_score,
+           -CAST(ts_rank(p.search_vector, q) AS double precision) AS score,
+           ts_headline('simple', {PG_SEARCH_DOCUMENT}, q, ?) AS snippet
+    FROM products p
+    LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+    CROSS JOIN to_tsquery('simple', ?) q
+    WHERE p.search_vector @@ q
+''')
+
+
+def search_products(conn, query, limit=pagination.DEFAULT_PAGE_SIZE):
+    """Return a pagination.Page of models.SearchHit for query, best match first.
+
+    The page is positioned by the request's after/before cursor; each hit's
+    snippet is an HTML-safe excerpt with the matched terms highlighted.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return pagination.Page([])
+    alternatives = search_index.expand(tokens)
+
+    if conn.dialect == 'postgresql':
+        sql = POSTGRES_SEARCH_SQL
+        params = (f'StartSel={HIGHLIGHT_START},StopSel={HIGHLIGHT_END},MaxWords=12,MinWords=4',
+                  pg_tsquery(alternatives))
+    else:
+        sql = SQLITE_SEARCH_SQL
+        params = (HIGHLIGHT_START, HIGHLIGHT_END, fts_query(alternatives))
+
+    page = pagination.fetch_page(conn.cursor(), *sql, params, models.SearchHit,
+                                 key=lambda hit: (hit.score, hit.id),
+                                 first=(float('-inf'), 0), limit=limit)
+    page.items = [hit._replace(snippet=highlight(hit.snippet)) for hit in page.items]
+    return page
+
+
+# Typo and transliteration index --------------------------------------------
+
+# Catalog text that feeds the vocabulary; descriptions are left to FTS alone
+INDEX_SQL = '''
+    SELECT p.id, p.name, p.category, w.shop_name
+    FROM products p
+    LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+'''
+
+PRODUCT_SQL = '''
+    SELECT p.id, p.name, p.category, w.shop_name
+    FROM products p
+    LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+    WHERE p.id = ?
+'''
+
+# Words shorter than this are only matched exactly or as a prefix
+MIN_FUZZY_LENGTH = 4
+
+
+def trigrams(key):
+    padded = f'$${key}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_typos(key):
+    if len(key) < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if len(key) < 7 else 2
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance counting adjacent transpositions as one edit.
+
+    Stops early and returns limit + 1 once every alignment exceeds limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SearchIndex:
+    """Catalog vocabulary keyed by search_terms.search_key, with a trigram index.
+
+    expand() turns each query token into the catalog words to search for, so
+    the FTS lookup only ever sees words that exist in products_fts.
+    """
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._products = {}                   # product id -> its words
+        self._words = {}                      # search key -> Counter(word)
+        self._keys = []                       # sorted search keys, for prefix checks
+        self._trigrams = defaultdict(set)     # trigram -> search keys
+        self._synonym_trigrams = defaultdict(set)
+        for key in search_terms.SYNONYMS:
+            for gram in trigrams(key):
+                self._synonym_trigrams[gram].add(key)
+        self._expires = 0.0
+        self._lock = threading.RLock()
+
+    def _stale(self):
+        return time.monotonic() >= self._expires
+
+    def refresh(self):
+        cursor = get_db().cursor()
+        cursor.execute(INDEX_SQL)
+        rows = cursor.fetchall()
+        with self._lock:
+            self._products = {}
+            self._words = {}
+            self._keys = []
+            self._trigrams = defaultdict(set)
+            for row in rows:
+                self._add(row[0], row[1:])
+            self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        with self._lock:
+            self._expires = 0.0
+
+    def _add(self, product_id, fields):
+        words = tuple(tokenize(' '.join(field for field in fields if field)))
+        self._products[product_id] = words
+        for word in words:
+            key = search_terms.search_key(word)
+            if key not in self._words:
+                self._words[key] = Counter()
+                bisect.insort(self._keys, key)
+                for gram in trigrams(key):
+                    self._trigrams[gram].add(key)
+            self._words[key][word] += 1
+
+    def _remove(self, product_id):
+        for word in self._products.pop(product_id, ()):
+            key = search_terms.search_key(word)
+            words = self._words[key]
+            words[word] -= 1
+            if words[word] <= 0:
+                del words[word]
+            if not words:
+                del self._words[key]
+                del self._keys[bisect.bisect_left(self._keys, key)]
+                for gram in trigrams(key):
+                    self._trigrams[gram].discard(key)
+
+    def upsert(self, product_id, fields):
+        with self._lock:
+            self._remove(product_id)
+            self._add(product_id, fields)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _is_prefix(self, key):
+        i = bisect.bisect_left(self._keys, key)
+        return i < len(self._keys) and self._keys[i].startswith(key)
+
+    def _closest(self, key, index):
+        """Keys in index within max_typos(key) edits of key, nearest only."""
+        limit = max_typos(key)
+        if not limit:
+            return []
+        grams = trigrams(key)
+        # Each edit destroys at most three trigrams (four for a transposition)
+        needed = max(1, len(grams) - 4 * limit)
+        shared = Counter(candidate for gram in grams for candidate in index.get(gram, ()))
+        best, matches = limit + 1, []
+        for candidate, count in shared.items():
+            if count < needed:
+                continue
+            distance = edit_distance(key, candidate, limit)
+            if distance > limit:
+                continue
+            if distance < best:
+                best, matches = distance, [candidate]
+            elif distance == best:
+                matches.append(candidate)
+        return matches
+
+    def expand(self, tokens):
+        """Return, per token, the words to OR together in the full-text query."""
+        if self._stale():
+            self.refresh()
+        with self._lock:
+            return [self._expand(token) for token in tokens]
+
+    def _expand(self, token):
+        words = [token]
+        key = search_terms.search_key(token)
+        if key in self._words or self._is_prefix(key) or key in search_terms.SYNONYMS:
+            targets = [key]
+            if key in search_terms.SYNONYMS:
+                targets.append(search_terms.SYNONYMS[key])
+        else:
+            targets = self._closest(key, self._trigrams)
+            if not targets:
+                targets = [search_terms.SYNONYMS[synonym]
+                           for synonym in self._closest(key, self._synonym_trigrams)]
+        for target in list(targets):
+            targets.extend(sorted(search_terms.SYNONYM_GROUPS.get(target, set()) - set(targets)))
+        for target in targets:
+            forms = self._words.get(target)
+            candidates = sorted(forms) if forms else [target]
+            words.extend(word for word in candidates if word not in words)
+        return words
+
+
+search_index = SearchIndex()
+
+
+# Write hooks -------------------------------------------------------------
+
+def product_saved(product_id):
+    """A product was added or its name/category changed."""
+    if search_index._stale():
+        return  # the next search rebuilds from the database anyway
+    row = get_db().execute(PRODUCT_SQL, (product_id,)).fetchone()
+    if row:
+        search_index.upsert(row[0], row[1:])
+    else:
+        search_index.remove(product_id)
+
+
+def product_removed(product_id):
+    search_index.remove(product_id)
+
+
+def wholesaler_renamed():
+    search_index.invalidate()
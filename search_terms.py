@@ -0,0 +1,137 @@
+# search_terms.py
+# Normalization, transliteration and regional-name synonyms used by search.
+#
+# Every term, from the catalog or from a vendor's query, goes through
+# search_key() so "टमाटर", "tamaatar" and "Tamatar" all become "tamatar",
+# which SYNONYMS maps to the catalog word "tomato".
+
+import unicodedata
+
+# Devanagari -> Latin, close to how vendors type Hindi/Marathi in Latin script
+CONSONANTS = {
+    'क': 'k', 'ख': 'kh', 'ग': 'g', 'घ': 'gh', 'ङ': 'n',
+    'च': 'ch', 'छ': 'chh', 'ज': 'j', 'झ': 'jh', 'ञ': 'n',
+    'ट': 't', 'ठ': 'th', 'ड': 'd', 'ढ': 'dh', 'ण': 'n',
+    'त': 't', 'थ': 'th', 'द': 'd', 'ध': 'dh', 'न': 'n',
+    'प': 'p', 'फ': 'f', 'ब': 'b', 'भ': 'bh', 'म': 'm',
+    'य': 'y', 'र': 'r', 'ल': 'l', 'ळ': 'l', 'व': 'v',
+    'श': 'sh', 'ष': 'sh', 'स': 's', 'ह': 'h',
+}
+VOWELS = {
+    'अ': 'a', 'आ': 'aa', 'इ': 'i', 'ई': 'ee', 'उ': 'u', 'ऊ': 'oo', 'ऋ': 'ri',
+    'ए': 'e', 'ऐ': 'ai', 'ओ': 'o', 'औ': 'au', 'ऍ': 'e', 'ऑ': 'o',
+}
+VOWEL_SIGNS = {
+    'ा': 'aa', 'ि': 'i', 'ी': 'ee', 'ु': 'u', 'ू': 'oo', 'ृ': 'ri',
+    'े': 'e', 'ै': 'ai', 'ो': 'o', 'ौ': 'au', 'ॅ': 'e', 'ॉ': 'o',
+}
+VIRAMA = '्'
+NASALS = {'ं': 'n', 'ँ': 'n', 'ः': 'h'}
+NUKTA = '़'
+
+# Regional (Hindi/Marathi, in Latin script) -> catalog word. Keys are run
+# through search_key() below, so spelling variants collapse onto one entry.
+_SYNONYMS = {
+    'tamatar': 'tomato', 'tameta': 'tomato',
+    'kanda': 'onion', 'pyaz': 'onion', 'pyaj': 'onion', 'kando': 'onion',
+    'aloo': 'potato', 'alu': 'potato', 'batata': 'potato',
+    'palak': 'spinach',
+    'gajar': 'carrot',
+    'chawal': 'rice', 'chaval': 'rice', 'tandul': 'rice', 'basmati': 'rice',
+    'doodh': 'milk', 'dudh': 'milk',
+    'dahi': 'curd', 'dahee': 'curd',
+    'makhan': 'butter', 'loni': 'butter',
+    'tel': 'oil',
+    'mirchi': 'chilli', 'mirch': 'chilli',
+    'lasun': 'garlic', 'lehsun': 'garlic', 'lahsun': 'garlic',
+    'adrak': 'ginger', 'aale': 'ginger',
+    'dhaniya': 'coriander', 'kothimbir': 'coriander',
+    'haldi': 'turmeric', 'halad': 'turmeric',
+    'jeera': 'cumin', 'jira': 'cumin',
+    'atta': 'flour', 'aata': 'flour', 'maida': 'flour',
+    'dal': 'lentils', 'daal': 'lentils', 'dhal': 'lentils',
+    'shakkar': 'sugar', 'cheeni': 'sugar', 'chini': 'sugar', 'sakhar': 'sugar',
+    'namak': 'salt', 'meeth': 'salt',
+    'bhindi': 'okra',
+    'baingan': 'brinjal', 'vangi': 'brinjal', 'vange': 'brinjal',
+    'gobi': 'cauliflower', 'gobhi': 'cauliflower', 'phulgobi': 'cauliflower',
+    'kobi': 'cabbage', 'bandgobhi': 'cabbage',
+    'matar': 'peas', 'vatana': 'peas',
+    'nimbu': 'lemon', 'limbu': 'lemon',
+    'kakdi': 'cucumber', 'kheera': 'cucumber', 'kakadi': 'cucumber',
+    'pav': 'bread', 'pao': 'bread',
+    'anda': 'egg', 'ande': 'egg',
+    'machhi': 'fish', 'machli': 'fish', 'mase': 'fish',
+    'murgi': 'chicken', 'kombdi': 'chicken',
+    'chai': 'tea', 'chaha': 'tea',
+    'kela': 'banana', 'keli': 'banana',
+    'seb': 'apple', 'safarchand': 'apple',
+    'aam': 'mango', 'amba': 'mango',
+}
+
+
+def transliterate(text):
+    """Devanagari -> Latin with schwa deletion at word end; other text unchanged."""
+    out = []
+    chars = [c for c in text if c != NUKTA]
+    for i, char in enumerate(chars):
+        if char in CONSONANTS:
+            out.append(CONSONANTS[char])
+            following = chars[i + 1] if i + 1 < len(chars) else ''
+            # Inherent 'a' unless a vowel sign/virama follows or the word ends
+            if following and following not in VOWEL_SIGNS and following != VIRAMA and not following.isspace():
+                if following in NASALS or following in CONSONANTS or following in VOWELS:
+                    out.append('a')
+        elif char in VOWEL_SIGNS:
+            out.append(VOWEL_SIGNS[char])
+        elif char in VOWELS:
+            out.append(VOWELS[char])
+        elif char in NASALS:
+            out.append(NASALS[char])
+        elif char == VIRAMA:
+            continue
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+def _collapse(text):
+    # Long vowels and doubled letters are spelled inconsistently
+    text = text.replace('aa', 'a').replace('ee', 'i').replace('oo', 'u')
+    collapsed = []
+    for char in text:
+        if not collapsed or collapsed[-1] != char:
+            collapsed.append(char)
+    return ''.join(collapsed)
+
+
+def _stem(term):
+    # Plural -> singular so "tomatoes" and "tomato" share a key
+    if len(term) > 4 and term.endswith('oes'):
+        return term[:-2]
+    if len(term) > 4 and term.endswith('ies'):
+        return term[:-3] + 'y'
+    if len(term) > 3 and term.endswith('s') and not term.endswith('ss'):
+        return term[:-1]
+    return term
+
+
+def search_key(term):
+    """Normalized key for one word: lowercase, unaccented, Latin, singular."""
+    term = unicodedata.normalize('NFKD', transliterate(term.lower()))
+    term = ''.join(c for c in term if not unicodedata.combining(c))
+    return _stem(_collapse(term))
+
+
+SYNONYMS = {search_key(regional): search_key(catalog) for regional, catalog in _SYNONYMS.items()}
+
+# Catalog word -> every key that means it, so "aloo" also finds "Desi Batata"
+SYNONYM_GROUPS = {}
+for _regional, _catalog in SYNONYMS.items():
+    SYNONYM_GROUPS.setdefault(_catalog, {_catalog}).add(_regional)
+
+
+def canonical(term):
+    """search_key of term, mapped onto its catalog word when it is a regional name."""
+    key = search_key(term)
+    return SYNONYMS.get(key, key)
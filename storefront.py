@@ -0,0 +1,183 @@
+# storefront.py
+# Precomputed snapshot of the vendor landing page's shared content: the top
+# wholesalers with their most viewed products, and the category list.
+#
+# vendor_dashboard reads the snapshot without touching the database. Writes
+# that can change it call the hooks at the bottom, which refresh only the
+# affected part; a TTL rebuild picks up writes made by other workers. View
+# counts reach products.views through counters.py's flush, which re-ranks
+# the storefront's products as it writes them.
+
+import threading
+import time
+
+from db import get_db
+
+TOP_WHOLESALERS = 6
+PRODUCTS_PER_WHOLESALER = 3
+
+# One pass instead of a products query per wholesaler: rank each top
+# wholesaler's products by views and keep the first few
+STOREFRONT_SQL = '''
+    WITH top_wholesalers AS (
+        SELECT id, name, shop_name, trust_score FROM wholesalers
+        WHERE is_approved = 1
+        ORDER BY trust_score DESC
+        LIMIT ?
+    ),
+    ranked AS (
+        SELECT p.id, p.wholesaler_id, p.name, p.price, p.image_path,
+               ROW_NUMBER() OVER (PARTITION BY p.wholesaler_id ORDER BY p.views DESC) AS product_rank
+        FROM products p
+        JOIN top_wholesalers t ON p.wholesaler_id = t.id
+    )
+    SELECT t.id, t.name, t.shop_name, t.trust_score, r.id, r.name, r.price, r.image_path
+    FROM top_wholesalers t
+    LEFT JOIN ranked r ON r.wholesaler_id = t.id AND r.product_rank <= ?
+    ORDER BY t.trust_score DESC, t.id, r.product_rank
+'''
+
+TOP_PRODUCTS_SQL = '''
+    SELECT id, name, price, image_path FROM products
+    WHERE wholesaler_id = ?
+    ORDER BY views DESC
+    LIMIT ?
+'''
+
+CATEGORIES_SQL = '''
+    SELECT DISTINCT category FROM products
+    WHERE category IS NOT NULL AND category <> ''
+    ORDER BY category
+'''
+
+
+def _product(row):
+    return {'id': row[0], 'name': row[1], 'price': row[2], 'image_path': row[3]}
+
+
+class Storefront:
+    """Snapshot of the top wholesalers/products and category list."""
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._wholesalers = None
+        self._categories = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def _stale(self):
+        return self._wholesalers is None or self._categories is None or time.monotonic() >= self._expires
+
+    def snapshot(self):
+        """Return (top_wholesalers_with_products, categories)."""
+        if self._stale():
+            self.refresh()
+        return self._wholesalers, self._categories
+
+    def refresh(self):
+        cursor = get_db().cursor()
+        cursor.execute(STOREFRONT_SQL, (TOP_WHOLESALERS, PRODUCTS_PER_WHOLESALER))
+        wholesalers = []
+        for row in cursor.fetchall():
+            if not wholesalers or wholesalers[-1]['id'] != row[0]:
+                wholesalers.append({
+                    'id': row[0],
+                    'name': row[1],
+                    'shop_name': row[2],
+                    'trust_score': row[3],
+                    'products': [],
+                })
+            if row[4] is not None:
+                wholesalers[-1]['products'].append(_product(row[4:]))
+
+        cursor.execute(CATEGORIES_SQL)
+        categories = cursor.fetchall()
+
+        with self._lock:
+            self._wholesalers = wholesalers
+            self._categories = categories
+            self._expires = time.monotonic() + self.ttl
+
+    def refresh_wholesaler_products(self, wholesaler_id):
+        """Re-rank one wholesaler's products if it is on the storefront."""
+        wholesalers = self._wholesalers
+        if wholesalers is None or not any(w['id'] == wholesaler_id for w in wholesalers):
+            return
+        cursor = get_db().cursor()
+        cursor.execute(TOP_PRODUCTS_SQL, (wholesaler_id, PRODUCTS_PER_WHOLESALER))
+        products = [_product(row) for row in cursor.fetchall()]
+        with self._lock:
+            # Swap in a new list so concurrent readers never see a half update
+            self._wholesalers = [
+                dict(w, products=products) if w['id'] == wholesaler_id else w
+                for w in self._wholesalers
+            ]
+
+    def refresh_products(self, conn):
+        """Re-rank the products of every wholesaler on the storefront, reading through conn."""
+        wholesalers = self._wholesalers
+        if wholesalers is None:
+            return
+        cursor = conn.cursor()
+        products = {}
+        for wholesaler in wholesalers:
+            cursor.execute(TOP_PRODUCTS_SQL, (wholesaler['id'], PRODUCTS_PER_WHOLESALER))
+            products[wholesaler['id']] = [_product(row) for row in cursor.fetchall()]
+        with self._lock:
+            self._wholesalers = [dict(w, products=products.get(w['id'], w['products'])) for w in self._wholesalers]
+
+    def add_category(self, category):
+        categories = self._categories
+        if categories is None or not category or (category,) in categories:
+            return
+        with self._lock:
+            self._categories = sorted(self._categories + [(category,)])
+
+    def refresh_categories(self):
+        if self._categories is None:
+            return
+        cursor = get_db().cursor()
+        cursor.execute(CATEGORIES_SQL)
+        categories = cursor.fetchall()
+        with self._lock:
+            self._categories = categories
+
+    def invalidate(self):
+        with self._lock:
+            self._expires = 0.0
+
+
+storefront = Storefront()
+
+
+# Write hooks -------------------------------------------------------------
+
+def product_added(wholesaler_id, category):
+    storefront.add_category(category)
+    storefront.refresh_wholesaler_products(wholesaler_id)
+
+
+def product_changed(wholesaler_id, category_changed=False):
+    """Views, name, price, image or category of a product changed."""
+    storefront.refresh_wholesaler_products(wholesaler_id)
+    if category_changed:
+        storefront.refresh_categories()
+
+
+def views_flushed(conn):
+    """counters.py wrote buffered view counts; the top products may have changed.
+
+    Runs on the flush thread, outside any request, so it reads through the
+    flush's connection rather than get_db().
+    """
+    storefront.refresh_products(conn)
+
+
+def product_removed(wholesaler_id):
+    storefront.refresh_wholesaler_products(wholesaler_id)
+    storefront.refresh_categories()
+
+
+def wholesaler_changed():
+    """trust_score, approval or shop details changed; the ranking may move."""
+    storefront.invalidate()
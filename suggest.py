@@ -0,0 +1,181 @@
+# suggest.py
+# Search-as-you-type suggestions for /api/suggest.
+#
+# Product names, categories and shop names live in memory as a sorted array
+# of (word-start prefix key, entry) pairs, so a keystroke is one bisect plus
+# a short walk over the matching run. Each entry carries a popularity
+# (views + likes, summed over the products behind it) used to pick the
+# top k. Product writes update the index through the hooks at the bottom; a
+# TTL rebuild picks up view/like counts and writes from other workers.
+
+import bisect
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from db import get_db
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+MAX_QUERY_LENGTH = 64
+
+# Hot prefixes ("t", "to", "tom") are answered from a small result cache,
+# emptied whenever the index changes
+RESULT_CACHE_SIZE = 2048
+
+SUGGEST_SQL = '''
+    SELECT p.id, p.name, p.category, p.wholesaler_id, w.shop_name,
+           COALESCE(p.views, 0) + COALESCE(p.likes, 0)
+    FROM products p
+    LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+'''
+
+PRODUCT_SQL = '''
+    SELECT p.id, p.name, p.category, p.wholesaler_id, w.shop_name,
+           COALESCE(p.views, 0) + COALESCE(p.likes, 0)
+    FROM products p
+    LEFT JOIN wholesalers w ON w.id = p.wholesaler_id
+    WHERE p.id = ?
+'''
+
+KINDS = ('product', 'category', 'shop')
+
+
+def fold(text):
+    """Lowercase, unaccented, single-spaced form used for prefix matching."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ' '.join(''.join(c for c in text if not unicodedata.combining(c)).split())
+
+
+def prefix_keys(label):
+    # "Red Onions" is found from "red" and from "oni"
+    words = fold(label).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+class SuggestIndex:
+    """Sorted prefix array over product names, categories and shop names."""
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._entries = {}     # (kind, folded label) -> [label, popularity, product count]
+        self._keys = []        # sorted (prefix key, kind, folded label)
+        self._products = {}    # product id -> (name, category, shop_name, popularity)
+        self._results = OrderedDict()
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def _stale(self):
+        return time.monotonic() >= self._expires
+
+    def refresh(self):
+        cursor = get_db().cursor()
+        cursor.execute(SUGGEST_SQL)
+        rows = cursor.fetchall()
+        entries, products = {}, {}
+        for row in rows:
+            products[row[0]] = (row[1], row[2], row[4], row[5])
+            for kind, label in zip(KINDS, (row[1], row[2], row[4])):
+                if label:
+                    entry = entries.setdefault((kind, fold(label)), [label, 0, 0])
+                    entry[1] += row[5]
+                    entry[2] += 1
+        keys = sorted((key, kind, folded) for (kind, folded), entry in entries.items()
+                      for key in prefix_keys(entry[0]))
+        with self._lock:
+            self._entries, self._keys, self._products = entries, keys, products
+            self._results.clear()
+            self._expires = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        with self._lock:
+            self._expires = 0.0
+
+    def _adjust(self, product, sign):
+        name, category, shop_name, popularity = product
+        for kind, label in zip(KINDS, (name, category, shop_name)):
+            if not label:
+                continue
+            folded = fold(label)
+            entry = self._entries.get((kind, folded))
+            if entry is None:
+                entry = self._entries[(kind, folded)] = [label, 0, 0]
+                for key in prefix_keys(label):
+                    bisect.insort(self._keys, (key, kind, folded))
+            entry[1] += sign * popularity
+            entry[2] += sign
+            if entry[2] <= 0:
+                del self._entries[(kind, folded)]
+                for key in prefix_keys(label):
+                    i = bisect.bisect_left(self._keys, (key, kind, folded))
+                    if i < len(self._keys) and self._keys[i] == (key, kind, folded):
+                        del self._keys[i]
+
+    def upsert(self, product_id, product):
+        with self._lock:
+            previous = self._products.pop(product_id, None)
+            if previous:
+                self._adjust(previous, -1)
+            self._products[product_id] = product
+            self._adjust(product, +1)
+            self._results.clear()
+
+    def remove(self, product_id):
+        with self._lock:
+            previous = self._products.pop(product_id, None)
+            if previous:
+                self._adjust(previous, -1)
+                self._results.clear()
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        """Return up to limit {'text', 'type'} dicts for entries with a word starting with query."""
+        prefix = fold(query[:MAX_QUERY_LENGTH])
+        if not prefix:
+            return []
+        if self._stale():
+            self.refresh()
+        with self._lock:
+            cached = self._results.get((prefix, limit))
+            if cached is not None:
+                self._results.move_to_end((prefix, limit))
+                return cached
+
+            # An entry matches once per word; keep its best (only) score
+            matches = {}
+            i = bisect.bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+                _, kind, folded = self._keys[i]
+                matches[(kind, folded)] = self._entries[(kind, folded)]
+                i += 1
+            ranked = sorted(matches.items(), key=lambda item: (-item[1][1], KINDS.index(item[0][0]), item[0][1]))
+            results = [{'text': entry[0], 'type': kind} for (kind, _), entry in ranked[:limit]]
+
+            self._results[(prefix, limit)] = results
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+            return results
+
+
+suggest_index = SuggestIndex()
+
+
+# Write hooks -------------------------------------------------------------
+
+def product_saved(product_id):
+    """A product was added or its name/category changed."""
+    if suggest_index._stale():
+        return  # the next suggest rebuilds from the database anyway
+    row = get_db().execute(PRODUCT_SQL, (product_id,)).fetchone()
+    if row:
+        suggest_index.upsert(row[0], (row[1], row[2], row[4], row[5]))
+    else:
+        suggest_index.remove(product_id)
+
+
+def product_removed(product_id):
+    suggest_index.remove(product_id)
+
+
+def wholesaler_renamed():
+    suggest_index.invalidate()
@@ -0,0 +1,129 @@
+# tests/conftest.py
+# Every test runs twice, on SQLite and on PostgreSQL, each time against a
+# freshly migrated and seeded database (app.init_db).
+#
+# PostgreSQL comes from TEST_DATABASE_URL when it is set (any server where
+# that user may CREATE DATABASE); otherwise a throwaway server is started
+# with pgserver for the session. With neither, the postgresql runs skip.
+
+import functools
+import os
+import tempfile
+import uuid
+from urllib.parse import urlsplit
+
+import pytest
+
+# db.init_app runs when app is imported and must not touch the repo's
+# vendor_clubs.db, nor a DATABASE_URL from the shell or .env
+os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='sahaayak-tests-'), 'import.db')
+os.environ['DATABASE_URL'] = ''
+os.environ['DB_CHECKPOINT_INTERVAL'] = '0'
+
+import app as app_module  # noqa: E402
+import cache  # noqa: E402
+import counters  # noqa: E402
+import db  # noqa: E402
+import search  # noqa: E402
+import storefront  # noqa: E402
+import suggest  # noqa: E402
+
+# Seed accounts created by app.init_db
+VENDOR_LOGIN = {'phone': '9876543210', 'password': 'vendor123'}
+WHOLESALER_LOGIN = {'phone': '9999999999', 'password': 'password123'}
+ADMIN_LOGIN = {'username': 'admin', 'password': 'admin123'}
+
+
+def _postgres_admin(url, statement):
+    import psycopg2
+    conn = psycopg2.connect(url)
+    conn.autocommit = True  # CREATE/DROP DATABASE refuse to run in a transaction
+    try:
+        conn.cursor().execute(statement)
+    finally:
+        conn.close()
+
+
+@pytest.fixture(scope='session')
+def postgres_server():
+    """URL of a PostgreSQL server the tests create their databases on."""
+    url = os.getenv('TEST_DATABASE_URL')
+    if url:
+        yield url
+        return
+    pgserver = pytest.importorskip('pgserver', reason='set TEST_DATABASE_URL or install pgserver')
+    server = pgserver.get_server(tempfile.mkdtemp(prefix='sahaayak-pg-'), cleanup_mode='delete')
+    yield server.get_uri()
+    server.cleanup()
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def database_url(request, tmp_path):
+    """An empty database: a SQLite file, or a new database on postgres_server."""
+    if request.param == 'sqlite':
+        yield str(tmp_path / 'test.db')
+        return
+    server = request.getfixturevalue('postgres_server')
+    name = f'sahaayak_test_{uuid.uuid4().hex[:12]}'
+    _postgres_admin(server, f'CREATE DATABASE {name}')
+    yield urlsplit(server)._replace(path=f'/{name}').geturl()
+    _postgres_admin(server, f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+
+
+@pytest.fixture
+def app(database_url, monkeypatch):
+    flask_app = app_module.app
+    pool = db.ConnectionPool(functools.partial(db.connect, database_url), max_size=4, timeout=5)
+    monkeypatch.setitem(flask_app.extensions, 'db_pool', pool)
+    monkeypatch.setitem(flask_app.config, 'TESTING', True)
+    # The in-process caches would otherwise carry rows over between databases
+    monkeypatch.setattr(cache, 'dashboard_stats', cache.TTLCache(ttl=30.0))
+    monkeypatch.setattr(cache, 'carts', cache.TTLCache(ttl=60.0))
+    monkeypatch.setattr(search, 'search_index', search.SearchIndex())
+    monkeypatch.setattr(suggest, 'suggest_index', suggest.SuggestIndex())
+    monkeypatch.setattr(storefront, 'storefront', storefront.Storefront())
+    product_counters = counters.CounterBuffer()
+    monkeypatch.setattr(counters, 'product_counters', product_counters)
+
+    with flask_app.app_context():
+        app_module.init_db()
+    yield flask_app
+
+    product_counters.stop()
+    pool.close_all()
+
+
+@pytest.fixture
+def query(app):
+    """query(sql, *params) -> rows, read straight from the test database."""
+    def run(sql, *params):
+        with app.app_context():
+            return db.get_db().execute(sql, params).fetchall()
+    return run
+
+
+@pytest.fixture
+def vendor(app):
+    """Test client logged in as the seed vendor."""
+    client = app.test_client()
+    response = client.post('/vendor/login', data=VENDOR_LOGIN)
+    assert response.status_code == 302 and response.location.endswith('/vendor/dashboard')
+    return client
+
+
+@pytest.fixture
+def wholesaler(app):
+    """Test client logged in as the seed wholesaler."""
+    client = app.test_client()
+    response = client.post('/wholesaler/login', data=WHOLESALER_LOGIN)
+    assert response.status_code == 302 and response.location.endswith('/wholesaler/dashboard')
+    return client
+
+
+@pytest.fixture
+def admin(app):
+    """Test client logged in as the admin."""
+    client = app.test_client()
+    response = client.post('/admin/login', data=ADMIN_LOGIN)
+    assert response.status_code == 302
+    return client
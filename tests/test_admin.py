@@ -0,0 +1,31 @@
+def register(app, phone):
+    response = app.test_client().post('/register-wholesaler', data={
+        'name': 'Test Traders', 'phone': phone, 'password': 'secret', 'shop_name': 'Test Traders',
+        'sourcing_info': 'Local farms', 'location': 'Andheri'})
+    assert response.status_code == 302
+
+
+def test_reject_pending_application(app, admin, query):
+    register(app, '9000000001')
+    [(wholesaler_id, approved)] = query('SELECT id, is_approved FROM wholesalers WHERE phone = ?', '9000000001')
+    assert not approved
+
+    response = admin.get(f'/admin/reject/{wholesaler_id}')
+    assert response.status_code == 302
+    assert query('SELECT COUNT(*) FROM wholesalers WHERE id = ?', wholesaler_id) == [(0,)]
+    assert query('SELECT COUNT(*) FROM wholesaler_scores WHERE wholesaler_id = ?', wholesaler_id) == [(0,)]
+
+
+def test_reject_leaves_approved_wholesalers(admin, query):
+    [(wholesaler_id,)] = query('SELECT id FROM wholesalers WHERE phone = ?', '9999999999')
+    response = admin.get(f'/admin/reject/{wholesaler_id}', follow_redirects=True)
+    assert b'Only pending applications can be rejected' in response.data
+    assert query('SELECT COUNT(*) FROM wholesalers WHERE id = ?', wholesaler_id) == [(1,)]
+
+
+def test_reject_requires_admin(app, query):
+    register(app, '9000000002')
+    [(wholesaler_id,)] = query('SELECT id FROM wholesalers WHERE phone = ?', '9000000002')
+    response = app.test_client().get(f'/admin/reject/{wholesaler_id}')
+    assert response.location.endswith('/admin/login')
+    assert query('SELECT COUNT(*) FROM wholesalers WHERE id = ?', wholesaler_id) == [(1,)]
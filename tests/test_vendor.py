@@ -0,0 +1,89 @@
+from conftest import VENDOR_LOGIN
+
+
+def product_id(query, name):
+    return query('SELECT id FROM products WHERE name = ?', name)[0][0]
+
+
+def test_login(app):
+    client = app.test_client()
+    response = client.post('/vendor/login', data=dict(VENDOR_LOGIN, password='wrong'))
+    assert response.location.endswith('/vendor/login')
+    assert client.get('/vendor/dashboard').status_code == 302
+
+    response = client.post('/vendor/login', data=VENDOR_LOGIN)
+    assert response.location.endswith('/vendor/dashboard')
+    assert client.get('/vendor/dashboard').status_code == 200
+
+
+def test_add_to_cart_reserves_stock(vendor, query):
+    tomatoes = product_id(query, 'Organic Tomatoes')
+    response = vendor.post('/vendor/add-to-cart', data={'product_id': tomatoes, 'quantity': 3})
+    assert response.status_code == 200 and response.get_json()['success']
+
+    assert query('SELECT quantity FROM cart_items WHERE product_id = ?', tomatoes) == [(3,)]
+    assert query('SELECT quantity FROM stock_reservations WHERE product_id = ?', tomatoes) == [(3,)]
+    assert b'Organic Tomatoes' in vendor.get('/vendor/cart').data
+
+
+def test_add_to_cart_refuses_more_than_is_free(vendor, query):
+    carrots = product_id(query, 'Premium Carrots')  # seeded out of stock
+    response = vendor.post('/vendor/add-to-cart', data={'product_id': carrots, 'quantity': 1})
+    assert response.status_code == 409
+    assert response.get_json()['available'] == 0
+    assert query('SELECT COUNT(*) FROM cart_items') == [(0,)]
+
+
+def test_checkout_orders_the_cart(vendor, query):
+    tomatoes, rice = product_id(query, 'Organic Tomatoes'), product_id(query, 'Basmati Rice')
+    [(orders_before,)] = query('SELECT COUNT(*) FROM orders')
+    vendor.post('/vendor/add-to-cart', data={'product_id': tomatoes, 'quantity': 2})
+    vendor.post('/vendor/add-to-cart', data={'product_id': rice, 'quantity': 1})
+
+    response = vendor.post('/vendor/checkout')
+    assert response.status_code == 200
+    placed = response.get_json()
+    assert placed['success'] and placed['total'] == 2 * 45.0 + 85.0
+
+    assert query('SELECT COUNT(*) FROM orders') == [(orders_before + 2,)]
+    assert query('SELECT stock FROM products WHERE id = ?', tomatoes) == [(498,)]
+    assert query('SELECT COUNT(*) FROM cart_items') == [(0,)]
+    assert query('SELECT COUNT(*) FROM stock_reservations') == [(0,)]
+
+
+def test_checkout_of_an_empty_cart_is_refused(vendor):
+    assert vendor.post('/vendor/checkout').status_code == 409
+
+
+def test_direct_order_keeps_the_cart(vendor, query):
+    tomatoes = product_id(query, 'Organic Tomatoes')
+    vendor.post('/vendor/add-to-cart', data={'product_id': tomatoes, 'quantity': 3})
+
+    response = vendor.post('/vendor/place-order', data={'product_id': tomatoes, 'quantity': 1})
+    assert response.status_code == 302
+    assert query('SELECT stock FROM products WHERE id = ?', tomatoes) == [(499,)]
+    assert query('SELECT quantity FROM cart_items WHERE product_id = ?', tomatoes) == [(3,)]
+    assert query('SELECT quantity FROM stock_reservations WHERE product_id = ?', tomatoes) == [(3,)]
+
+
+def search(vendor, q):
+    response = vendor.get('/vendor/search', query_string={'q': q, 'format': 'json'})
+    assert response.status_code == 200
+    return [item['name'] for item in response.get_json()['items']]
+
+
+def test_search_by_product_name(vendor):
+    assert search(vendor, 'tomatoes') == ['Organic Tomatoes']
+    assert search(vendor, 'tomatos') == ['Organic Tomatoes']  # typo
+    assert search(vendor, 'xylophone') == []
+
+
+def test_search_by_shop_name(vendor):
+    assert sorted(search(vendor, 'fresh mart')) == [
+        'Basmati Rice', 'Fresh Spinach', 'Organic Tomatoes', 'Premium Carrots', 'Red Onions']
+
+
+def test_search_page(vendor):
+    response = vendor.get('/vendor/search', query_string={'q': 'rice'})
+    assert response.status_code == 200
+    assert b'Basmati Rice' in response.data
@@ -0,0 +1,45 @@
+from conftest import WHOLESALER_LOGIN
+
+
+def add_product(wholesaler, query, name):
+    response = wholesaler.post('/wholesaler/add-product', data={
+        'name': name, 'category': 'Vegetables', 'price': '20', 'stock': '50'})
+    assert response.status_code == 302
+    return query('SELECT id FROM products WHERE name = ?', name)[0][0]
+
+
+def test_login(app):
+    client = app.test_client()
+    response = client.post('/wholesaler/login', data=dict(WHOLESALER_LOGIN, password='wrong'))
+    assert response.status_code == 200 and b'Invalid password' in response.data
+    assert client.get('/wholesaler/dashboard').status_code == 302
+
+    response = client.post('/wholesaler/login', data=WHOLESALER_LOGIN)
+    assert response.location.endswith('/wholesaler/dashboard')
+    assert client.get('/wholesaler/dashboard').status_code == 200
+
+
+def test_delete_product(wholesaler, vendor, query):
+    product = add_product(wholesaler, query, 'Green Chillies')
+    # In a cart, which the delete clears along with the reservation
+    vendor.post('/vendor/add-to-cart', data={'product_id': product, 'quantity': 2})
+
+    response = wholesaler.post('/api/delete-product', json={'product_id': product})
+    assert response.status_code == 200 and response.get_json()['success']
+    assert query('SELECT COUNT(*) FROM products WHERE id = ?', product) == [(0,)]
+    assert query('SELECT COUNT(*) FROM cart_items WHERE product_id = ?', product) == [(0,)]
+    assert query('SELECT COUNT(*) FROM stock_reservations WHERE product_id = ?', product) == [(0,)]
+    assert b'Green Chillies' not in vendor.get('/vendor/cart').data
+
+
+def test_delete_product_with_orders_is_refused(wholesaler, query):
+    [(product,)] = query('SELECT id FROM products WHERE name = ?', 'Organic Tomatoes')
+    response = wholesaler.post('/api/delete-product', json={'product_id': product})
+    assert response.status_code == 409
+    assert 'has orders' in response.get_json()['error']
+    assert query('SELECT COUNT(*) FROM products WHERE id = ?', product) == [(1,)]
+
+
+def test_delete_missing_product(wholesaler):
+    response = wholesaler.post('/api/delete-product', json={'product_id': 99999})
+    assert response.status_code == 404
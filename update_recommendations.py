@@ -0,0 +1,38 @@
+# update_recommendations.py
+# Recompute product similarities and vendor recommendations (see recommend.py).
+#
+# Run every few hours, e.g. from cron. Each run only recomputes what the
+# orders placed or deleted since the previous one can have changed; --full
+# recomputes everything.
+#
+#   python update_recommendations.py
+#   python update_recommendations.py --full
+
+import sys
+import time
+
+import db
+import recommend
+import schema
+
+
+def main(argv):
+    conn = db.connect()
+    try:
+        if not schema.is_current(conn):
+            print('Database schema is out of date, run "python migrate.py" first')
+            return 1
+        started = time.perf_counter()
+        if '--full' in argv:
+            conn.execute('UPDATE vendor_products SET changed = 1')
+            conn.commit()
+        updated = recommend.run(conn, progress=print)
+        print(f'✅ Updated {updated["products"]} product(s) and {updated["vendors"]} vendor(s) '
+              f'in {time.perf_counter() - started:.2f}s')
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))